@@ -0,0 +1,734 @@
+"""
+Бенчмарки парсера и генератора планов занятий.
+
+    python bench.py suite --semesters 4 --topics 10 --lessons 8 --placeholders 60 -o results.json
+    python bench.py suite --compare results.json     # сравнение с прошлым прогоном
+    python bench.py placeholders --fields 300 --paragraphs 2000
+    python bench.py placeholders --json
+    python bench.py transforms --rows 50000   # сверка с прежней обработкой столбцов
+    python bench.py startup --budget-ms 100    # код выхода 1 при превышении
+    python bench.py loadtest --requests 200 --concurrency 8   # HTTP-сервис (main.py serve)
+    python bench.py loadtest --url http://127.0.0.1:8765 --endpoint parse --docx программа.docx
+"""
+import argparse
+import compileall
+import contextlib
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import main
+
+# =============================================================================
+# ПРЕЖНЯЯ РЕАЛИЗАЦИЯ (для сравнения)
+# =============================================================================
+
+def legacy_replace_in_xml(content, replacements):
+    """
+    Цикл замены из прежней replace_placeholders: для каждого ключа два
+    content.replace (с '$' и без), без экранирования, с повторным
+    просмотром уже вставленного текста.
+    """
+    clean_replacements = {}
+    for key, value in replacements.items():
+        clean_key = key[1:] if key.startswith('$') else key
+        clean_replacements[clean_key] = value
+
+    for key, value in clean_replacements.items():
+        dollar_key = '$' + key
+        if dollar_key in content:
+            content = content.replace(dollar_key, str(value))
+        if key in content:
+            content = content.replace(key, str(value))
+    return content
+
+def legacy_build_lesson_table(flat_data, sections):
+    """
+    Шаги C–F прежней parse_docx_to_xlsx: построчные .apply, шаблоны
+    компилируются (или ищутся в кэше re) на каждом вызове.
+    """
+    import re
+    import pandas as pd
+
+    def parse_lesson_number(text):
+        match = re.search(r'№\s*\d+/(\d+)', text.replace('\n', ' '))
+        return match.group(1).strip() if match else ""
+
+    def remove_lesson_number_pattern(text):
+        return re.sub(r'№\s*\S+', '', text.replace('\n', ' ')).strip()
+
+    def remove_any_numbering(text):
+        cleaned_lines = []
+        for line in text.split('\n'):
+            line = line.strip()
+            if not line:
+                continue
+            line = re.sub(r'^\d+[\.)]\s*', '', line)
+            line = re.sub(r'^[\-\•]\s*', '', line)
+            cleaned_lines.append(line)
+        return "\n".join(cleaned_lines)
+
+    def expand_number_ranges(cell_value):
+        if not cell_value:
+            return ""
+        all_numbers = []
+        for chunk in cell_value.split(','):
+            chunk = chunk.strip()
+            match = re.match(r'^(\d+)\s*-\s*(\d+)$', chunk)
+            if match:
+                start, end = int(match.group(1)), int(match.group(2))
+                all_numbers.extend(range(min(start, end), max(start, end) + 1))
+            elif chunk.isdigit():
+                all_numbers.append(int(chunk))
+            else:
+                return cell_value
+        return ",".join(str(n) for n in all_numbers)
+
+    literature_str = sections['literature']
+    material_str = sections['material']
+    df = pd.DataFrame(flat_data)
+    df.drop(columns=[c for c in main.EXCLUDED_COLS if c in df.columns], inplace=True)
+    df['semester'] = df['semester'].str.extract(r'(\d+)').fillna('')
+    extracted = df['topic'].str.extract(r'^Тема\s+№?\s*(\d+)\.?[\s]*(.*)$', expand=True).fillna('')
+    df['Номер темы'] = extracted[0]
+    df['Название темы'] = extracted[1]
+    df.drop(columns=['topic'], inplace=True)
+
+    df['Номер занятия'] = df['col2'].apply(parse_lesson_number)
+    df['col2'] = df['col2'].apply(remove_lesson_number_pattern)
+    df.rename(columns={'col2': 'Тип занятия'}, inplace=True)
+
+    df.rename(columns={'col3': 'Время в минутах'}, inplace=True)
+    df['Время в минутах'] = pd.to_numeric(df['Время в минутах'], errors='coerce').fillna(0)
+    df['Время в минутах'] = (df['Время в минутах'] * 45).astype(int)
+
+    df.rename(columns={'col4': 'Учебные вопросы'}, inplace=True)
+    df['Название занятия'], remainder = zip(*df['Учебные вопросы'].apply(main.split_first_line))
+    df['Учебные вопросы'] = remainder
+
+    df["Литература"] = literature_str
+    df["Материальное обеспечение"] = material_str
+    df["Знать"] = sections['know']
+    df["Уметь"] = sections['skill']
+    df["Владеть"] = sections['master']
+    df['Учебные вопросы'] = df['Учебные вопросы'].apply(remove_any_numbering)
+
+    df['col5'] = df['col5'].apply(expand_number_ranges)
+    df['col5'] = df['col5'].apply(lambda s: main.pick_lines_from_text(material_str, s))
+    df['col6'] = df['col6'].apply(expand_number_ranges)
+    df['col6'] = df['col6'].apply(lambda s: main.pick_lines_from_text(literature_str, s))
+
+    df.rename(columns=main.RENAME_MAP, inplace=True)
+    final_order = [c for c in main.DESIRED_ORDER if c in df.columns]
+    final_order += [c for c in df.columns if c not in final_order]
+    return df[final_order]
+
+# =============================================================================
+# СИНТЕТИЧЕСКИЕ ДАННЫЕ
+# =============================================================================
+
+def make_placeholder_xml(fields, paragraphs):
+    """
+    document.xml из paragraphs параграфов; в каждом – обычный текст
+    и один из плейсхолдеров fields по кругу.
+    """
+    body = []
+    for i in range(paragraphs):
+        field = fields[i % len(fields)]
+        body.append(f'<w:p><w:r><w:t xml:space="preserve">Пункт {i}: ${field} – '
+                    f'текст плана занятия</w:t></w:r></w:p>')
+    return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            f'<w:document xmlns:w="{main.W_NS}"><w:body>{"".join(body)}</w:body></w:document>')
+
+def make_flat_rows(rows, lines=40):
+    """
+    rows строк в формате flatten_table и тексты разделов по lines строк.
+    Ячейки перебирают все разобранные случаи: номер занятия с переносом и без,
+    нумерация и маркеры в вопросах, прямые/обратные диапазоны, одиночные
+    номера, пустые и нечисловые ссылки, номера вне текста раздела.
+    """
+    kinds = ["Лекция № {t}/{n}", "Практическое занятие\n№ {t}/{n}", "Семинар", "Лекция №{t}/{n}."]
+    questions = [
+        "Название {n}\n1. Первый вопрос\n2) Второй вопрос\n- третий",
+        "Название {n}",
+        "  Название {n}  \n\n• маркер\n3.без пробела\n",
+        "Название {n}\n10. - двойная нумерация\nобычная строка",
+    ]
+    refs = ["1-4, 6", "{r}", "", "5-2", "см. выше", "1,{big}", " 2 - 3 ,4"]
+    flat = []
+    for i in range(rows):
+        topic, lesson = i // 8 + 1, i % 8 + 1
+        fmt = dict(t=topic, n=lesson, r=i % lines + 1, big=lines + 5)
+        flat.append({
+            'semester': f"{i // 400 + 1} семестр",
+            'topic': f"Тема № {topic}. Раздел {topic}" if i % 50 else f"Тема{topic}",
+            'discipline': "Синтетическая дисциплина",
+            'col1': str(i + 1),
+            'col2': kinds[i % len(kinds)].format(**fmt),
+            'col3': ["2", "1.5", "", "два"][i % 4],
+            'col4': questions[i % len(questions)].format(**fmt),
+            'col5': refs[i % len(refs)].format(**fmt),
+            'col6': refs[(i + 3) % len(refs)].format(**fmt),
+            'col7': "",
+        })
+    sections = {
+        'literature': "\n".join(f"{k}. Учебник {k}" for k in range(1, lines + 1)),
+        'material':   "\n".join(f"  Стенд {k}  " for k in range(1, lines + 1)),
+        'know': "знать", 'skill': "уметь", 'master': "владеть",
+    }
+    return flat, sections
+
+def add_hyperlink(paragraph, text, anchor="link"):
+    """ Дописывает в параграф w:hyperlink (внутренняя ссылка) с текстом text. """
+    from docx.oxml import parse_xml
+
+    paragraph._p.append(parse_xml(
+        '<w:hyperlink xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+        f'w:anchor="{anchor}"><w:r><w:t xml:space="preserve">{text}</w:t></w:r></w:hyperlink>'))
+
+def make_curriculum_docx(path, semesters=2, topics=5, lessons=6, section_lines=30, seed=0,
+                         discipline="Синтетическая дисциплина"):
+    """
+    Синтетическая учебная программа в том виде, который ждет parse_docx:
+    строка "изучения дисциплины «...»", разделы Знать/Уметь/Владеть,
+    таблица TABLE_NUMBER (перед ней – служебная таблица) с START_ROW-1
+    строками заголовка, строками "N семестр" (объединенные ячейки),
+    "Тема N. ..." и занятиями "№ X/Y" со ссылками-диапазонами на строки
+    разделов III. ЛИТЕРАТУРА и "Материальное обеспечение занятия".
+    Примечание занятий темы – одна ячейка, объединенная по вертикали;
+    в вопросах и литературе есть гиперссылки.
+    Темы нумеруются сквозь семестры, всего semesters × topics × lessons занятий.
+    Одинаковые параметры и seed дают одинаковый документ.
+    """
+    from docx import Document
+
+    rnd = random.Random(seed)
+    cols = 7
+    doc = Document()
+    doc.add_paragraph("РАБОЧАЯ ПРОГРАММА УЧЕБНОЙ ДИСЦИПЛИНЫ")
+    doc.add_paragraph(f"Целью изучения дисциплины «{discipline}» является "
+                      "подготовка к нагрузочным испытаниям.")
+    for i in range(1, main.TABLE_NUMBER):
+        doc.add_table(rows=1, cols=2).cell(0, 0).text = f"Служебная таблица {i}"
+    for start, end, word in ((main.KNOW_START, main.KNOW_END, "знать"),
+                             (main.SKILL_START, main.SKILL_END, "уметь"),
+                             (main.MASTER_START, main.MASTER_END, "владеть")):
+        doc.add_paragraph(start)
+        for k in range(1, 6):
+            doc.add_paragraph(f"- {word}: пункт {k} раздела компетенций")
+    doc.add_paragraph(main.MASTER_END + " являются:")
+
+    table = doc.add_table(rows=main.START_ROW - 1, cols=cols)
+    for c, title in enumerate(["№", "Вид занятия", "Часы", "Учебные вопросы",
+                               "Мат. обеспечение", "Литература", "Примечание"]):
+        table.cell(0, c).text = title
+    kinds = ["Лекция", "Групповое занятие", "Практическое занятие", "Семинар"]
+    refs = ["1-3", "2, 4", "{a}-{b}", "{a}", "{b}-{a}", "", "см. выше"]
+    topic = 0
+    for semester in range(1, semesters + 1):
+        cells = table.add_row().cells
+        cells[0].merge(cells[cols - 1]).text = f"{semester} семестр"
+        for _ in range(topics):
+            topic += 1
+            table.add_row().cells[3].text = f"Тема {topic}. Синтетическая тема {topic}"
+            first_row = len(table.rows)
+            for lesson in range(1, lessons + 1):
+                a, b = sorted(rnd.sample(range(1, section_lines + 1), 2))
+                cells = table.add_row().cells
+                cells[0].text = str(lesson)
+                cells[1].text = f"{rnd.choice(kinds)}\n№ {topic}/{lesson}"
+                cells[2].text = str(rnd.choice([1, 2, 4]))
+                cells[3].text = (f"Занятие {topic}.{lesson}\n1. Первый вопрос\n"
+                                 f"2) Второй вопрос\n- Третий вопрос")
+                if lesson % 3 == 0:
+                    add_hyperlink(cells[3].add_paragraph("4. "), "Вопрос по ссылке")
+                cells[4].text = rnd.choice(refs).format(a=a, b=b)
+                cells[5].text = rnd.choice(refs).format(a=a, b=b)
+            note = table.cell(first_row, cols - 1).merge(table.cell(len(table.rows) - 1, cols - 1))
+            note.text = f"Примечание к теме {topic}"
+
+    doc.add_paragraph(main.START_REF)
+    for k in range(1, section_lines + 1):
+        paragraph = doc.add_paragraph(
+            f"Автор {k}. Учебник по дисциплине, том {k}. – М.: Издательство, 2024.")
+        if k % 4 == 0:
+            add_hyperlink(paragraph, f" ЭБС: том {k}", anchor=f"lib{k}")
+    doc.add_paragraph(main.START_MATERIAL)
+    for k in range(1, section_lines + 1):
+        doc.add_paragraph(f"Учебный стенд № {k}")
+    doc.add_paragraph(main.END_MATERIAL + " КОНТРОЛЬ")
+    doc.save(path)
+    return path
+
+def make_template_docx(path, placeholders=len(main.TEMPLATE_FIELDS)):
+    """
+    Шаблон плана занятия с placeholders плейсхолдерами: сначала поля
+    TEMPLATE_FIELDS, сверх них – поля формы ПОЛЕ0001... Есть колонтитулы и
+    плейсхолдер, разбитый на несколько run. Возвращает (путь, данные формы
+    со всеми полями формы, которые встречаются в шаблоне).
+    """
+    from docx import Document
+
+    extra = [f"ПОЛЕ{i:04d}" for i in range(1, placeholders - len(main.TEMPLATE_FIELDS) + 1)]
+    fields = (main.TEMPLATE_FIELDS + extra)[:placeholders]
+    form_data = {field: f"значение {field}" for field in main.FORM_FIELDS + extra}
+
+    doc = Document()
+    section = doc.sections[0]
+    section.header.paragraphs[0].text = "Группа $ГРУППАНОМЕР"
+    section.footer.paragraphs[0].text = "Руководитель: $РУКОВОДИТЕЛЬ"
+    paragraph = doc.add_paragraph("Дисциплина: ")
+    paragraph.add_run("$ДИС")
+    paragraph.add_run("ЦИП").bold = True
+    paragraph.add_run("ЛИНА")
+    for field in fields:
+        doc.add_paragraph(f"{field.capitalize()}: ${field}")
+    doc.save(path)
+    return path, form_data
+
+def best_time(func, repeat):
+    """ Лучшее время из repeat запусков, в секундах. """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+# =============================================================================
+# БЕНЧМАРКИ
+# =============================================================================
+
+def bench_placeholders(fields=300, paragraphs=2000, repeat=5):
+    """
+    Подстановка в одну часть документа: прежний цикл по ключам против
+    однопроходной substitute_placeholders.
+    """
+    names = [f"ПОЛЕ{i:04d}" for i in range(fields)]
+    replacements = {f"${name}": f"значение {i}" for i, name in enumerate(names)}
+    content = make_placeholder_xml(names, paragraphs)
+
+    legacy = best_time(lambda: legacy_replace_in_xml(content, replacements), repeat)
+    single_pass = best_time(lambda: main.substitute_placeholders(content, replacements), repeat)
+    return {
+        "benchmark": "placeholders",
+        "fields": fields,
+        "paragraphs": paragraphs,
+        "xml_bytes": len(content.encode("utf-8")),
+        "legacy_s": legacy,
+        "single_pass_s": single_pass,
+        "speedup": legacy / single_pass if single_pass else None,
+    }
+
+def bench_transforms(rows=50000, repeat=3):
+    """
+    Обработка столбцов таблицы занятий: прежние построчные .apply против
+    build_lesson_table. Результаты сравниваются целиком (значения и типы),
+    расхождение – ошибка.
+    """
+    import pandas as pd
+
+    flat, sections = make_flat_rows(rows)
+    expected = legacy_build_lesson_table(flat, sections)
+    pd.testing.assert_frame_equal(main.build_lesson_table(flat, sections), expected)
+
+    legacy = best_time(lambda: legacy_build_lesson_table(flat, sections), repeat)
+    current = best_time(lambda: main.build_lesson_table(flat, sections), repeat)
+    return {
+        "benchmark": "transforms",
+        "rows": rows,
+        "identical": True,
+        "legacy_s": legacy,
+        "current_s": current,
+        "speedup": legacy / current if current else None,
+    }
+
+def environment_info():
+    """ Версии и коммит – чтобы результаты разных прогонов можно было сравнивать. """
+    import docx
+    import pandas as pd
+
+    try:
+        commit = _git("rev-parse", "--short", "HEAD")
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "pandas": pd.__version__,
+        "python-docx": getattr(docx, "__version__", None),
+    }
+
+def _git(*args):
+    """ Вывод git в папке с main.py. """
+    return subprocess.run(["git", *args], cwd=os.path.dirname(os.path.abspath(main.__file__)),
+                          capture_output=True, text=True, check=True).stdout.strip()
+
+CORPUS_FILES = 8   # программ в синтетическом корпусе для parse_corpus
+
+def bench_suite(semesters=2, topics=10, lessons=8, placeholders=40, repeat=3, workers=None):
+    """
+    Полный набор замеров на синтетической программе и шаблоне (см.
+    make_curriculum_docx, make_template_docx). Каждый замер – лучшее время
+    из repeat запусков; вывод main на время замеров подавляется.
+    """
+    import docx
+
+    results = []
+
+    def measure(name, func, runs=repeat, **info):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            seconds = best_time(func, runs)
+        results.append({"name": name, "seconds": seconds, "repeat": runs, **info})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        docx_path = make_curriculum_docx(os.path.join(tmp, "curriculum.docx"),
+                                         semesters, topics, lessons)
+        template_path, form_data = make_template_docx(os.path.join(tmp, "Template.docx"),
+                                                      placeholders)
+        saved_cache_dir = main.PARSE_CACHE_DIR
+        main.PARSE_CACHE_DIR = os.path.join(tmp, "parse-cache")
+        try:
+            doc = docx.Document(docx_path)
+            rows = main.read_table_from_docx(doc, main.TABLE_NUMBER, main.START_ROW)
+            measure("read_table_from_docx", lambda: main.read_table_from_docx(
+                doc, main.TABLE_NUMBER, main.START_ROW), rows=len(rows))
+            measure("read_docx_stream", lambda: main.read_docx_stream(
+                docx_path, main.TABLE_NUMBER, main.START_ROW), rows=len(rows))
+            measure("flatten_table", lambda: main.flatten_table(rows, "Дисциплина"), rows=len(rows))
+
+            for backend in ("python-docx", "stream"):
+                measure(f"parse_docx[{backend}]", lambda: main.parse_docx(
+                    docx_path, backend, use_cache=False))
+            df = main.parse_docx(docx_path)   # заполняет кэш
+            measure("parse_docx[cache hit]", lambda: main.parse_docx(docx_path), lessons=len(df))
+
+            corpus_dir = os.path.join(tmp, "corpus")
+            os.makedirs(corpus_dir)
+            for i in range(CORPUS_FILES):
+                make_curriculum_docx(os.path.join(corpus_dir, f"program_{i}.docx"), semesters,
+                                     topics, lessons, seed=i, discipline=f"Дисциплина {i}")
+            for n in sorted({1, workers or os.cpu_count() or 1}):
+                measure(f"parse_corpus[workers={n}]", lambda: main.parse_corpus(
+                    corpus_dir, n, {"use_cache": False}), files=CORPUS_FILES)
+
+            store = main.LessonStore(os.path.join(tmp, "lessons.sqlite"))
+            measure("LessonStore.upsert_curriculum", lambda: store.upsert_curriculum(
+                docx_path, df), lessons=len(df))
+            first = main.LessonRecord.from_row(df.iloc[-1])
+            measure("LessonStore.get_lesson", lambda: store.get_lesson(
+                first.discipline, first.topic_number, first.lesson_number, first.semester))
+            measure("LessonStore.discipline_lessons",
+                    lambda: store.discipline_lessons(first.discipline), lessons=len(df))
+            store.close()
+
+            record = main.lesson_record(df.iloc[0])
+            replacements = main.build_lesson_replacements(record, form_data)
+            template_doc = docx.Document(template_path)
+            measure("replace_placeholders",
+                    lambda: main.replace_placeholders(template_doc, replacements),
+                    placeholders=placeholders)
+            with open(template_path, "rb") as f:
+                template_bytes = f.read()
+            fields = main.template_fields(form_data)
+            measure("compile_template", lambda: main.CompiledTemplate(template_bytes, fields),
+                    placeholders=placeholders)
+            lesson_path = os.path.join(tmp, "lesson.docx")
+            measure("generate_lesson_docx", lambda: main.generate_lesson_docx(
+                template_path, lesson_path, record, form_data), placeholders=placeholders)
+
+            for n in sorted({1, workers or os.cpu_count() or 1}):
+                out_dir = os.path.join(tmp, f"lessons_{n}")
+                os.makedirs(out_dir)
+                measure(f"save_all_lessons[workers={n}]", lambda: main.save_all_lessons(
+                    df, template_path, out_dir, form_data, workers=n),
+                    lessons=len(df))
+
+            out_dir = os.path.join(tmp, "lessons_incremental")
+            os.makedirs(out_dir)
+            main.save_all_lessons(df, template_path, out_dir, form_data, incremental=True)
+            measure("save_all_lessons[no changes]", lambda: main.save_all_lessons(
+                df, template_path, out_dir, form_data, incremental=True), lessons=len(df))
+
+            combined_path = os.path.join(tmp, "combined.docx")
+            measure("generate_combined_docx", lambda: main.generate_combined_docx(
+                template_path, combined_path, [r for _, r in main.lesson_records(df)], form_data),
+                lessons=len(df))
+
+            bundle_path = os.path.join(tmp, "lessons.zip")
+            measure("save_lessons_bundle", lambda: main.save_lessons_bundle(
+                df, template_path, bundle_path, form_data, workers=1), lessons=len(df))
+        finally:
+            main.PARSE_CACHE_DIR = saved_cache_dir
+
+    return {
+        "benchmark": "suite",
+        "params": {"semesters": semesters, "topics": topics, "lessons": lessons,
+                   "placeholders": placeholders, "repeat": repeat},
+        "environment": environment_info(),
+        "results": results,
+    }
+
+def print_suite(suite, baseline=None):
+    """ Таблица результатов; с baseline (прошлый JSON) – еще и отношение времен. """
+    old = {r["name"]: r["seconds"] for r in (baseline or {}).get("results", [])}
+    print(", ".join(f"{k}={v}" for k, v in suite["params"].items()))
+    for r in suite["results"]:
+        line = f"{r['name']:>32}: {r['seconds'] * 1000:10.2f} ms"
+        if r["name"] in old:
+            line += (f"   было {old[r['name']] * 1000:10.2f} ms"
+                     f"   ускорение x{old[r['name']] / r['seconds']:.2f}")
+        print(line)
+
+# Модули, которых не должно быть в sys.modules сразу после "import main"
+HEAVY_MODULES = ["pandas", "numpy", "docx", "lxml", "openpyxl", "customtkinter", "tkinter"]
+
+STARTUP_BUDGET_MS = 100
+
+def _run_python(code, *flags):
+    """ Запускает code в отдельном интерпретаторе из папки с main.py. """
+    return subprocess.run([sys.executable, *flags, "-c", code],
+                          cwd=os.path.dirname(os.path.abspath(main.__file__)),
+                          capture_output=True, text=True, check=True)
+
+def import_time_ms(module="main"):
+    """ Накопленное время импорта module по данным python -X importtime, мс. """
+    stderr = _run_python(f"import {module}", "-X", "importtime").stderr
+    for line in stderr.splitlines():
+        # "import time:   self [us] | cumulative | imported package"
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1]) / 1000
+    raise RuntimeError(f"Нет строки importtime для {module}:\n{stderr}")
+
+def bench_startup(budget_ms=STARTUP_BUDGET_MS, repeat=5):
+    """
+    Время "import main" в чистом интерпретаторе (лучшее из repeat) и список
+    тяжелых модулей, загруженных при импорте. ok=False, если бюджет превышен
+    или что-то тяжелое загружается сразу.
+    """
+    compileall.compile_file(main.__file__, quiet=1)   # меряем запуск с готовым .pyc
+    best = min(import_time_ms("main") for _ in range(repeat))
+    loaded = json.loads(_run_python(
+        "import json, sys, main; "
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))").stdout)
+    return {
+        "benchmark": "startup",
+        "import_ms": best,
+        "budget_ms": budget_ms,
+        "heavy_modules_loaded": loaded,
+        "ok": best <= budget_ms and not loaded,
+    }
+
+# =============================================================================
+# НАГРУЗОЧНЫЙ ТЕСТ HTTP-СЕРВИСА
+# =============================================================================
+
+def multipart_body(fields, files):
+    """ Тело multipart/form-data: (байты, заголовок Content-Type). """
+    boundary = f"bench{random.getrandbits(64):016x}"
+    out = []
+    for name, value in fields.items():
+        out.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+                   f'{value}\r\n'.encode("utf-8"))
+    for name, data in files.items():
+        out.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                   f'filename="{name}.docx"\r\nContent-Type: application/octet-stream\r\n\r\n'
+                   .encode("utf-8") + data + b"\r\n")
+    out.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return b"".join(out), f"multipart/form-data; boundary={boundary}"
+
+def percentile(sorted_values, p):
+    """ Процентиль p (0–100) по методу ближайшего ранга. """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def bench_loadtest(url=None, endpoint="lessons", requests=200, concurrency=8, docx_path=None,
+                   workers=None, max_inflight=None):
+    """
+    Нагрузка на HTTP-сервис (main.py serve): concurrency потоков с keep-alive
+    соединениями отправляют всего requests запросов к /parse или /lessons.
+    Без url сервис запускается здесь же на свободном порту с синтетической
+    программой и шаблоном. Результат – задержки (p50/p90/p99, макс.), запросы
+    в секунду и число ответов по статусам (503 – отказ по лимиту одновременных
+    запросов).
+    """
+    import http.client
+    import threading
+    from urllib.parse import urlsplit
+
+    with contextlib.ExitStack() as stack:
+        tmp = stack.enter_context(tempfile.TemporaryDirectory())
+        template_path = None
+        if docx_path is None:
+            docx_path = make_curriculum_docx(os.path.join(tmp, "curriculum.docx"))
+        if url is None:
+            template_path, _ = make_template_docx(os.path.join(tmp, "Template.docx"), 40)
+            server = main.make_service_server("127.0.0.1", 0, template_path, workers, max_inflight)
+            stack.callback(server.service.close)
+            stack.callback(server.server_close)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            stack.callback(server.shutdown)
+            url = "http://%s:%d" % server.server_address[:2]
+
+        with open(docx_path, "rb") as f:
+            docx_bytes = f.read()
+        if endpoint == "parse":
+            path, body, headers = "/parse?format=xlsx", docx_bytes, {}
+        else:
+            body, content_type = multipart_body(
+                {"НАЧАЛЬНИК": "В. Пупкин", "ГОДА": "2025"}, {"curriculum": docx_bytes})
+            path, headers = "/lessons", {"Content-Type": content_type}
+
+        target = urlsplit(url)
+        latencies = []
+        statuses = {}
+        lock = threading.Lock()
+        remaining = iter(range(requests))
+
+        def client():
+            conn = http.client.HTTPConnection(target.hostname, target.port, timeout=600)
+            try:
+                while True:
+                    with lock:
+                        if next(remaining, None) is None:
+                            return
+                    start = time.perf_counter()
+                    try:
+                        conn.request("POST", path, body, headers)
+                        response = conn.getresponse()
+                        response.read()
+                        status = response.status
+                        if response.getheader("Connection", "").lower() == "close":
+                            conn.close()
+                    except (OSError, http.client.HTTPException):
+                        status = "error"
+                        conn.close()
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        statuses[status] = statuses.get(status, 0) + 1
+                        if status == 200:
+                            latencies.append(elapsed)
+            finally:
+                conn.close()
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+
+    latencies.sort()
+    ok = statuses.get(200, 0)
+    return {
+        "benchmark": "loadtest",
+        "url": url,
+        "endpoint": endpoint,
+        "requests": requests,
+        "concurrency": concurrency,
+        "ok": ok,
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=str)},
+        "seconds": wall,
+        "rps": ok / wall if wall else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+    }
+
+def print_result(result, as_json):
+    if as_json:
+        print(json.dumps(result, ensure_ascii=False))
+        return
+    for key, value in result.items():
+        if isinstance(value, float):
+            value = f"{value:.6f}"
+        print(f"{key:>16}: {value}")
+
+def run():
+    parser = argparse.ArgumentParser(description="Бенчмарки парсера и генератора")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("suite", help="все замеры на синтетической программе и шаблоне")
+    p.add_argument("--semesters", type=int, default=2)
+    p.add_argument("--topics", type=int, default=10, help="тем в семестре")
+    p.add_argument("--lessons", type=int, default=8, help="занятий в теме")
+    p.add_argument("--placeholders", type=int, default=40, help="плейсхолдеров в шаблоне")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--workers", type=int, default=None,
+                   help="процессов для save_all_lessons (кроме замера с одним)")
+    p.add_argument("-o", "--output", help="сохранить результаты в JSON")
+    p.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    p.add_argument("--json", action="store_true", help="вывод одной строкой JSON")
+
+    p = sub.add_parser("placeholders", help="подстановка плейсхолдеров")
+    p.add_argument("--fields", type=int, default=300)
+    p.add_argument("--paragraphs", type=int, default=2000)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--json", action="store_true", help="вывод одной строкой JSON")
+
+    p = sub.add_parser("transforms", help="обработка столбцов таблицы (и сверка с прежней)")
+    p.add_argument("--rows", type=int, default=50000)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--json", action="store_true", help="вывод одной строкой JSON")
+
+    p = sub.add_parser("startup", help="время импорта main и отложенные зависимости")
+    p.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--json", action="store_true", help="вывод одной строкой JSON")
+
+    p = sub.add_parser("loadtest", help="нагрузка на HTTP-сервис: p50/p99 и запросы в секунду")
+    p.add_argument("--url", help="адрес запущенного сервиса (без него – свой на свободном порту)")
+    p.add_argument("--endpoint", choices=["lessons", "parse"], default="lessons")
+    p.add_argument("--requests", type=int, default=200)
+    p.add_argument("--concurrency", type=int, default=8, help="одновременных клиентов")
+    p.add_argument("--docx", help="учебная программа (по умолчанию – синтетическая)")
+    p.add_argument("--workers", type=int, default=None, help="процессов своего сервиса")
+    p.add_argument("--max-inflight", type=int, default=None,
+                   help="лимит одновременных запросов своего сервиса")
+    p.add_argument("--json", action="store_true", help="вывод одной строкой JSON")
+
+    args = parser.parse_args()
+    if args.command == "suite":
+        suite = bench_suite(args.semesters, args.topics, args.lessons, args.placeholders,
+                            args.repeat, args.workers)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(suite, f, ensure_ascii=False, indent=2)
+        if args.json:
+            print(json.dumps(suite, ensure_ascii=False))
+        else:
+            baseline = None
+            if args.compare:
+                with open(args.compare, encoding="utf-8") as f:
+                    baseline = json.load(f)
+            print_suite(suite, baseline)
+    elif args.command == "placeholders":
+        print_result(bench_placeholders(args.fields, args.paragraphs, args.repeat), args.json)
+    elif args.command == "transforms":
+        print_result(bench_transforms(args.rows, args.repeat), args.json)
+    elif args.command == "startup":
+        result = bench_startup(args.budget_ms, args.repeat)
+        print_result(result, args.json)
+        if not result["ok"]:
+            sys.exit(1)
+    elif args.command == "loadtest":
+        print_result(bench_loadtest(args.url, args.endpoint, args.requests, args.concurrency,
+                                    args.docx, args.workers, args.max_inflight), args.json)
+
+
+if __name__ == "__main__":
+    run()
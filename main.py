@@ -1,11 +1,29 @@
 import re
 import os
-import docx
-import pandas as pd
-import customtkinter as ctk
-import tkinter as tk
-from tkinter import filedialog, messagebox
-from docx import Document
+import io
+import time
+import queue
+import threading
+import zlib
+import bisect
+import pickle
+import struct
+import hashlib
+import zipfile
+import math
+import numbers
+import functools
+import itertools
+import sys
+import json
+import argparse
+import logging
+import contextlib
+from collections import OrderedDict, namedtuple
+
+# Тяжелые зависимости (pandas, python-docx, lxml, openpyxl, customtkinter)
+# импортируются в функциях при первом использовании: запуск CLI и окна
+# не ждет загрузки того, что для текущей операции не нужно.
 
 # =============================================================================
 # ПАРАМЕТРЫ
@@ -14,6 +32,14 @@ from docx import Document
 TABLE_NUMBER = 2   # Какая по счёту таблица (1=первая, 2=вторая и т.д.)
 START_ROW = 3      # С какой строки таблицы читать
 
+# Способ чтения DOCX: "python-docx" (объектная модель) или "stream"
+# (потоковый разбор word/document.xml через lxml.iterparse)
+DOCX_BACKEND = "python-docx"
+
+# Литература/мат. обеспечение на занятие: False – только текст строк раздела,
+# True – с номером строки в разделе ("3. Учебник ...")
+KEEP_SOURCE_NUMBERING = False
+
 # Удаляем только col1 и col7, а col5,col6 оставляем (будем обрабатывать):
 EXCLUDED_COLS = ['col1', 'col7']
 
@@ -66,6 +92,137 @@ SKILL_END    = "Владеть:"
 MASTER_START = "Владеть:"
 MASTER_END   = "Основными видами занятий по дисциплине"
 
+# Разделы, собираемые за один проход по документу: ключ -> (начало, конец)
+SECTION_MARKERS = {
+    'literature': (START_REF, END_REF),
+    'material':   (START_MATERIAL, END_MATERIAL),
+    'know':       (KNOW_START, KNOW_END),
+    'skill':      (SKILL_START, SKILL_END),
+    'master':     (MASTER_START, MASTER_END),
+}
+
+DISCIPLINE_PATTERN = re.compile(r'изучения\s+дисциплины\s+«([^»]+)»', flags=re.IGNORECASE)
+
+# =============================================================================
+# ЖУРНАЛ И МЕТРИКИ
+# =============================================================================
+
+# Ход работы пишется в журнал "prsr_bnch" вместо print: по умолчанию видны
+# только предупреждения и ошибки, подробности – через configure_logging
+log = logging.getLogger("prsr_bnch")
+log.addHandler(logging.NullHandler())
+
+_metrics_hooks = []
+
+def add_metrics_hook(hook):
+    """
+    Подписывает hook(event) на метрики. event – словарь
+    {"type": "stage", "name": "parse.flatten", "seconds": 0.0012, ...} (время этапа)
+    или {"type": "counter", "name": "lessons", "value": 320, ...} (счетчик).
+    Хуки вызываются в том потоке/процессе, где идет работа.
+    """
+    _metrics_hooks.append(hook)
+    return hook
+
+def remove_metrics_hook(hook):
+    if hook in _metrics_hooks:
+        _metrics_hooks.remove(hook)
+
+def metrics_enabled():
+    """ Нужны ли метрики: есть хуки или журнал пишет DEBUG. Иначе этапы не замеряются. """
+    return bool(_metrics_hooks) or log.isEnabledFor(logging.DEBUG)
+
+def emit_metric(event):
+    if log.isEnabledFor(logging.DEBUG):
+        if event["type"] == "stage":
+            log.debug("этап %s: %.2f мс", event["name"], event["seconds"] * 1000,
+                      extra={"metric": event})
+        else:
+            log.debug("счетчик %s: %s", event["name"], event["value"], extra={"metric": event})
+    for hook in list(_metrics_hooks):
+        hook(event)
+
+@contextlib.contextmanager
+def stage(name, **fields):
+    """ with stage("parse.flatten"): ... – время этапа уходит в метрики. """
+    if not metrics_enabled():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        emit_metric({"type": "stage", "name": name,
+                     "seconds": time.perf_counter() - start, **fields})
+
+def count(name, value=1, **fields):
+    """ Значение счетчика name (строк, занятий, замен...) в метрики. """
+    if metrics_enabled():
+        emit_metric({"type": "counter", "name": name, "value": value, **fields})
+
+class MetricsCollector:
+    """
+    Хук, суммирующий метрики: по этапам – число вызовов и общее время,
+    по счетчикам – сумма значений.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            if event["type"] == "stage":
+                calls, seconds = self.stages.get(event["name"], (0, 0.0))
+                self.stages[event["name"]] = (calls + 1, seconds + event["seconds"])
+            else:
+                self.counters[event["name"]] = self.counters.get(event["name"], 0) + event["value"]
+
+    def summary(self):
+        with self._lock:
+            return {
+                "stages": {name: {"calls": calls, "seconds": seconds}
+                           for name, (calls, seconds) in self.stages.items()},
+                "counters": dict(self.counters),
+            }
+
+@contextlib.contextmanager
+def collect_metrics():
+    """ with collect_metrics() as metrics: ...; metrics.summary() – итоги за блок. """
+    collector = add_metrics_hook(MetricsCollector())
+    try:
+        yield collector
+    finally:
+        remove_metrics_hook(collector)
+
+class JsonLogFormatter(logging.Formatter):
+    """ Запись журнала – одна строка JSON; поля метрики (extra={"metric": ...}) – на верхнем уровне. """
+
+    def format(self, record):
+        data = {"time": round(record.created, 3), "level": record.levelname,
+                "message": record.getMessage()}
+        metric = getattr(record, "metric", None)
+        if metric:
+            data.update(metric)
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+def configure_logging(verbose=0, json_output=False, stream=None):
+    """
+    Вывод журнала в stream (по умолчанию stderr).
+    verbose: 0 – предупреждения и ошибки, 1 – ход работы, 2 – подробно, с временем этапов.
+    json_output – каждая запись одной строкой JSON.
+    """
+    for handler in [h for h in log.handlers if not isinstance(h, logging.NullHandler)]:
+        log.removeHandler(handler)
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonLogFormatter() if json_output else logging.Formatter("%(message)s"))
+    log.addHandler(handler)
+    log.setLevel(logging.WARNING if verbose <= 0 else logging.INFO if verbose == 1 else logging.DEBUG)
+    log.propagate = False
+
 # =============================================================================
 # ФУНКЦИИ ДЛЯ ПОИСКА ТЕКСТА МЕЖДУ МАРКЕРАМИ
 # =============================================================================
@@ -75,10 +232,9 @@ def get_discipline_name(doc):
     Ищет строку вида: 'изучения дисциплины «XXX»' в документе,
     возвращает XXX или None, если не найдено.
     """
-    pattern = r'изучения\s+дисциплины\s+«([^»]+)»'
     for paragraph in doc.paragraphs:
         txt = paragraph.text.strip()
-        match = re.search(pattern, txt, flags=re.IGNORECASE)
+        match = DISCIPLINE_PATTERN.search(txt)
         if match:
             return match.group(1)
     return None
@@ -110,27 +266,79 @@ def parse_text_between(doc, start_text, end_text):
 
     return "\n".join(results)
 
+def extract_sections(paragraph_texts, markers=None):
+    """
+    Один проход по параграфам вместо get_discipline_name + parse_text_between
+    для каждого раздела.
+
+    :param paragraph_texts: итерируемое текстов параграфов (paragraph.text)
+    :param markers: словарь {ключ: (start_text, end_text)}, по умолчанию SECTION_MARKERS
+    :return: tuple(название дисциплины или None, {ключ: многострочная строка})
+
+    Каждый раздел собирается так же, как в parse_text_between: параграф-начало
+    не включается, пустые пропускаются, без конечного маркера – до конца документа.
+    """
+    if markers is None:
+        markers = SECTION_MARKERS
+
+    pending = {key: (start.upper(), end.upper()) for key, (start, end) in markers.items()}
+    collecting = {}   # ключ -> конечный маркер (в верхнем регистре)
+    results = {key: [] for key in markers}
+    discipline_name = None
+    discipline_found = False
+
+    for text in paragraph_texts:
+        txt = text.strip()
+        up = txt.upper()
+
+        if not discipline_found:
+            match = DISCIPLINE_PATTERN.search(txt)
+            if match:
+                discipline_name = match.group(1)
+                discipline_found = True
+
+        # Сначала – разделы, уже начатые на предыдущих параграфах
+        for key, end_up in list(collecting.items()):
+            if up.startswith(end_up):
+                del collecting[key]
+            elif txt:
+                results[key].append(txt)
+
+        # Затем – разделы, которые начинаются на этом параграфе
+        for key, (start_up, end_up) in list(pending.items()):
+            if up.startswith(start_up):
+                del pending[key]
+                collecting[key] = end_up
+
+        # Всё найдено и все разделы закрыты – дальше читать незачем
+        if discipline_found and not pending and not collecting:
+            break
+
+    return discipline_name, {key: "\n".join(lines) for key, lines in results.items()}
+
 # =============================================================================
 # ЧТЕНИЕ ТАБЛИЦЫ
 # =============================================================================
 
 def read_table_from_docx(doc, table_num, start_row):
-    all_tables = doc.tables
+    """
+    Строки таблицы №table_num, начиная со строки start_row (тексты ячеек без
+    пробелов по краям). Таблица берется прямо из w:body, без построения
+    doc.tables/row.cells; объединения ячеек разбираются table_rows_text.
+    """
+    all_tables = doc.element.body.findall(W_TBL)
     if len(all_tables) < table_num:
         raise ValueError(f"В документе {len(all_tables)} таблиц, а запрошена №{table_num}.")
 
-    table = all_tables[table_num - 1]
-    rows = table.rows
+    return _read_table_rows(all_tables[table_num - 1], table_num, start_row)
 
-    if len(rows) < start_row:
-        raise ValueError(f"В таблице №{table_num} всего {len(rows)} строк, "
+def _read_table_rows(tbl, table_num, start_row):
+    """ Проверяет число строк w:tbl и возвращает строки начиная с start_row. """
+    rows_count = len(tbl.findall(W_TR))
+    if rows_count < start_row:
+        raise ValueError(f"В таблице №{table_num} всего {rows_count} строк, "
                          f"запрошена строка №{start_row} и далее.")
-
-    data = []
-    for row_obj in rows[start_row - 1:]:
-        cells_text = [cell.text.strip() for cell in row_obj.cells]
-        data.append(cells_text)
-    return data
+    return table_rows_text(tbl, start_row)
 
 def flatten_table(list_of_rows, discipline_name=None):
     """
@@ -171,15 +379,218 @@ def flatten_table(list_of_rows, discipline_name=None):
 
     return flattened_data
 
+# =============================================================================
+# ПОТОКОВОЕ ЧТЕНИЕ DOCX (lxml.iterparse, без объектной модели python-docx)
+# =============================================================================
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+W_BODY      = f"{{{W_NS}}}body"
+W_P         = f"{{{W_NS}}}p"
+W_R         = f"{{{W_NS}}}r"
+W_T         = f"{{{W_NS}}}t"
+W_TAB       = f"{{{W_NS}}}tab"
+W_PTAB      = f"{{{W_NS}}}ptab"
+W_BR        = f"{{{W_NS}}}br"
+W_CR        = f"{{{W_NS}}}cr"
+W_NBHYPHEN  = f"{{{W_NS}}}noBreakHyphen"
+W_HYPERLINK = f"{{{W_NS}}}hyperlink"
+W_TBL       = f"{{{W_NS}}}tbl"
+W_TR        = f"{{{W_NS}}}tr"
+W_TRPR      = f"{{{W_NS}}}trPr"
+W_TC        = f"{{{W_NS}}}tc"
+W_TCPR      = f"{{{W_NS}}}tcPr"
+W_GRIDSPAN  = f"{{{W_NS}}}gridSpan"
+W_GRIDBEFORE = f"{{{W_NS}}}gridBefore"
+W_VMERGE    = f"{{{W_NS}}}vMerge"
+W_TYPE      = f"{{{W_NS}}}type"
+W_VAL       = f"{{{W_NS}}}val"
+
+def _run_text(r):
+    """ Текст w:r так же, как его собирает python-docx (Run.text). """
+    parts = []
+    for child in r:
+        tag = child.tag
+        if tag == W_T:
+            parts.append(child.text or "")
+        elif tag == W_TAB or tag == W_PTAB:
+            parts.append("\t")
+        elif tag == W_BR:
+            if child.get(W_TYPE, "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif tag == W_CR:
+            parts.append("\n")
+        elif tag == W_NBHYPHEN:
+            parts.append("-")
+    return "".join(parts)
+
+def paragraph_text(p):
+    """ Текст w:p (прямые w:r и w:r внутри w:hyperlink), как Paragraph.text. """
+    parts = []
+    for child in p:
+        if child.tag == W_R:
+            parts.append(_run_text(child))
+        elif child.tag == W_HYPERLINK:
+            parts.extend(_run_text(r) for r in child if r.tag == W_R)
+    return "".join(parts)
+
+def cell_text(tc):
+    """ Текст w:tc: параграфы ячейки через '\n', как _Cell.text. """
+    return "\n".join(paragraph_text(p) for p in tc if p.tag == W_P)
+
+def _tc_merge(tc):
+    """ (gridSpan, vMerge) ячейки; <w:vMerge/> без w:val означает "continue". """
+    span, vmerge = 1, None
+    tc_pr = tc.find(W_TCPR)
+    if tc_pr is not None:
+        el = tc_pr.find(W_GRIDSPAN)
+        if el is not None:
+            span = int(el.get(W_VAL, 1))
+        el = tc_pr.find(W_VMERGE)
+        if el is not None:
+            vmerge = el.get(W_VAL, "continue")
+    return span, vmerge
+
+def _tr_grid_before(tr):
+    """ Число пропущенных колонок сетки в начале строки (w:gridBefore). """
+    tr_pr = tr.find(W_TRPR)
+    if tr_pr is not None:
+        el = tr_pr.find(W_GRIDBEFORE)
+        if el is not None:
+            return int(el.get(W_VAL, 0))
+    return 0
+
+def table_rows_text(tbl, start_row=1):
+    """
+    Строки w:tbl (начиная с start_row) в виде списков текстов ячеек без пробелов
+    по краям – так же, как [cell.text.strip() for cell in row.cells] в python-docx:
+    ячейка с gridSpan=N повторяется N раз, продолжение вертикального объединения
+    (vMerge="continue") берет корневую ячейку сверху.
+
+    Один линейный проход по строкам; текст каждой корневой ячейки вычисляется
+    не более одного раза и только если он действительно нужен.
+    """
+    rows = []
+    above = {}  # смещение в сетке -> корневая ячейка [tc, текст или None, ширина]
+    for row_num, tr in enumerate(tbl.iterchildren(W_TR), start=1):
+        wanted = row_num >= start_row
+        offset = _tr_grid_before(tr)
+        current = {}
+        cells = []
+        for tc in tr.iterchildren(W_TC):
+            span, vmerge = _tc_merge(tc)
+            root = above.get(offset) if vmerge == "continue" else None
+            if root is None:
+                root = [tc, None, span]
+            current[offset] = root
+            if wanted:
+                if root[1] is None:
+                    root[1] = cell_text(root[0]).strip()
+                cells.extend([root[1]] * root[2])
+            offset += span
+        above = current
+        if wanted:
+            rows.append(cells)
+    return rows
+
+def iter_docx_blocks(docx_path):
+    """
+    Потоково читает word/document.xml прямо из zip и выдает блоки тела документа
+    по порядку: ('paragraph', текст) или ('table', элемент w:tbl).
+    Элемент таблицы действителен только до следующей итерации – строки из него
+    нужно прочитать сразу (table_rows_text), ненужные таблицы можно пропустить
+    без разбора. Обработанные элементы сразу очищаются, так что память не растет
+    с размером документа (картинки и прочие части пакета вообще не читаются).
+    """
+    import zipfile
+    from lxml import etree
+
+    with zipfile.ZipFile(docx_path) as zf:
+        with zf.open("word/document.xml") as xml_file:
+            for _, elem in etree.iterparse(xml_file, events=("end",), tag=(W_P, W_TBL)):
+                parent = elem.getparent()
+                if parent is None or parent.tag != W_BODY:
+                    continue  # параграфы внутри таблиц обработаем вместе с таблицей
+
+                if elem.tag == W_P:
+                    yield "paragraph", paragraph_text(elem)
+                else:
+                    yield "table", elem
+
+                # Освобождаем сам элемент и всё, что было до него в w:body
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del parent[0]
+
+def read_docx_stream(docx_path, table_num, start_row):
+    """
+    Потоковый аналог docx.Document + read_table_from_docx.
+    Возвращает (список текстов параграфов тела, строки таблицы №table_num
+    начиная со строки start_row). Ошибки – те же, что у read_table_from_docx.
+    """
+    paragraph_texts = []
+    table_rows = None
+    tables_count = 0
+
+    for kind, value in iter_docx_blocks(docx_path):
+        if kind == "paragraph":
+            paragraph_texts.append(value)
+        else:
+            tables_count += 1
+            if tables_count == table_num:
+                table_rows = _read_table_rows(value, table_num, start_row)
+
+    if table_rows is None:
+        raise ValueError(f"В документе {tables_count} таблиц, а запрошена №{table_num}.")
+
+    return paragraph_texts, table_rows
+
+def load_docx_content(docx_path, backend=None, table_num=None, start_row=None):
+    """
+    Читает DOCX выбранным способом (DOCX_BACKEND по умолчанию) и возвращает
+    (тексты параграфов, строки таблицы table_num начиная с start_row;
+    по умолчанию TABLE_NUMBER и START_ROW). Оба способа дают одинаковый результат.
+    """
+    if backend is None:
+        backend = DOCX_BACKEND
+    if table_num is None:
+        table_num = TABLE_NUMBER
+    if start_row is None:
+        start_row = START_ROW
+
+    if backend == "stream":
+        with stage("parse.read_stream"):
+            paragraph_texts, table_rows = read_docx_stream(docx_path, table_num, start_row)
+    elif backend == "python-docx":
+        import docx
+        with stage("parse.open"):
+            doc = docx.Document(docx_path)
+        with stage("parse.paragraphs"):
+            paragraph_texts = [p.text for p in doc.paragraphs]
+        with stage("parse.table_read"):
+            table_rows = read_table_from_docx(doc, table_num, start_row)
+    else:
+        raise ValueError(f"Неизвестный способ чтения DOCX: {backend}")
+    count("table_rows", len(table_rows))
+    return paragraph_texts, table_rows
+
 # =============================================================================
 # ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ДЛЯ ОБРАБОТКИ КОЛОНОК
 # =============================================================================
 
+# Шаблоны столбцов компилируются один раз, а не на каждой строке таблицы
+SEMESTER_PATTERN      = re.compile(r'(\d+)')
+TOPIC_PATTERN         = re.compile(r'^Тема\s+№?\s*(\d+)\.?[\s]*(.*)$')
+LESSON_NUMBER_PATTERN = re.compile(r'№\s*\d+/(\d+)')
+LESSON_NUMBER_TOKEN   = re.compile(r'№\s*\S+')
+LEADING_NUMBER        = re.compile(r'^\d+[\.)]\s*')
+LEADING_BULLET        = re.compile(r'^[\-\•]\s*')
+NUMBER_RANGE_PATTERN  = re.compile(r'^(\d+)\s*-\s*(\d+)$')
+
 def parse_lesson_number(text):
     """ Ищет '№ X/Y', возвращает Y или '' """
     txt = text.replace('\n', ' ')
-    pattern = r'№\s*\d+/(\d+)'
-    match = re.search(pattern, txt)
+    match = LESSON_NUMBER_PATTERN.search(txt)
     if match:
         return match.group(1).strip()
     return ""
@@ -187,8 +598,7 @@ def parse_lesson_number(text):
 def remove_lesson_number_pattern(text):
     """ Удаляет '№ X/Y' из строки. """
     txt = text.replace('\n', ' ')
-    pattern = r'№\s*\S+'
-    return re.sub(pattern, '', txt).strip()
+    return LESSON_NUMBER_TOKEN.sub('', txt).strip()
 
 def split_first_line(text):
     """
@@ -211,8 +621,8 @@ def remove_any_numbering(text: str) -> str:
         if not line:
             continue
         # Примеры: "1.", "2)", "• ", "- "
-        line = re.sub(r'^\d+[\.)]\s*', '', line)
-        line = re.sub(r'^[\-\•]\s*', '', line)
+        line = LEADING_NUMBER.sub('', line, count=1)
+        line = LEADING_BULLET.sub('', line, count=1)
         cleaned_lines.append(line)
     return "\n".join(cleaned_lines)
 
@@ -229,7 +639,7 @@ def expand_number_ranges(cell_value: str) -> str:
 
     for chunk in chunks:
         chunk = chunk.strip()
-        match = re.match(r'^(\d+)\s*-\s*(\d+)$', chunk)
+        match = NUMBER_RANGE_PATTERN.match(chunk)
         if match:
             start = int(match.group(1))
             end   = int(match.group(2))
@@ -270,13 +680,225 @@ def pick_lines_from_text(source_text: str, lines_str: str) -> str:
 
     return "\n".join(picked)
 
+def section_lines(section_text):
+    """
+    Индекс строк раздела: список строк без пробелов по краям,
+    строка с номером n (1-based) – lines[n-1]. Строится один раз на документ.
+    """
+    return [line.strip() for line in section_text.split('\n')]
+
+@functools.lru_cache(maxsize=4096)
+def parse_line_refs(lines_str):
+    """
+    Ссылка на строки ("1-4, 6") -> кортеж номеров (1, 2, 3, 4, 6) – то же,
+    что дают expand_number_ranges + pick_lines_from_text. Одинаковые ссылки
+    повторяются от занятия к занятию, поэтому разбор запоминается.
+    """
+    expanded = expand_number_ranges(lines_str)
+    if not expanded.strip():
+        return ()
+    chunks = (chunk.strip() for chunk in expanded.split(','))
+    return tuple(int(chunk) for chunk in chunks if chunk.isdigit())
+
+def pick_lines(lines, refs, keep_numbering=False):
+    """
+    Строки lines (section_lines) с номерами refs через \n; номера вне раздела
+    пропускаются. keep_numbering – перед строкой ставится ее номер в разделе.
+    """
+    n_lines = len(lines)
+    if keep_numbering:
+        return "\n".join(f"{n}. {lines[n - 1]}" for n in refs if 1 <= n <= n_lines)
+    return "\n".join(lines[n - 1] for n in refs if 1 <= n <= n_lines)
+
+def resolve_line_refs(refs_column, section_text, keep_numbering=False):
+    """
+    Значения столбца ссылок (col5/col6) -> выбранные строки раздела.
+    Раздел индексируется один раз, результат для одинаковых ссылок
+    вычисляется один раз.
+    """
+    lines = section_lines(section_text)
+    resolved = {}
+    result = []
+    for lines_str in refs_column:
+        picked = resolved.get(lines_str)
+        if picked is None:
+            picked = pick_lines(lines, parse_line_refs(lines_str), keep_numbering)
+            resolved[lines_str] = picked
+        result.append(picked)
+    return result
+
+# =============================================================================
+# КЭШ РЕЗУЛЬТАТОВ ПАРСИНГА
+# =============================================================================
+
+# Версия логики парсинга: увеличить при любом изменении, от которого зависит
+# итоговая таблица, – старые записи кэша перестанут находиться
+PARSER_VERSION = 2
+
+# Папка кэша разобранных таблиц (None – без кэша) и ее предельный размер
+PARSE_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "prsr-bnch", "parse")
+PARSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+_parse_cache = None
+
+def parse_cache_key(docx_path, table_num, start_row, keep_numbering=False):
+    """
+    Ключ кэша: хэш содержимого DOCX и всех настроек, влияющих на результат
+    (номер таблицы, первая строка, маркеры разделов, колонки, нумерация строк
+    разделов, версия парсера).
+    Имя и время изменения файла в ключ не входят: копия того же документа
+    находится в кэше, а измененный файл – нет.
+    """
+    settings = repr((PARSER_VERSION, table_num, start_row, bool(keep_numbering),
+                     sorted(SECTION_MARKERS.items()),
+                     DISCIPLINE_PATTERN.pattern, DISCIPLINE_PATTERN.flags,
+                     EXCLUDED_COLS, sorted(RENAME_MAP.items()), DESIRED_ORDER))
+    digest = hashlib.sha256(settings.encode("utf-8") + b"\0")
+    with open(docx_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ParseCache:
+    """
+    Дисковый кэш разобранных таблиц: по файлу на ключ (parse_cache_key),
+    DataFrame хранится в pickle. Размер папки ограничен max_bytes; при
+    переполнении удаляются записи, к которым дольше всего не обращались
+    (время обращения – mtime файла, обновляется при каждом попадании).
+    """
+
+    SUFFIX = ".pickle"
+
+    def __init__(self, cache_dir, max_bytes=PARSE_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, f"parse_{key}{self.SUFFIX}")
+
+    def get(self, key):
+        """ DataFrame для key или None, если записи нет (или она повреждена). """
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                df = pickle.load(f)
+        except FileNotFoundError:
+            df = None
+        except Exception:
+            # Поврежденная или несовместимая запись (например, другая версия pandas)
+            df = None
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        else:
+            try:
+                os.utime(path)   # отметка последнего обращения для LRU
+            except OSError:
+                pass             # только порядок вытеснения; запись цела
+        with self._lock:
+            if df is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return df
+
+    def put(self, key, df):
+        """ Сохраняет df под ключом key и вытесняет старые записи сверх max_bytes. """
+        path = self.path(key)
+        tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_file, "wb") as f:
+                pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, path)
+        except OSError as e:
+            # Кэш – только ускорение: без доступа к папке просто работаем без него
+            log.warning("Не удалось сохранить кэш разбора: %s", e)
+            return
+        self.evict(keep=path)
+
+    def entries(self):
+        """ [(mtime, размер, путь)] всех записей кэша. """
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return []
+        result = []
+        for name in names:
+            if not name.endswith(self.SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue   # запись удалена параллельно
+            result.append((st.st_mtime, st.st_size, path))
+        return result
+
+    def evict(self, keep=None):
+        """ Удаляет давно не использованные записи, пока кэш больше max_bytes. """
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        """ Счетчики попаданий/промахов/вытеснений и текущий размер кэша. """
+        entries = self.entries()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "size_bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+def get_parse_cache():
+    """ Общий кэш разбора в PARSE_CACHE_DIR или None, если кэш отключен. """
+    global _parse_cache
+    if not PARSE_CACHE_DIR:
+        return None
+    if _parse_cache is None or _parse_cache.cache_dir != PARSE_CACHE_DIR:
+        _parse_cache = ParseCache(PARSE_CACHE_DIR, PARSE_CACHE_MAX_BYTES)
+    return _parse_cache
+
+def parse_cache_stats():
+    """ Статистика общего кэша разбора (пустой словарь, если кэш отключен). """
+    cache = get_parse_cache()
+    return cache.stats() if cache else {}
+
 # =============================================================================
 # ГЛАВНАЯ ФУНКЦИЯ ПАРСИНГА
 # =============================================================================
 
-def parse_docx_to_xlsx(docx_path, xlsx_path):
+def _build_lesson_table(docx_path, backend, table_num, start_row, keep_numbering):
     """
-    1) Открыть DOCX
+    1) Открыть DOCX (backend: "python-docx" или "stream")
     2) Извлечь дисциплину
     3) Собрать литературу, мат. обеспечение, знать/уметь/владеть
     4) Считать таблицу => DataFrame
@@ -286,23 +908,37 @@ def parse_docx_to_xlsx(docx_path, xlsx_path):
     8) Для col6 берем строки из "Литература"
     9) Переименовываем col5->"материальное обеспечение на занятие"
        col6->"литература на занятие"
-    10) Сохраняем в XLSX
     """
-    doc = docx.Document(docx_path)
+    paragraph_texts, table_rows = load_docx_content(docx_path, backend, table_num, start_row)
 
-    # (1) Дисциплина
-    discipline_name = get_discipline_name(doc)
+    # (1), (2) Дисциплина и тексты разделов – за один проход по параграфам
+    with stage("parse.sections"):
+        discipline_name, sections = extract_sections(paragraph_texts)
 
-    # (2) Собираем тексты
-    literature_str = parse_text_between(doc, START_REF, END_REF)
-    material_str   = parse_text_between(doc, START_MATERIAL, END_MATERIAL)
-    know_str       = parse_text_between(doc, KNOW_START, KNOW_END)
-    skill_str      = parse_text_between(doc, SKILL_START, SKILL_END)
-    master_str     = parse_text_between(doc, MASTER_START, MASTER_END)
+    # (3) Таблица
+    with stage("parse.flatten"):
+        flat_data = flatten_table(table_rows, discipline_name=discipline_name)
+    with stage("parse.transforms"):
+        return build_lesson_table(flat_data, sections, keep_numbering)
+
+def build_lesson_table(flat_data, sections, keep_numbering=None):
+    """
+    Шаги (3)–(9) _build_lesson_table: строки flatten_table и тексты разделов
+    (extract_sections) -> итоговая таблица занятий.
+    keep_numbering – номера строк раздела в литературе/мат. обеспечении
+    на занятие (по умолчанию KEEP_SOURCE_NUMBERING).
+    Каждый столбец обрабатывается одним проходом по списку значений с заранее
+    скомпилированными шаблонами; связанные преобразования (номер и тип
+    занятия, название и вопросы, диапазон и выборка строк) сделаны за один
+    проход, без промежуточных столбцов.
+    """
+    import pandas as pd
+
+    if keep_numbering is None:
+        keep_numbering = KEEP_SOURCE_NUMBERING
+    literature_str = sections['literature']
+    material_str   = sections['material']
 
-    # (3) Чтение таблицы
-    table_rows = read_table_from_docx(doc, TABLE_NUMBER, START_ROW)
-    flat_data = flatten_table(table_rows, discipline_name=discipline_name)
     df = pd.DataFrame(flat_data)
 
     # Удаляем col1,col7
@@ -312,20 +948,25 @@ def parse_docx_to_xlsx(docx_path, xlsx_path):
     # (4) Обработка
     # A) "semester" -> цифра
     if 'semester' in df.columns:
-        df['semester'] = df['semester'].str.extract(r'(\d+)').fillna('')
+        df['semester'] = df['semester'].str.extract(SEMESTER_PATTERN, expand=False).fillna('')
 
     # B) "topic" -> "Номер темы", "Название темы"
     if 'topic' in df.columns:
-        pattern_topic = r'^Тема\s+№?\s*(\d+)\.?[\s]*(.*)$'
-        extracted = df['topic'].str.extract(pattern_topic, expand=True).fillna('')
+        extracted = df['topic'].str.extract(TOPIC_PATTERN, expand=True).fillna('')
         df['Номер темы'] = extracted[0]
         df['Название темы'] = extracted[1]
         df.drop(columns=['topic'], inplace=True)
 
     # C) col2 => "Тип занятия", "Номер занятия"
     if 'col2' in df.columns:
-        df['Номер занятия'] = df['col2'].apply(parse_lesson_number)
-        df['col2'] = df['col2'].apply(remove_lesson_number_pattern)
+        numbers, kinds = [], []
+        for text in df['col2'].tolist():
+            txt = text.replace('\n', ' ')
+            match = LESSON_NUMBER_PATTERN.search(txt)
+            numbers.append(match.group(1) if match else "")
+            kinds.append(LESSON_NUMBER_TOKEN.sub('', txt).strip())
+        df['Номер занятия'] = numbers
+        df['col2'] = kinds
         df.rename(columns={'col2': 'Тип занятия'}, inplace=True)
 
     # D) col3 => "Время в минутах" (×45)
@@ -334,31 +975,31 @@ def parse_docx_to_xlsx(docx_path, xlsx_path):
         df['Время в минутах'] = pd.to_numeric(df['Время в минутах'], errors='coerce').fillna(0)
         df['Время в минутах'] = (df['Время в минутах'] * 45).astype(int)
 
-    # E) col4 => "Учебные вопросы"; первая строка => "Название занятия"
+    # E) col4 => "Учебные вопросы"; первая строка => "Название занятия",
+    #    из остальных строк удаляем нумерацию
     if 'col4' in df.columns:
         df.rename(columns={'col4': 'Учебные вопросы'}, inplace=True)
-        df['Название занятия'], remainder = zip(*df['Учебные вопросы'].apply(split_first_line))
-        df['Учебные вопросы'] = remainder
+        titles, questions = [], []
+        for text in df['Учебные вопросы'].tolist():
+            title, remainder = split_first_line(text)
+            titles.append(title)
+            questions.append(remove_any_numbering(remainder))
+        df['Название занятия'] = titles
+        df['Учебные вопросы'] = questions
 
     # F) Добавляем новые поля (литература, матобесп, знать/уметь/владеть)
     df["Литература"] = literature_str
     df["Материальное обеспечение"] = material_str
-    df["Знать"] = know_str
-    df["Уметь"] = skill_str
-    df["Владеть"] = master_str
+    df["Знать"] = sections['know']
+    df["Уметь"] = sections['skill']
+    df["Владеть"] = sections['master']
 
-    # Удаляем нумерацию из "Учебные вопросы"
-    if 'Учебные вопросы' in df.columns:
-        df['Учебные вопросы'] = df['Учебные вопросы'].apply(remove_any_numbering)
-
-    # --- col5,col6 => разворачиваем диапазоны, потом берём соответствующие строки ---
+    # --- col5,col6 => разворачиваем диапазоны и берём соответствующие строки ---
     if 'col5' in df.columns:
-        df['col5'] = df['col5'].apply(expand_number_ranges)
-        df['col5'] = df['col5'].apply(lambda s: pick_lines_from_text(material_str, s))
+        df['col5'] = resolve_line_refs(df['col5'].tolist(), material_str, keep_numbering)
 
     if 'col6' in df.columns:
-        df['col6'] = df['col6'].apply(expand_number_ranges)
-        df['col6'] = df['col6'].apply(lambda s: pick_lines_from_text(literature_str, s))
+        df['col6'] = resolve_line_refs(df['col6'].tolist(), literature_str, keep_numbering)
 
     # Теперь переименовываем col5->"материальное обеспечение на занятие"
     #              и col6->"литература на занятие"
@@ -370,276 +1011,2676 @@ def parse_docx_to_xlsx(docx_path, xlsx_path):
     final_order = [c for c in DESIRED_ORDER if c in all_cols]
     remaining = [c for c in all_cols if c not in final_order]
     final_order += remaining
-    df = df[final_order]
+    return df[final_order]
 
-    # (5) Сохраняем
-    df.to_excel(xlsx_path, index=False, engine='openpyxl')
-    print("Парсинг завершен. Результат сохранен в:", xlsx_path)
-    print(df.head(15).to_string(index=False))
-    
+def parse_docx(docx_path, backend=None, table_num=None, start_row=None, use_cache=True,
+               keep_numbering=None):
+    """
+    Разбирает учебную программу docx_path и возвращает таблицу занятий (DataFrame).
+    Ничего не пишет и не печатает – сохранение делают экспортеры (export_table).
+    backend: "python-docx" или "stream", по умолчанию DOCX_BACKEND;
+    table_num/start_row – номер таблицы и первая строка, по умолчанию
+    TABLE_NUMBER/START_ROW; keep_numbering – см. KEEP_SOURCE_NUMBERING.
+    При use_cache результат берется из кэша разбора (см. get_parse_cache), если
+    этот же документ с теми же настройками уже разбирался – DOCX тогда не читается.
+    """
+    if table_num is None:
+        table_num = TABLE_NUMBER
+    if start_row is None:
+        start_row = START_ROW
+    if keep_numbering is None:
+        keep_numbering = KEEP_SOURCE_NUMBERING
+
+    cache = get_parse_cache() if use_cache else None
+    with stage("parse.cache_lookup"):
+        key = parse_cache_key(docx_path, table_num, start_row, keep_numbering) if cache else None
+        df = cache.get(key) if cache else None
+    count("parse_cache_hits" if df is not None else "parse_cache_misses")
+    if df is None:
+        df = _build_lesson_table(docx_path, backend, table_num, start_row, keep_numbering)
+        if cache:
+            with stage("parse.cache_store"):
+                cache.put(key, df)
+    count("lessons", len(df))
+    return df
+
+def parse_docx_to_xlsx(docx_path, xlsx_path, backend=None, table_num=None, start_row=None,
+                       use_cache=True):
+    """
+    parse_docx + сохранение в XLSX (если xlsx_path не задан – только разбор)
+    и печать первых строк таблицы. Оставлена для прежних вызовов.
+    """
+    df = parse_docx(docx_path, backend, table_num, start_row, use_cache)
+    if xlsx_path:
+        with stage("export", format=".xlsx"):
+            export_xlsx(df, xlsx_path)
+        log.info("Парсинг завершен. Результат сохранен в: %s", xlsx_path)
+    if log.isEnabledFor(logging.INFO):
+        log.info("%s", df.head(15).to_string(index=False))
     return df
 
 # =============================================================================
-# ФУНКЦИИ ДЛЯ РАБОТЫ С ШАБЛОНОМ DOCX
+# ЭКСПОРТ ТАБЛИЦЫ ЗАНЯТИЙ
 # =============================================================================
 
-def replace_placeholders(doc, replacements):
+def export_xlsx(df, xlsx_path, streaming=None):
     """
-    Заменяет плейсхолдеры в Word документе с учетом особенностей хранения текста в DOCX.
-    
-    :param doc: объект docx.Document
-    :param replacements: словарь {плейсхолдер: значение}
+    Таблица занятий -> XLSX. streaming (по умолчанию XLSX_STREAMING) –
+    потоковая запись write_xlsx_rows, иначе pandas/openpyxl.
     """
-    import tempfile
-    import zipfile
-    import os
-    import re
-    
-    print("Заменяемые плейсхолдеры:")
-    for key, value in replacements.items():
-        print(f"  {key} -> {value}")
-    
-    # Создаем временный файл для документа
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        # Сохраняем документ во временный файл
-        temp_docx = os.path.join(tmpdirname, 'template.docx')
-        doc.save(temp_docx)
-        
-        # Создаем папку для распаковки
-        extract_dir = os.path.join(tmpdirname, 'extracted')
-        os.makedirs(extract_dir, exist_ok=True)
-        
-        # Распаковываем docx (это zip-архив)
-        with zipfile.ZipFile(temp_docx, 'r') as zip_ref:
-            zip_ref.extractall(extract_dir)
-        
-        # Ищем все XML файлы с содержимым
-        xml_path = os.path.join(extract_dir, 'word')
-        xml_files = []
-        
-        # Добавляем основные XML файлы, которые могут содержать текст
-        document_xml = os.path.join(xml_path, 'document.xml')
-        if os.path.exists(document_xml):
-            xml_files.append(document_xml)
-            
-        # Ищем header*.xml и footer*.xml
-        for filename in os.listdir(xml_path):
-            if filename.startswith('header') or filename.startswith('footer'):
-                if filename.endswith('.xml'):
-                    xml_files.append(os.path.join(xml_path, filename))
-        
-        # Заменяем плейсхолдеры в каждом XML файле
-        for xml_file in xml_files:
-            try:
-                with open(xml_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                print(f"\nОбрабатываю файл: {os.path.basename(xml_file)}")
-                
-                # Подготовим словарь для замены без $ в ключах
-                clean_replacements = {}
-                for key, value in replacements.items():
-                    # Удаляем $ из ключа если он есть
-                    clean_key = key
-                    if clean_key.startswith('$'):
-                        clean_key = clean_key[1:]
-                    clean_replacements[clean_key] = value
-                
-                # Заменяем все плейсхолдеры (с $ и без)
-                for key, value in clean_replacements.items():
-                    # Пробуем разные варианты плейсхолдеров
-                    dollar_key = '$' + key  # С долларом
-                    
-                    # Замена всех вариантов плейсхолдеров
-                    if dollar_key in content:
-                        content = content.replace(dollar_key, str(value))
-                        print(f"  Заменено: {dollar_key} -> {value}")
-                    
-                    if key in content:
-                        content = content.replace(key, str(value))
-                        print(f"  Заменено: {key} -> {value}")
-                
-                # Сохраняем изменения
-                with open(xml_file, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                    
-            except Exception as e:
-                print(f"  Ошибка при обработке файла {os.path.basename(xml_file)}: {str(e)}")
-                continue
-        
-        # Создаем обновленный docx файл
-        new_docx = os.path.join(tmpdirname, 'result.docx')
-        with zipfile.ZipFile(new_docx, 'w') as zipf:
-            for root, dirs, files in os.walk(extract_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, extract_dir)
-                    zipf.write(file_path, arcname)
-        
-        # Загружаем новый документ
-        new_doc = Document(new_docx)
-        return new_doc
+    if streaming is None:
+        streaming = XLSX_STREAMING
+    if streaming:
+        write_xlsx_rows(xlsx_path, list(df.columns), df.itertuples(index=False, name=None))
+    else:
+        df.to_excel(xlsx_path, index=False, engine='openpyxl')
 
-def generate_lesson_docx(template_path, output_path, lesson_data, form_data):
+def export_csv(df, csv_path):
+    """ Таблица занятий -> CSV в UTF-8 с BOM (открывается в Excel без перекодировки). """
+    df.to_csv(csv_path, index=False, encoding='utf-8-sig')
+
+def export_json(df, json_path):
+    """ Таблица занятий -> JSON: список записей {столбец: значение}. """
+    df.to_json(json_path, orient='records', force_ascii=False, indent=2)
+
+# Экспортер по расширению файла
+EXPORTERS = {
+    '.xlsx': export_xlsx,
+    '.csv':  export_csv,
+    '.json': export_json,
+}
+
+def export_table(df, path):
+    """ Сохраняет таблицу занятий в формате, выбранном по расширению path. """
+    ext = os.path.splitext(path)[1].lower()
+    exporter = EXPORTERS.get(ext)
+    if exporter is None:
+        raise ValueError(f"Неизвестный формат экспорта {ext or path!r}; "
+                         f"поддерживаются: {', '.join(EXPORTERS)}")
+    with stage("export", format=ext):
+        exporter(df, path)
+
+# =============================================================================
+# ПОТОКОВАЯ ЗАПИСЬ XLSX
+# =============================================================================
+
+XLSX_STREAMING = True    # export_xlsx: True – write_xlsx_rows, False – pandas/openpyxl
+XLSX_SHEET_NAME = "Sheet1"
+XLSX_FLUSH_ROWS = 500    # сколько строк листа копится перед записью в архив
+
+# Управляющие символы, недопустимые в XML 1.0 (кроме \t, \n, \r), – выбрасываются
+XML_ILLEGAL_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+XLSX_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+XLSX_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+XLSX_CONTENT_TYPES = (
+    XML_DECLARATION +
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>')
+
+XLSX_ROOT_RELS = (
+    XML_DECLARATION +
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    f'<Relationship Id="rId1" Type="{XLSX_REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>')
+
+XLSX_WORKBOOK_RELS = (
+    XML_DECLARATION +
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    f'<Relationship Id="rId1" Type="{XLSX_REL_NS}/worksheet" Target="worksheets/sheet1.xml"/>'
+    f'<Relationship Id="rId2" Type="{XLSX_REL_NS}/sharedStrings" Target="sharedStrings.xml"/>'
+    f'<Relationship Id="rId3" Type="{XLSX_REL_NS}/styles" Target="styles.xml"/>'
+    '</Relationships>')
+
+# Стиль 1 – заголовок как у pandas.to_excel: жирный, с рамкой, по центру
+XLSX_STYLES = (
+    XML_DECLARATION +
+    f'<styleSheet xmlns="{XLSX_MAIN_NS}">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="2"><border><left/><right/><top/><bottom/><diagonal/></border>'
+    '<border><left style="thin"/><right style="thin"/><top style="thin"/>'
+    '<bottom style="thin"/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="1" xfId="0" applyFont="1" '
+    'applyBorder="1" applyAlignment="1"><alignment horizontal="center" vertical="top"/></xf>'
+    '</cellXfs><cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/>'
+    '</cellStyles></styleSheet>')
+
+def xlsx_column_letter(index):
+    """ Номер столбца с нуля -> буквы Excel: 0 -> 'A', 26 -> 'AA'. """
+    letters = ""
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, 26)
+        letters = chr(ord('A') + rest) + letters
+    return letters
+
+def xlsx_text(value):
+    """ Текст для <t>: без недопустимых символов, экранированный. """
+    text = xml_escape(XML_ILLEGAL_CHARS.sub('', value))
+    if text != text.strip():
+        return f'<t xml:space="preserve">{text}</t>'
+    return f'<t>{text}</t>'
+
+def _numpy_bool():
     """
-    Генерирует DOCX файл для занятия, заполняя шаблон данными.
-    
-    :param template_path: путь к шаблону DOCX
-    :param output_path: путь для сохранения результата
-    :param lesson_data: DataFrame Series с данными занятия
-    :param form_data: словарь с данными из формы
-    :return: успешно ли создан документ
+    numpy.bool_ (значения bool-столбцов DataFrame) – не bool и не число.
+    Если numpy не загружен, таких значений нет: пустой кортеж, без импорта.
     """
-    try:
-        print(f"\nГенерация документа: {output_path}")
-        print(f"Используемый шаблон: {template_path}")
-        
-        doc = Document(template_path)
-        
-        # Собираем все замены из формы и данных занятия в один словарь
-        replacements = {}
-        
-        # Сначала добавляем данные из формы (с $)
-        for key, value in form_data.items():
-            replacements[f"${key}"] = value
-        
-        # Затем добавляем данные из занятия (lesson_data)
-        replacements["$ДИСЦИПЛИНА"] = lesson_data.get("Дисциплина", "")
-        replacements["$ВИДЗАНЯТИЯ"] = lesson_data.get("Тип занятия", "")
-        replacements["$ТЕМАЗАНЯТИЯ"] = f"№ {lesson_data.get('Номер темы', '')}/{lesson_data.get('Номер занятия', '')} {lesson_data.get('Название темы', '')}"
-        
-        # Обрабатываем знать/уметь/владеть в зависимости от типа занятия
-        lesson_type = lesson_data.get("Тип занятия", "").lower()
-        know_text = lesson_data.get("Знать", "")
-        skill_text = lesson_data.get("Уметь", "")
-        master_text = lesson_data.get("Владеть", "")
-        
-        # Устанавливаем поля знать/уметь/владеть согласно типу занятия
-        if "групповое" in lesson_type:
-            replacements["$ЗНАТЬ"] = know_text
-            replacements["$УМЕТЬ"] = skill_text
-            replacements["$ВЛАДЕТЬ"] = ""
-        elif "лекция" in lesson_type:
-            replacements["$ЗНАТЬ"] = know_text
-            replacements["$УМЕТЬ"] = ""
-            replacements["$ВЛАДЕТЬ"] = ""
-        elif "практическое" in lesson_type:
-            replacements["$ЗНАТЬ"] = ""
-            replacements["$УМЕТЬ"] = skill_text
-            replacements["$ВЛАДЕТЬ"] = master_text
-        elif "семинар" in lesson_type:
-            replacements["$ЗНАТЬ"] = know_text
-            replacements["$УМЕТЬ"] = ""
-            replacements["$ВЛАДЕТЬ"] = ""
-        else:
-            # По умолчанию
-            replacements["$ЗНАТЬ"] = know_text
-            replacements["$УМЕТЬ"] = skill_text
-            replacements["$ВЛАДЕТЬ"] = master_text
-        
-        # Форматируем учебные вопросы
-        questions = lesson_data.get("Учебные вопросы", "")
-        if questions:
-            # Форматируем как список с номерами
-            lines = questions.strip().split('\n')
-            formatted_questions = f"> {lesson_data.get('Название занятия', '')}\n>\n"
-            for i, q in enumerate(lines, 1):
-                if q.strip():
-                    formatted_questions += f"> {i}. {q.strip()}\n"
-        else:
-            formatted_questions = f"> {lesson_data.get('Название занятия', '')}"
-        
-        replacements["$УЧЕБНЫЕВОПРОСЫ"] = formatted_questions
-        
-        # Устанавливаем время, литературу и технические средства
-        replacements["$ВРЕМЯ"] = str(lesson_data.get("Время в минутах", ""))
-        
-        # Используем либо литературу для конкретного занятия, либо общую
-        lit_text = lesson_data.get("Литература на занятие", "")
-        if not lit_text:
-            lit_text = lesson_data.get("Литература", "")
-        replacements["$ЛИТЕРАТУРА"] = lit_text
-        
-        # Технические средства
-        replacements["$ТЕХСРЕДСТВА"] = "1. Компьютер\n2. Проектор\n3. Презентация по теме"
-        
-        print("Сформированы замены для плейсхолдеров:")
-        for key, value in replacements.items():
-            val_preview = str(value)[:50] + "..." if len(str(value)) > 50 else value
-            print(f"  {key} -> {val_preview}")
-        
-        # Заменяем плейсхолдеры и сохраняем
-        new_doc = replace_placeholders(doc, replacements)
-        new_doc.save(output_path)
-        print(f"Документ успешно сохранен: {output_path}")
-        return True
-    except Exception as e:
-        print(f"Ошибка при создании документа: {str(e)}")
-        return False
+    numpy = sys.modules.get("numpy")
+    return numpy.bool_ if numpy is not None else ()
 
-# Функция сохранения всех занятий как DOCX (для GUI)
-def save_all_lessons(parsed_df, template_file, output_dir, form_data):
+def _xlsx_cell(ref, value, strings, style=""):
     """
-    Сохраняет все занятия из DataFrame как DOCX файлы
-    
-    :param parsed_df: DataFrame с данными занятий
-    :param template_file: путь к шаблону DOCX
-    :param output_dir: директория для сохранения результатов
-    :param form_data: словарь с данными из формы
-    :return: tuple(количество успешно созданных файлов, общее количество)
+    XML ячейки ref. Строки идут в таблицу общих строк strings
+    ({текст: номер}), числа и логические значения пишутся как есть,
+    None/NaN – пустая ячейка (ничего не пишется).
     """
-    if parsed_df is None or parsed_df.empty:
-        return 0, 0
-    
-    # Счетчики
-    total = len(parsed_df)
-    success = 0
-    
-    # Для каждой строки DataFrame создаем файл
-    for idx, row in parsed_df.iterrows():
-        topic_num = row.get('Номер темы', '')
-        lesson_num = row.get('Номер занятия', '')
-        
-        if not topic_num or not lesson_num:
-            continue
-            
-        # Формируем имя файла
-        filename = f"Тема_{topic_num}_Занятие_{lesson_num}.docx"
-        output_path = os.path.join(output_dir, filename)
-        
-        # Генерируем документ
-        if generate_lesson_docx(template_file, output_path, row, form_data):
-            success += 1
-    
-    return success, total
+    if value is None:
+        return ""
+    if not isinstance(value, str):   # строки – почти все ячейки, проверяются первыми
+        if isinstance(value, bool) or isinstance(value, _numpy_bool()):
+            return f'<c r="{ref}"{style} t="b"><v>{int(value)}</v></c>'
+        if isinstance(value, numbers.Integral):
+            return f'<c r="{ref}"{style}><v>{int(value)}</v></c>'
+        if isinstance(value, numbers.Real):
+            value = float(value)
+            if math.isnan(value) or math.isinf(value):
+                return ""
+            return f'<c r="{ref}"{style}><v>{value!r}</v></c>'
+        value = str(value)
+    index = strings.get(value)
+    if index is None:
+        index = strings[value] = len(strings)
+    return f'<c r="{ref}"{style} t="s"><v>{index}</v></c>'
+
+def write_xlsx_rows(xlsx_path, columns, rows, sheet_name=None):
+    """
+    Потоковая запись XLSX: строки rows (последовательности значений в порядке
+    columns или словари {столбец: значение}, например из генератора) пишутся
+    в архив по мере поступления, пачками по XLSX_FLUSH_ROWS, – в памяти не
+    строится ни книга, ни лист.
+    Все тексты хранятся один раз в таблице общих строк (sharedStrings.xml):
+    разделы, повторяющиеся в каждой строке (литература, знать/уметь/владеть),
+    занимают место только однажды. Память – только уникальные тексты.
+    Возвращает число записанных строк данных.
+    """
+    columns = list(columns)
+    letters = [xlsx_column_letter(i) for i in range(len(columns))]
+    strings = {}
+    n_rows = 0
+
+    with zipfile.ZipFile(xlsx_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", XLSX_CONTENT_TYPES)
+        zf.writestr("_rels/.rels", XLSX_ROOT_RELS)
+        zf.writestr("xl/workbook.xml",
+                    f'{XML_DECLARATION}<workbook xmlns="{XLSX_MAIN_NS}" xmlns:r="{XLSX_REL_NS}">'
+                    f'<sheets><sheet name="{xml_escape(sheet_name or XLSX_SHEET_NAME)}" '
+                    f'sheetId="1" r:id="rId1"/></sheets></workbook>')
+        zf.writestr("xl/_rels/workbook.xml.rels", XLSX_WORKBOOK_RELS)
+        zf.writestr("xl/styles.xml", XLSX_STYLES)
+
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            header = "".join(_xlsx_cell(f"{letter}1", str(name), strings, ' s="1"')
+                             for letter, name in zip(letters, columns))
+            buffer = [f'{XML_DECLARATION}<worksheet xmlns="{XLSX_MAIN_NS}"><sheetData>'
+                      f'<row r="1">{header}</row>']
+
+            for row_num, row in enumerate(rows, start=2):
+                if isinstance(row, dict):
+                    row = [row.get(name) for name in columns]
+                cells = []
+                for letter, value in zip(letters, row):
+                    cell = _xlsx_cell(f"{letter}{row_num}", value, strings)
+                    if cell:
+                        cells.append(cell)
+                buffer.append(f'<row r="{row_num}">{"".join(cells)}</row>')
+                n_rows += 1
+                if len(buffer) >= XLSX_FLUSH_ROWS:
+                    sheet.write("".join(buffer).encode("utf-8"))
+                    buffer = []
+
+            buffer.append('</sheetData></worksheet>')
+            sheet.write("".join(buffer).encode("utf-8"))
+
+        with zf.open("xl/sharedStrings.xml", "w", force_zip64=True) as sst:
+            sst.write(f'{XML_DECLARATION}<sst xmlns="{XLSX_MAIN_NS}" '
+                      f'uniqueCount="{len(strings)}">'.encode("utf-8"))
+            buffer = []
+            for text in strings:
+                buffer.append(f'<si>{xlsx_text(text)}</si>')
+                if len(buffer) >= XLSX_FLUSH_ROWS:
+                    sst.write("".join(buffer).encode("utf-8"))
+                    buffer = []
+            buffer.append('</sst>')
+            sst.write("".join(buffer).encode("utf-8"))
+
+    return n_rows
 
 # =============================================================================
-# GUI: CUSTOMTKINTER
+# ФУНКЦИИ ДЛЯ РАБОТЫ С ШАБЛОНОМ DOCX
 # =============================================================================
 
-def run_gui():
-    ctk.set_appearance_mode("System")
-    ctk.set_default_color_theme("blue")
+# Член zip-архива в сжатом виде: данные копируются между архивами без пересжатия
+ZipMember = namedtuple(
+    "ZipMember", "name method crc compress_size file_size date_time data")
 
-    app = ctk.CTk()
-    app.title("Парсер DOCX -> XLSX и генератор планов занятий")
-    app.geometry("1100x600")
+def read_zip_members(zip_bytes):
+    """
+    Читает архив в список ZipMember в исходном порядке. Сжатые данные берутся
+    из архива как есть (по локальному заголовку), без распаковки.
+    """
+    members = []
+    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zf:
+        for info in zf.infolist():
+            offset = info.header_offset
+            name_len, extra_len = struct.unpack("<HH", zip_bytes[offset + 26:offset + 30])
+            start = offset + 30 + name_len + extra_len
+            members.append(ZipMember(info.filename, info.compress_type, info.CRC,
+                                     info.compress_size, info.file_size, info.date_time,
+                                     zip_bytes[start:start + info.compress_size]))
+    return members
 
-    # Переменные для хранения значений
-    selected_docx = tk.StringVar(value="Файл не выбран")
-    parsed_data = {"df": None}  # Хранение DataFrame
-    
-    # Переменные для полей формы
-    selected_lesson = tk.StringVar()
-    day = tk.StringVar(value="04")
-    month = tk.StringVar(value="февраля")
-    year = tk.StringVar(value="2025")
-    chief = tk.StringVar(value="В. Пупкин")
-    group_number = tk.StringVar(value="ИКТВ-11")
-    lesson_date = tk.StringVar(value="16.05.2025")
-    classroom = tk.StringVar(value="324")
-    instructor = tk.StringVar(value="Д. Иванов")
-    
+def make_zip_member(name, data, date_time=(1980, 1, 1, 0, 0, 0)):
+    """ Сжимает data (deflate) в новый ZipMember. """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    packed = compressor.compress(data) + compressor.flush()
+    return ZipMember(name, zipfile.ZIP_DEFLATED, zlib.crc32(data),
+                     len(packed), len(data), date_time, packed)
+
+def inflate_zip_member(member):
+    """ Распакованное содержимое ZipMember. """
+    if member.method == zipfile.ZIP_STORED:
+        return member.data
+    if member.method == zipfile.ZIP_DEFLATED:
+        return zlib.decompress(member.data, -15)
+    raise ValueError(f"Неподдерживаемый метод сжатия {member.method} в {member.name}")
+
+def build_zip(members):
+    """ Собирает zip-архив (байты) из ZipMember, сжатые данные пишутся как есть. """
+    out = []
+    central = []
+    offset = 0
+    for m in members:
+        name = m.name.encode("utf-8")
+        flags = 0 if m.name.isascii() else 0x800   # бит 11: имя в UTF-8
+        year, month, day, hour, minute, second = m.date_time
+        dos_time = (hour << 11) | (minute << 5) | (second // 2)
+        dos_date = ((year - 1980) << 9) | (month << 5) | day
+
+        header = struct.pack("<4s5H3L2H", b"PK\x03\x04", 20, flags, m.method,
+                             dos_time, dos_date, m.crc, m.compress_size, m.file_size,
+                             len(name), 0)
+        out += [header, name, m.data]
+        central.append(struct.pack("<4s6H3L5H2L", b"PK\x01\x02", 20, 20, flags, m.method,
+                                   dos_time, dos_date, m.crc, m.compress_size, m.file_size,
+                                   len(name), 0, 0, 0, 0, 0, offset) + name)
+        offset += len(header) + len(name) + len(m.data)
+
+    central_dir = b"".join(central)
+    end_record = struct.pack("<4s4H2LH", b"PK\x05\x06", 0, 0, len(members), len(members),
+                             len(central_dir), offset, 0)
+    return b"".join(out) + central_dir + end_record
+
+def substitute_placeholders(content, replacements):
+    """
+    Однопроходная подстановка значений в XML-строку части документа.
+
+    Все плейсхолдеры ('$ИМЯ' и 'ИМЯ', длинные имена раньше коротких) ищутся
+    одним заранее скомпилированным выражением за один проход по тексту;
+    вставленные значения экранируются для XML и повторно не просматриваются.
+
+    :param content: XML части документа
+    :param replacements: словарь {плейсхолдер ('$ИМЯ' или 'ИМЯ'): значение}
+    :return: tuple(новая строка, {найденный плейсхолдер: число замен})
+    """
+    values = {clean_placeholder_key(k): xml_escape(str(v)) for k, v in replacements.items()}
+    pattern = cached_placeholder_pattern(tuple(sorted(values)))
+    counts = {}
+
+    def substitute(match):
+        found = match.group(0)
+        counts[found] = counts.get(found, 0) + 1
+        return values[match.group(1)]
+
+    return pattern.sub(substitute, content), counts
+
+def replace_in_xml(content, replacements):
+    """
+    Заменяет плейсхолдеры в XML-строке части документа (с '$' и без).
+    :return: новая строка
+    """
+    content, counts = substitute_placeholders(content, replacements)
+    if log.isEnabledFor(logging.DEBUG):
+        values = {clean_placeholder_key(k): v for k, v in replacements.items()}
+        for found in counts:
+            log.debug("  Заменено: %s -> %s", found, values[clean_placeholder_key(found)])
+    count("placeholders_replaced", sum(counts.values()))
+    return content
+
+def render_docx_bytes(docx_bytes, replacements):
+    """
+    Подставляет значения в DOCX целиком в памяти: байты на входе, байты на выходе.
+    Переписываются только document.xml, header*.xml и footer*.xml, в которых
+    что-то заменилось; остальные части копируются в сжатом виде без пересжатия.
+
+    :param docx_bytes: содержимое DOCX
+    :param replacements: словарь {плейсхолдер: значение}
+    :return: содержимое нового DOCX
+    """
+    members = read_zip_members(docx_bytes)
+    result = []
+    for member in members:
+        if is_template_part(member.name):
+            try:
+                log.debug("Обрабатываю файл: %s", os.path.basename(member.name))
+                content = inflate_zip_member(member).decode("utf-8")
+                new_content = replace_in_xml(content, replacements)
+                if new_content != content:
+                    member = make_zip_member(member.name, new_content.encode("utf-8"),
+                                             member.date_time)
+            except Exception as e:
+                log.error("Ошибка при обработке файла %s: %s", os.path.basename(member.name), e)
+        result.append(member)
+    return build_zip(result)
+
+def replace_placeholders(doc, replacements):
+    """
+    Заменяет плейсхолдеры в Word документе с учетом особенностей хранения текста в DOCX.
+    Вся работа идет в памяти (render_docx_bytes), без временных файлов.
+    
+    :param doc: объект docx.Document
+    :param replacements: словарь {плейсхолдер: значение}
+    :return: новый объект docx.Document
+    """
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Заменяемые плейсхолдеры:")
+        for key, value in replacements.items():
+            log.debug("  %s -> %s", key, value)
+
+    from docx import Document
+
+    buf = io.BytesIO()
+    doc.save(buf)
+    return Document(io.BytesIO(render_docx_bytes(buf.getvalue(), replacements)))
+
+# =============================================================================
+# СКОМПИЛИРОВАННЫЕ ШАБЛОНЫ (Template.docx разбирается один раз на все занятия)
+# =============================================================================
+
+# Плейсхолдеры шаблона: поля формы и поля, заполняемые из данных занятия
+FORM_FIELDS = [
+    'НАЧАЛЬНИК', 'ЧИСЛА', 'МЕСЯЦА', 'ГОДА',
+    'ГРУППАНОМЕР', 'ДАТАПРОВЕДЕНИЯ', 'АУДИТОРИЯ', 'РУКОВОДИТЕЛЬ',
+]
+LESSON_FIELDS = [
+    'ДИСЦИПЛИНА', 'ВИДЗАНЯТИЯ', 'ТЕМАЗАНЯТИЯ', 'ЗНАТЬ', 'УМЕТЬ', 'ВЛАДЕТЬ',
+    'УЧЕБНЫЕВОПРОСЫ', 'ВРЕМЯ', 'ЛИТЕРАТУРА', 'ТЕХСРЕДСТВА',
+]
+TEMPLATE_FIELDS = FORM_FIELDS + LESSON_FIELDS
+
+TEMPLATE_CACHE_DIR = None   # папка дискового кэша шаблонов (None – кэш только в памяти)
+TEMPLATE_CACHE_VERSION = 2  # увеличить при изменении устройства CompiledTemplate
+
+TEMPLATE_MEMORY_CACHE_SIZE = 32   # скомпилированных шаблонов в памяти (давно не нужные вытесняются)
+
+_compiled_templates = OrderedDict()   # ключ кэша -> CompiledTemplate, последние использованные – в конце
+_compiled_templates_lock = threading.Lock()
+
+XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+
+def is_template_part(name):
+    """ Части DOCX с плейсхолдерами: word/document.xml, word/header*.xml, word/footer*.xml """
+    if name == "word/document.xml":
+        return True
+    folder, _, filename = name.rpartition("/")
+    return (folder == "word" and filename.endswith(".xml")
+            and (filename.startswith("header") or filename.startswith("footer")))
+
+def clean_placeholder_key(key):
+    """ '$ГОДА' -> 'ГОДА' (как в replace_placeholders: снимается один '$'). """
+    return key[1:] if key.startswith('$') else key
+
+def placeholder_pattern(fields):
+    """
+    Регулярное выражение для плейсхолдеров: '$ИМЯ' или просто 'ИМЯ',
+    более длинные имена проверяются раньше коротких. Группа 1 – имя поля.
+    """
+    names = sorted({f for f in fields if f}, key=lambda n: (-len(n), n))
+    if not names:
+        return re.compile(r'(?!)()')
+    return re.compile(r'\$?(' + '|'.join(re.escape(n) for n in names) + r')')
+
+@functools.lru_cache(maxsize=64)
+def cached_placeholder_pattern(fields):
+    """ placeholder_pattern с кэшем по кортежу имен полей. """
+    return placeholder_pattern(fields)
+
+def xml_escape(value):
+    """ Экранирует текст для вставки в XML части DOCX. """
+    return (value.replace("&", "&amp;").replace("<", "&lt;")
+                 .replace(">", "&gt;").replace('"', "&quot;"))
+
+def merge_split_placeholders(xml_bytes, pattern):
+    """
+    Word часто разбивает '$ПЛЕЙСХОЛДЕР' на несколько w:r (правка, проверка
+    орфографии, смена форматирования). Для каждого параграфа ищет плейсхолдеры
+    в склеенном тексте w:t и переносит разбитые целиком в первый w:t.
+    Возвращает XML части строкой (без изменений, если склеивать нечего).
+    """
+    from lxml import etree
+
+    root = etree.fromstring(xml_bytes)
+    changed = False
+
+    for p in root.iter(W_P):
+        t_nodes = [t for t in p.iter(W_T) if next(t.iterancestors(W_P)) is p]
+        if len(t_nodes) < 2:
+            continue
+
+        texts = [t.text or "" for t in t_nodes]
+        starts = []
+        pos = 0
+        for text in texts:
+            starts.append(pos)
+            pos += len(text)
+
+        # С конца, чтобы смещения более ранних совпадений оставались верными
+        touched = set()
+        for m in reversed(list(pattern.finditer("".join(texts)))):
+            first = bisect.bisect_right(starts, m.start()) - 1
+            last = bisect.bisect_right(starts, m.end() - 1) - 1
+            if first == last:
+                continue
+            texts[first] = texts[first][:m.start() - starts[first]] + m.group(0)
+            for i in range(first + 1, last):
+                texts[i] = ""
+            texts[last] = texts[last][m.end() - starts[last]:]
+            touched.update(range(first, last + 1))
+
+        for i in touched:
+            t_nodes[i].text = texts[i]
+            t_nodes[i].set(XML_SPACE, "preserve")
+        changed = changed or bool(touched)
+
+    if not changed:
+        return xml_bytes.decode("utf-8")
+    return etree.tostring(root, encoding="UTF-8", xml_declaration=True,
+                          standalone=True).decode("utf-8")
+
+# Разрывы между занятиями в объединенном документе
+PAGE_BREAK_XML = '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+BODY_START_PATTERN = re.compile(r'<w:body\b[^>]*>')
+SECT_PR_PATTERN = re.compile(r'<w:sectPr[\s>]')
+BOOKMARK_ID_PATTERN = re.compile(r'(<w:bookmark(?:Start|End)\b[^>]*?\bw:id=")(\d+)"')
+COMMENT_ID_PATTERN = re.compile(r'(<w:comment(?:RangeStart|RangeEnd|Reference)?\b[^>]*?\bw:id=")(\d+)"')
+COMMENT_PATTERN = re.compile(r'<w:comment\b[^>]*?\bw:id="\d+".*?</w:comment>', re.S)
+DOC_PR_ID_PATTERN = re.compile(r'(<wp:docPr\b[^>]*?\bid=")(\d+)"')
+# Части пакета, где кроме тела бывают рисунки, закладки и примечания
+ID_PARTS_PATTERN = re.compile(r'word/(?:header|footer|footnotes|endnotes|comments)\d*\.xml$')
+PARA_ID_PATTERN = re.compile(r'\sw14:(?:paraId|textId)="[^"]*"')
+
+def split_document_body(xml):
+    """
+    Делит word/document.xml на (начало по <w:body> включительно, содержимое тела,
+    завершающий w:sectPr тела или "", конец от </w:body>).
+    """
+    start = BODY_START_PATTERN.search(xml)
+    end = xml.rindex("</w:body>")
+    if start is None:
+        raise ValueError("В word/document.xml нет w:body")
+    body = xml[start.end():end]
+
+    sect_pr = ""
+    last = None
+    for last in SECT_PR_PATTERN.finditer(body):
+        pass
+    if last is not None:
+        tail = body[last.start():]
+        empty = re.match(r'<w:sectPr\b[^>]*/>', tail)
+        close = empty.end() if empty else tail.find("</w:sectPr>") + len("</w:sectPr>")
+        # Свойства последнего раздела – прямой потомок w:body в самом конце
+        if close >= len("</w:sectPr>") and not tail[close:].strip():
+            sect_pr = tail[:close]
+            body = body[:last.start()]
+    return xml[:start.end()], body, sect_pr, xml[end:]
+
+def max_xml_id(pattern, parts):
+    """ Наибольший id (группа 2 pattern) в строках parts; -1, если их нет. """
+    return max((int(m.group(2)) for part in parts for m in pattern.finditer(part)), default=-1)
+
+def shift_xml_ids(pattern, xml, shift):
+    """ Прибавляет shift к id (группа 2 pattern) в xml. """
+    return pattern.sub(lambda m: f'{m.group(1)}{int(m.group(2)) + shift}"', xml)
+
+def renumber_body_ids(body, copy, bookmark_stride, comment_stride, doc_pr_ids):
+    """
+    Уникальные идентификаторы для copy-й копии тела документа: id закладок
+    и примечаний сдвигаются на copy * bookmark_stride (comment_stride),
+    wp:docPr получают следующие номера из doc_pr_ids (itertools.count),
+    а w14:paraId/textId копий убираются (атрибуты необязательные, Word
+    создаст их сам).
+    """
+    if copy:
+        body = shift_xml_ids(BOOKMARK_ID_PATTERN, body, copy * bookmark_stride)
+        if "<w:comment" in body:
+            body = shift_xml_ids(COMMENT_ID_PATTERN, body, copy * comment_stride)
+        body = PARA_ID_PATTERN.sub("", body)
+    if "<wp:docPr" in body:
+        body = DOC_PR_ID_PATTERN.sub(lambda m: f'{m.group(1)}{next(doc_pr_ids)}"', body)
+    return body
+
+class CompiledTemplate:
+    """
+    Шаблон DOCX, разобранный один раз.
+
+    Для частей с плейсхолдерами (document.xml, header*.xml, footer*.xml)
+    хранится XML, заранее разрезанный на статичные куски и слоты плейсхолдеров;
+    остальные части пакета хранятся в сжатом виде как есть. Рендер занятия –
+    склейка строк и сжатие только измененных частей.
+    """
+
+    def __init__(self, template_bytes, fields=None):
+        self.fields = tuple(sorted(set(TEMPLATE_FIELDS if fields is None else fields)))
+        self.digest = hashlib.sha256(template_bytes).hexdigest()
+        self.members = read_zip_members(template_bytes)   # части пакета в сжатом виде
+        self.parts = {}     # имя части -> (статичные куски, слоты (имя поля, исходный текст))
+
+        pattern = placeholder_pattern(self.fields)
+        for member in self.members:
+            if not is_template_part(member.name):
+                continue
+            xml = merge_split_placeholders(inflate_zip_member(member), pattern)
+            chunks, slots = [], []
+            pos = 0
+            for m in pattern.finditer(xml):
+                chunks.append(xml[pos:m.start()])
+                slots.append((m.group(1), m.group(0)))
+                pos = m.end()
+            chunks.append(xml[pos:])
+            if slots:
+                self.parts[member.name] = (chunks, slots)
+
+    @property
+    def placeholder_count(self):
+        """ Сколько всего мест подстановки в шаблоне. """
+        return sum(len(slots) for _, slots in self.parts.values())
+
+    def render_parts(self, replacements):
+        """
+        :param replacements: словарь {плейсхолдер ('$ИМЯ' или 'ИМЯ'): значение}
+        :return: словарь {имя части: XML в байтах} для частей с плейсхолдерами.
+        Плейсхолдеры без значения остаются в тексте как есть.
+        """
+        values = self._escaped_values(replacements)
+        return {name: self._render_part(name, values).encode("utf-8") for name in self.parts}
+
+    @staticmethod
+    def _escaped_values(replacements):
+        return {clean_placeholder_key(k): xml_escape(str(v)) for k, v in replacements.items()}
+
+    def _render_part(self, name, values):
+        """ XML части name (строкой) с подставленными экранированными значениями values. """
+        part = self.parts.get(name)
+        if part is None:
+            member = next(m for m in self.members if m.name == name)
+            return inflate_zip_member(member).decode("utf-8")
+        chunks, slots = part
+        out = [chunks[0]]
+        for (field, original), chunk in zip(slots, chunks[1:]):
+            out.append(values.get(field, original))
+            out.append(chunk)
+        return "".join(out)
+
+    def render(self, replacements):
+        """
+        Готовый DOCX (байты) с подставленными значениями. Сжимаются заново только
+        части с плейсхолдерами, остальные копируются в сжатом виде как есть.
+        """
+        with stage("render.substitute"):
+            rendered = self.render_parts(replacements)
+        if metrics_enabled():
+            fields = {clean_placeholder_key(k) for k in replacements}
+            count("placeholders_replaced", sum(1 for _, slots in self.parts.values()
+                                               for field, _ in slots if field in fields))
+        with stage("render.zip"):
+            return build_zip([
+                make_zip_member(m.name, rendered[m.name], m.date_time) if m.name in rendered else m
+                for m in self.members
+            ])
+
+    def render_combined(self, replacements_list, break_type="page"):
+        """
+        Один DOCX из нескольких занятий: тело word/document.xml заполняется для
+        каждого набора замен, и тела идут подряд через разрыв страницы ("page")
+        или раздела ("section", с теми же параметрами страницы и колонтитулами).
+        Стили, нумерация, колонтитулы и остальные части пакета – одни на весь
+        документ; плейсхолдеры колонтитулов заполняются значениями первого занятия.
+        Идентификаторы рисунков, закладок и примечаний копий не совпадают ни
+        друг с другом, ни с уже занятыми в других частях пакета; примечания
+        (word/comments.xml) повторяются для каждой копии.
+        """
+        if not replacements_list:
+            raise ValueError("Нет занятий для объединенного документа")
+        if break_type not in ("page", "section"):
+            raise ValueError(f"Неизвестный тип разрыва: {break_type}")
+
+        with stage("render.substitute"):
+            document = "word/document.xml"
+            bodies = []
+            for replacements in replacements_list:
+                head, body, sect_pr, tail = split_document_body(
+                    self._render_part(document, self._escaped_values(replacements)))
+                bodies.append(body)
+
+            values = self._escaped_values(replacements_list[0])
+            others = {m.name: self._render_part(m.name, values) for m in self.members
+                      if m.name in self.parts and m.name != document
+                      or ID_PARTS_PATTERN.match(m.name)}
+            # Шаг сдвига – больше любого id тела и остальных частей (колонтитулы,
+            # сноски): копии не пересекаются ни между собой, ни с ними
+            bookmark_stride = max_xml_id(BOOKMARK_ID_PATTERN, [bodies[0], *others.values()]) + 1
+            comment_stride = max_xml_id(COMMENT_ID_PATTERN, [bodies[0], *others.values()]) + 1
+            doc_pr_ids = itertools.count(max_xml_id(DOC_PR_ID_PATTERN, others.values()) + 1)
+            separator = (f"<w:p><w:pPr>{sect_pr}</w:pPr></w:p>"
+                         if break_type == "section" and sect_pr else PAGE_BREAK_XML)
+            combined = separator.join(
+                renumber_body_ids(body, copy, bookmark_stride, comment_stride, doc_pr_ids)
+                for copy, body in enumerate(bodies))
+
+            rendered = {name: others[name].encode("utf-8")
+                        for name in self.parts if name != document}
+            comments = others.get("word/comments.xml")
+            if comments and len(bodies) > 1 and COMMENT_PATTERN.search(comments):
+                entries = "".join(m.group(0) for m in COMMENT_PATTERN.finditer(comments))
+                entries = PARA_ID_PATTERN.sub("", entries)
+                copies = "".join(shift_xml_ids(COMMENT_ID_PATTERN, entries, copy * comment_stride)
+                                 for copy in range(1, len(bodies)))
+                end = comments.rindex("</w:comments>")
+                rendered["word/comments.xml"] = f"{comments[:end]}{copies}{comments[end:]}".encode("utf-8")
+            rendered[document] = f"{head}{combined}{sect_pr}{tail}".encode("utf-8")
+        with stage("render.zip"):
+            return build_zip([
+                make_zip_member(m.name, rendered[m.name], m.date_time) if m.name in rendered else m
+                for m in self.members
+            ])
+
+def template_fields(form_data):
+    """ Поля шаблона для набора данных формы: TEMPLATE_FIELDS + ключи формы. """
+    return TEMPLATE_FIELDS + [clean_placeholder_key(k) for k in form_data]
+
+def load_compiled_template(template_path, fields=None, cache_dir=None):
+    """
+    Возвращает CompiledTemplate для template_path из кэша.
+    Ключ кэша – хэш содержимого файла и набора полей, так что изменённый
+    шаблон компилируется заново, а тот же файл – никогда.
+    Кэш всегда есть в памяти, а при заданном cache_dir (или TEMPLATE_CACHE_DIR)
+    скомпилированный шаблон сохраняется еще и на диск.
+    """
+    with stage("template.load"):
+        with open(template_path, "rb") as f:
+            template_bytes = f.read()
+        return _compiled_template(template_bytes, fields, cache_dir)
+
+def compile_template_bytes(template_bytes, fields=None, cache_dir=None):
+    """ Как load_compiled_template, но для шаблона в памяти (например, загруженного по HTTP). """
+    with stage("template.load"):
+        return _compiled_template(template_bytes, fields, cache_dir)
+
+def _compiled_template(template_bytes, fields, cache_dir):
+    fields = tuple(sorted(set(TEMPLATE_FIELDS if fields is None else fields)))
+    key_source = f"{TEMPLATE_CACHE_VERSION}\0{chr(0).join(fields)}\0".encode("utf-8")
+    key = hashlib.sha256(key_source + template_bytes).hexdigest()
+
+    with _compiled_templates_lock:
+        compiled = _compiled_templates.get(key)
+        if compiled is not None:
+            _compiled_templates.move_to_end(key)
+            return compiled
+
+    if cache_dir is None:
+        cache_dir = TEMPLATE_CACHE_DIR
+    cache_file = os.path.join(cache_dir, f"template_{key}.pickle") if cache_dir else None
+
+    if cache_file and os.path.exists(cache_file):
+        try:
+            with open(cache_file, "rb") as f:
+                compiled = pickle.load(f)
+        except Exception:
+            compiled = None   # поврежденный файл кэша – просто компилируем заново
+
+    if compiled is None:
+        compiled = CompiledTemplate(template_bytes, fields)
+        if cache_file:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, "wb") as f:
+                pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, cache_file)
+
+    with _compiled_templates_lock:
+        _compiled_templates[key] = compiled
+        _compiled_templates.move_to_end(key)
+        while len(_compiled_templates) > TEMPLATE_MEMORY_CACHE_SIZE:
+            _compiled_templates.popitem(last=False)
+    return compiled
+
+def build_lesson_replacements(lesson_data, form_data):
+    """
+    Собирает словарь замен для шаблона из данных формы и данных занятия.
+
+    :param lesson_data: данные занятия (Series, словарь – всё, что поддерживает .get)
+    :param form_data: словарь с данными из формы
+    :return: словарь {плейсхолдер: значение}
+    """
+    # Собираем все замены из формы и данных занятия в один словарь
+    replacements = {}
+    
+    # Сначала добавляем данные из формы (с $)
+    for key, value in form_data.items():
+        replacements[f"${key}"] = value
+    
+    # Затем добавляем данные из занятия (lesson_data)
+    replacements["$ДИСЦИПЛИНА"] = lesson_data.get("Дисциплина", "")
+    replacements["$ВИДЗАНЯТИЯ"] = lesson_data.get("Тип занятия", "")
+    replacements["$ТЕМАЗАНЯТИЯ"] = f"№ {lesson_data.get('Номер темы', '')}/{lesson_data.get('Номер занятия', '')} {lesson_data.get('Название темы', '')}"
+    
+    # Обрабатываем знать/уметь/владеть в зависимости от типа занятия
+    lesson_type = lesson_data.get("Тип занятия", "").lower()
+    know_text = lesson_data.get("Знать", "")
+    skill_text = lesson_data.get("Уметь", "")
+    master_text = lesson_data.get("Владеть", "")
+    
+    # Устанавливаем поля знать/уметь/владеть согласно типу занятия
+    if "групповое" in lesson_type:
+        replacements["$ЗНАТЬ"] = know_text
+        replacements["$УМЕТЬ"] = skill_text
+        replacements["$ВЛАДЕТЬ"] = ""
+    elif "лекция" in lesson_type:
+        replacements["$ЗНАТЬ"] = know_text
+        replacements["$УМЕТЬ"] = ""
+        replacements["$ВЛАДЕТЬ"] = ""
+    elif "практическое" in lesson_type:
+        replacements["$ЗНАТЬ"] = ""
+        replacements["$УМЕТЬ"] = skill_text
+        replacements["$ВЛАДЕТЬ"] = master_text
+    elif "семинар" in lesson_type:
+        replacements["$ЗНАТЬ"] = know_text
+        replacements["$УМЕТЬ"] = ""
+        replacements["$ВЛАДЕТЬ"] = ""
+    else:
+        # По умолчанию
+        replacements["$ЗНАТЬ"] = know_text
+        replacements["$УМЕТЬ"] = skill_text
+        replacements["$ВЛАДЕТЬ"] = master_text
+    
+    # Форматируем учебные вопросы
+    questions = lesson_data.get("Учебные вопросы", "")
+    if questions:
+        # Форматируем как список с номерами
+        lines = questions.strip().split('\n')
+        formatted_questions = f"> {lesson_data.get('Название занятия', '')}\n>\n"
+        for i, q in enumerate(lines, 1):
+            if q.strip():
+                formatted_questions += f"> {i}. {q.strip()}\n"
+    else:
+        formatted_questions = f"> {lesson_data.get('Название занятия', '')}"
+    
+    replacements["$УЧЕБНЫЕВОПРОСЫ"] = formatted_questions
+    
+    # Устанавливаем время, литературу и технические средства
+    replacements["$ВРЕМЯ"] = str(lesson_data.get("Время в минутах", ""))
+    
+    # Используем либо литературу для конкретного занятия, либо общую
+    lit_text = lesson_data.get("Литература на занятие", "")
+    if not lit_text:
+        lit_text = lesson_data.get("Литература", "")
+    replacements["$ЛИТЕРАТУРА"] = lit_text
+    
+    # Технические средства
+    replacements["$ТЕХСРЕДСТВА"] = "1. Компьютер\n2. Проектор\n3. Презентация по теме"
+
+    return replacements
+
+def generate_lesson_docx(template_path, output_path, lesson_data, form_data):
+    """
+    Генерирует DOCX файл для занятия, заполняя шаблон данными.
+    
+    :param template_path: путь к шаблону DOCX
+    :param output_path: путь для сохранения результата
+    :param lesson_data: DataFrame Series с данными занятия
+    :param form_data: словарь с данными из формы
+    :return: успешно ли создан документ
+    """
+    try:
+        log.debug("Генерация документа: %s (шаблон %s)", output_path, template_path)
+        
+        # Шаблон компилируется один раз и дальше берется из кэша
+        template = load_compiled_template(template_path, template_fields(form_data))
+        replacements = build_lesson_replacements(lesson_data, form_data)
+        
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Сформированы замены для плейсхолдеров:")
+            for key, value in replacements.items():
+                val_preview = str(value)[:50] + "..." if len(str(value)) > 50 else value
+                log.debug("  %s -> %s", key, val_preview)
+        
+        # Подставляем значения в скомпилированный шаблон и сохраняем
+        data = template.render(replacements)
+        with stage("render.write"):
+            with open(output_path, "wb") as f:
+                f.write(data)
+        log.info("Документ сохранен: %s", output_path)
+        return True
+    except Exception as e:
+        log.error("Ошибка при создании документа %s: %s", output_path, e)
+        return False
+
+# =============================================================================
+# ПАКЕТНАЯ ГЕНЕРАЦИЯ (пул процессов)
+# =============================================================================
+
+GENERATION_WORKERS = None   # число процессов генерации (None – по числу ядер)
+PARALLEL_MIN_LESSONS = 32   # меньше занятий – генерируем в текущем процессе (пул дороже)
+
+# Поля записи занятия: атрибут LessonRecord -> столбец таблицы (порядок – DESIRED_ORDER)
+LESSON_RECORD_FIELDS = [
+    ('discipline',        'Дисциплина'),
+    ('topic_title',       'Название темы'),
+    ('topic_number',      'Номер темы'),
+    ('lesson_type',       'Тип занятия'),
+    ('lesson_title',      'Название занятия'),
+    ('lesson_number',     'Номер занятия'),
+    ('questions',         'Учебные вопросы'),
+    ('minutes',           'Время в минутах'),
+    ('lesson_material',   'Материальное обеспечение на занятие'),
+    ('lesson_literature', 'Литература на занятие'),
+    ('know',              'Знать'),
+    ('skill',             'Уметь'),
+    ('master',            'Владеть'),
+    ('semester',          'Семестр'),
+    ('literature',        'Литература'),
+    ('material',          'Материальное обеспечение'),
+]
+LESSON_RECORD_COLUMNS = [column for _, column in LESSON_RECORD_FIELDS]
+
+def _plain_value(value):
+    """ numpy-скаляр -> обычное значение Python (меньше и быстрее при передаче в процесс). """
+    return value.item() if hasattr(value, "item") else value
+
+class LessonRecord(namedtuple("LessonRecord", [name for name, _ in LESSON_RECORD_FIELDS])):
+    """
+    Неизменяемая запись занятия – одна строка таблицы.
+    Поля доступны как атрибуты (record.topic_number), а .get('Номер темы')
+    работает как у строки DataFrame, так что запись подходит везде, где раньше
+    передавалась Series (build_lesson_replacements, lesson_filename).
+    __slots__ = () – у экземпляров нет __dict__; в процесс пула запись
+    передается как обычный кортеж.
+    """
+
+    __slots__ = ()
+    _column_index = {column: i for i, (_, column) in enumerate(LESSON_RECORD_FIELDS)}
+
+    def get(self, key, default=None):
+        """ Значение по имени столбца ('Номер темы') или атрибута ('topic_number'). """
+        index = self._column_index.get(key)
+        if index is not None:
+            return self[index]
+        return getattr(self, key) if key in self._fields else default
+
+    @property
+    def label(self):
+        """ Подпись в списке занятий: '№ тема/занятие название'. """
+        return f"№ {self.topic_number}/{self.lesson_number} {self.lesson_title}"
+
+    @property
+    def filename(self):
+        return lesson_filename(self)
+
+    @classmethod
+    def from_row(cls, row):
+        """ Запись из строки DataFrame или словаря {столбец: значение}; нет столбца – "". """
+        return cls._make(_plain_value(row.get(column, "")) for column in LESSON_RECORD_COLUMNS)
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """ Записи всех строк таблицы по порядку – без iterrows и Series на строку. """
+        frame = df.reindex(columns=LESSON_RECORD_COLUMNS, fill_value="")
+        make = cls._make
+        return [make(values) for values in frame.itertuples(index=False, name=None)]
+
+def lessons_to_dataframe(records):
+    """ Записи занятий -> таблица (столбцы LESSON_RECORD_COLUMNS) для экспорта. """
+    import pandas as pd
+
+    return pd.DataFrame.from_records(list(records), columns=LESSON_RECORD_COLUMNS)
+
+class LessonIndex:
+    """
+    Занятия таблицы с поиском за O(1): по (номер темы, номер занятия) и по
+    подписи из выпадающего списка. Строится один раз после разбора.
+    При повторах номеров или подписей находится первое занятие (как при
+    прежнем поиске перебором строк).
+    """
+
+    def __init__(self, records):
+        self.records = list(records)
+        self.by_number = {}
+        self.by_label = {}
+        for record in self.records:
+            self.by_label.setdefault(record.label, record)
+            if record.topic_number and record.lesson_number:
+                self.by_number.setdefault((str(record.topic_number),
+                                           str(record.lesson_number)), record)
+
+    @classmethod
+    def from_dataframe(cls, df):
+        return cls(LessonRecord.from_dataframe(df))
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, topic_number, lesson_number):
+        return self.by_number.get((str(topic_number), str(lesson_number)))
+
+    def find(self, label):
+        return self.by_label.get(label)
+
+    def labels(self):
+        """ Подписи занятий с номерами темы и занятия – для выпадающего списка, без повторов. """
+        return list(dict.fromkeys(record.label for record in self.records
+                                  if record.topic_number and record.lesson_number))
+
+    def to_dataframe(self):
+        return lessons_to_dataframe(self.records)
+
+# Результат генерации одного занятия; skipped – файл не менялся (см. LessonManifest)
+LessonResult = namedtuple("LessonResult", "filename ok error seconds skipped", defaults=(False,))
+
+DUPLICATE_FILENAME_ERROR = "Имя файла совпадает с занятием ниже по таблице"
+CANCELLED_ERROR = "Отменено"
+
+def lesson_filename(lesson_data):
+    """ 'Тема_{n}_Занятие_{m}.docx' или None, если у занятия нет номеров. """
+    topic_num = lesson_data.get('Номер темы', '')
+    lesson_num = lesson_data.get('Номер занятия', '')
+    if not topic_num or not lesson_num:
+        return None
+    return f"Тема_{topic_num}_Занятие_{lesson_num}.docx"
+
+def lesson_record(row):
+    """ Запись занятия (LessonRecord) из строки DataFrame. """
+    return LessonRecord.from_row(row)
+
+def lesson_records(parsed_df):
+    """ Список (имя файла, запись) для строк с номерами темы и занятия, по порядку. """
+    records = []
+    for record in LessonRecord.from_dataframe(parsed_df):
+        filename = record.filename
+        if filename:
+            records.append((filename, record))
+    return records
+
+# Состояние процесса-генератора: шаблон и форма передаются один раз на процесс
+_worker_template = None
+_worker_form_data = None
+
+# Манифест в папке занятий: для каждого файла – хэши его входных данных
+LESSON_MANIFEST_FILE = ".lessons_manifest.json"
+LESSON_MANIFEST_VERSION = 2   # увеличить при изменении build_lesson_replacements/рендера
+
+def json_sha256(value):
+    """ sha256 канонического JSON значения (ключи по порядку). """
+    data = json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+class LessonManifest:
+    """
+    Манифест сгенерированных занятий (output_dir/LESSON_MANIFEST_FILE):
+    имя файла -> {"inputs": {"row", "form", "template"}, "size", "mtime_ns"}.
+    Занятие актуально, если хэши записи занятия, данных формы и шаблона те же,
+    а файл на месте и не изменялся после генерации (размер и mtime как записаны).
+    Удаляются как "осиротевшие" только файлы из манифеста – чужие файлы
+    в папке не трогаются.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, LESSON_MANIFEST_FILE)
+        self.files = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == LESSON_MANIFEST_VERSION:
+                self.files = data.get("files", {})
+        except (OSError, ValueError):
+            pass
+
+    def _stat(self, filename):
+        try:
+            st = os.stat(os.path.join(self.output_dir, filename))
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def is_current(self, filename, inputs):
+        entry = self.files.get(filename)
+        if not entry or entry["inputs"] != inputs:
+            return False
+        return self._stat(filename) == (entry["size"], entry["mtime_ns"])
+
+    def record(self, filename, inputs):
+        stat = self._stat(filename)
+        if stat is None:
+            self.files.pop(filename, None)
+            return
+        self.files[filename] = {"inputs": inputs, "size": stat[0], "mtime_ns": stat[1]}
+
+    def forget(self, filename):
+        self.files.pop(filename, None)
+
+    def remove_orphans(self, keep):
+        """ Удаляет файлы манифеста, которых нет в keep; возвращает их имена. """
+        removed = []
+        for filename in [name for name in self.files if name not in keep]:
+            try:
+                os.remove(os.path.join(self.output_dir, os.path.basename(filename)))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                log.warning("Не удалось удалить %s: %s", filename, e)
+                continue
+            del self.files[filename]
+            removed.append(filename)
+        return removed
+
+    def save(self):
+        tmp_file = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"version": LESSON_MANIFEST_VERSION, "files": self.files}, f,
+                      ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_file, self.path)
+
+def _init_lesson_worker(template, form_data):
+    global _worker_template, _worker_form_data
+    _worker_template = template
+    _worker_form_data = form_data
+
+def _render_lesson_task(task):
+    """ Генерирует одно занятие в процессе пула; task = (путь, запись). """
+    output_path, record = task
+    start = time.perf_counter()
+    try:
+        replacements = build_lesson_replacements(record, _worker_form_data)
+        data = _worker_template.render(replacements)
+        with stage("render.write"):
+            with open(output_path, "wb") as f:
+                f.write(data)
+        error = None
+    except Exception as e:
+        error = str(e)
+    return LessonResult(os.path.basename(output_path), error is None, error,
+                        time.perf_counter() - start)
+
+def _generation_workers(workers, task_count):
+    """ Сколько процессов генерации запускать для task_count занятий (1 – без пула). """
+    if workers is None:
+        workers = GENERATION_WORKERS or os.cpu_count() or 1
+        if task_count < PARALLEL_MIN_LESSONS:
+            workers = 1
+    if not task_count:
+        return 1
+    return max(1, min(workers, task_count))
+
+def _report_lesson_results(results, workers):
+    """ Метрики пакета занятий: время каждого занятия и счетчики результатов. """
+    if not metrics_enabled():
+        return
+    # Этапы внутри процессов пула в хуки этого процесса не попадают,
+    # поэтому время каждого занятия передается отсюда, из результатов
+    for result in results:
+        if result.seconds:
+            emit_metric({"type": "stage", "name": "render.lesson",
+                         "seconds": result.seconds, "workers": workers})
+    count("lessons_generated", sum(1 for r in results if r.ok))
+    count("lessons_failed", sum(1 for r in results if not r.ok))
+
+def generate_lessons(records, template_file, output_dir, form_data, workers=None,
+                     progress=None, cancel_event=None, incremental=False, rebuild=False):
+    """
+    Генерирует DOCX для списка занятий, распределяя работу по процессам.
+
+    :param records: список (имя файла, запись занятия), см. lesson_records
+    :param template_file: путь к шаблону DOCX
+    :param output_dir: директория для сохранения результатов
+    :param form_data: словарь с данными из формы
+    :param workers: число процессов (None – GENERATION_WORKERS или число ядер,
+                    для небольших пакетов – без пула; 1 – всегда без пула)
+    :param progress: необязательный вызов progress(готово, всего) после каждого занятия
+    :param cancel_event: необязательный threading.Event; если установлен,
+                         еще не начатые занятия не генерируются
+    :param incremental: генерировать только занятия, у которых изменились запись,
+                        данные формы или шаблон (см. LessonManifest), и удалить
+                        файлы занятий, которых больше нет в records
+    :param rebuild: вместе с incremental – сгенерировать все занятия заново,
+                    но манифест обновить (следующий запуск снова инкрементальный)
+    :return: список LessonResult в порядке records
+
+    Шаблон компилируется один раз и передается каждому процессу при его запуске,
+    задачи содержат только путь и компактную запись занятия. Если несколько
+    занятий дают одно имя файла, записывается последнее (как при
+    последовательной генерации), а для остальных возвращается ошибка.
+    """
+    template = load_compiled_template(template_file, template_fields(form_data))
+
+    last_index = {filename: i for i, (filename, _) in enumerate(records)}
+    tasks = [(os.path.join(output_dir, filename), record)
+             for i, (filename, record) in enumerate(records) if last_index[filename] == i]
+
+    manifest = None
+    unchanged = {}
+    if incremental:
+        manifest = LessonManifest(output_dir)
+        form_hash = json_sha256(form_data)
+        template_hash = template.digest
+        inputs = {}
+        for output_path, record in tasks:
+            filename = os.path.basename(output_path)
+            inputs[filename] = {"row": json_sha256(record), "form": form_hash,
+                                "template": template_hash}
+        for output_path, _ in tasks:
+            filename = os.path.basename(output_path)
+            if not rebuild and manifest.is_current(filename, inputs[filename]):
+                unchanged[filename] = LessonResult(filename, True, None, 0.0, True)
+        tasks = [task for task in tasks if os.path.basename(task[0]) not in unchanged]
+        count("lessons_unchanged", len(unchanged))
+    rendered = [None] * len(tasks)
+    workers = _generation_workers(workers, len(tasks))
+
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    if workers == 1:
+        _init_lesson_worker(template, form_data)
+        for pos, task in enumerate(tasks):
+            if cancelled():
+                break
+            rendered[pos] = _render_lesson_task(task)
+            if progress:
+                progress(pos + 1, len(tasks))
+    else:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_lesson_worker,
+                                 initargs=(template, form_data)) as executor:
+            futures = {executor.submit(_render_lesson_task, task): pos
+                       for pos, task in enumerate(tasks)}
+            for done, future in enumerate(as_completed(futures), start=1):
+                if progress:
+                    progress(done, len(tasks))
+                if cancelled():
+                    for pending in futures:
+                        pending.cancel()
+                    break
+        # Пул закрыт: уже начатые к моменту отмены занятия тоже дописаны
+        for future, pos in futures.items():
+            if not future.cancelled():
+                rendered[pos] = future.result()
+
+    results = []
+    pos = 0
+    for i, (filename, _) in enumerate(records):
+        if last_index[filename] != i:
+            results.append(LessonResult(filename, False, DUPLICATE_FILENAME_ERROR, 0.0))
+            continue
+        if filename in unchanged:
+            results.append(unchanged[filename])
+            continue
+        result = rendered[pos]
+        pos += 1
+        results.append(result if result is not None
+                       else LessonResult(filename, False, CANCELLED_ERROR, 0.0))
+
+    if manifest is not None:
+        for result in results:
+            if result.ok and not result.skipped:
+                manifest.record(result.filename, inputs[result.filename])
+            elif not result.ok and result.error != DUPLICATE_FILENAME_ERROR:
+                manifest.forget(result.filename)   # при следующем запуске – заново
+        if not cancelled():
+            for filename in manifest.remove_orphans(set(inputs)):
+                log.info("Удалено занятие, которого больше нет в программе: %s", filename)
+        manifest.save()
+
+    _report_lesson_results(results, workers)
+    return results
+
+def save_all_lessons(parsed_df, template_file, output_dir, form_data, workers=None,
+                     progress=None, cancel_event=None, incremental=False):
+    """
+    Сохраняет все занятия из DataFrame как DOCX файлы
+    
+    :param parsed_df: DataFrame с данными занятий
+    :param template_file: путь к шаблону DOCX
+    :param output_dir: директория для сохранения результатов
+    :param form_data: словарь с данными из формы
+    :param workers: число процессов генерации (см. generate_lessons)
+    :param progress: progress(готово, всего), см. generate_lessons
+    :param cancel_event: threading.Event для отмены, см. generate_lessons
+    :param incremental: перегенерировать только измененные занятия, см. generate_lessons
+    :return: tuple(количество успешно созданных или актуальных файлов, общее количество)
+    """
+    if parsed_df is None or parsed_df.empty:
+        return 0, 0
+
+    total = len(parsed_df)
+    results = generate_lessons(lesson_records(parsed_df), template_file, output_dir,
+                               form_data, workers, progress, cancel_event, incremental)
+    for result in results:
+        if not result.ok:
+            log.error("Ошибка при создании документа %s: %s", result.filename, result.error)
+
+    return sum(1 for result in results if result.ok), total
+
+# =============================================================================
+# АРХИВ ЗАНЯТИЙ (все занятия одним ZIP, без отдельных файлов на диске)
+# =============================================================================
+
+BUNDLE_INDEX_CSV = "index.csv"     # оглавление архива: занятие -> файл в архиве
+BUNDLE_INDEX_JSON = "index.json"
+BUNDLE_PREFETCH = 4                # заданий на процесс пула, отправленных вперед
+
+# Столбцы оглавления: (ключ в JSON, заголовок CSV, столбец записи занятия или None)
+BUNDLE_INDEX_COLUMNS = [
+    ("file",          "Файл",             None),
+    ("discipline",    "Дисциплина",       "Дисциплина"),
+    ("semester",      "Семестр",          "Семестр"),
+    ("topic_number",  "Номер темы",       "Номер темы"),
+    ("lesson_number", "Номер занятия",    "Номер занятия"),
+    ("lesson_type",   "Тип занятия",      "Тип занятия"),
+    ("lesson_title",  "Название занятия", "Название занятия"),
+    ("size",          "Размер",           None),
+    ("error",         "Ошибка",           None),
+]
+
+# Результат занятия в архиве: как LessonResult, плюс размер документа в байтах
+BundleResult = namedtuple("BundleResult", "filename ok error seconds size")
+
+def _render_lesson_data_task(record):
+    """ Генерирует одно занятие в процессе пула без записи на диск; -> (данные, ошибка, секунды). """
+    start = time.perf_counter()
+    try:
+        data = _worker_template.render(build_lesson_replacements(record, _worker_form_data))
+        error = None
+    except Exception as e:
+        data, error = None, str(e)
+    return data, error, time.perf_counter() - start
+
+def _iter_rendered_lessons(records, template, form_data, workers, cancelled):
+    """
+    Рендерит занятия и выдает (данные, ошибка, секунды) строго в порядке records.
+    В пуле вперед отправляется не больше workers * BUNDLE_PREFETCH заданий,
+    так что в памяти одновременно только несколько готовых документов.
+    После отмены новые занятия не начинаются.
+    """
+    if workers == 1:
+        _init_lesson_worker(template, form_data)
+        for record in records:
+            if cancelled():
+                return
+            yield _render_lesson_data_task(record)
+        return
+
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_lesson_worker,
+                             initargs=(template, form_data)) as executor:
+        pending = deque()
+        queued = iter(records)
+        for record in queued:
+            pending.append(executor.submit(_render_lesson_data_task, record))
+            if len(pending) >= workers * BUNDLE_PREFETCH:
+                break
+        while pending:
+            result = pending.popleft().result()
+            if cancelled():
+                for future in pending:
+                    future.cancel()
+                yield result
+                return
+            record = next(queued, None)
+            if record is not None:
+                pending.append(executor.submit(_render_lesson_data_task, record))
+            yield result
+
+def bundle_index_rows(tasks, results):
+    """ Строки оглавления архива (словари по BUNDLE_INDEX_COLUMNS) для занятий tasks. """
+    rows = []
+    for (filename, record), result in zip(tasks, results):
+        row = {key: _plain_value(record.get(column, "")) if column else None
+               for key, _, column in BUNDLE_INDEX_COLUMNS}
+        row["file"] = filename if result.ok else None
+        row["size"] = result.size if result.ok else None
+        row["error"] = result.error
+        rows.append(row)
+    return rows
+
+def bundle_index_csv(rows):
+    """ Оглавление в CSV (utf-8 с BOM, как export_csv – открывается в Excel). """
+    import csv
+
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\r\n")
+    writer.writerow([title for _, title, _ in BUNDLE_INDEX_COLUMNS])
+    for row in rows:
+        writer.writerow(["" if row[key] is None else row[key] for key, _, _ in BUNDLE_INDEX_COLUMNS])
+    return out.getvalue().encode("utf-8-sig")
+
+def write_lessons_bundle(records, template_file, target, form_data, workers=None,
+                         progress=None, cancel_event=None):
+    """
+    Генерирует занятия и пишет их одним ZIP-архивом по мере готовности:
+    никаких временных файлов на занятие, вся программа – одна
+    последовательная запись. В конце архива – оглавление BUNDLE_INDEX_CSV
+    и BUNDLE_INDEX_JSON (занятие -> файл в архиве, размер, ошибка).
+
+    :param records: список (имя файла, запись занятия), см. lesson_records
+    :param template_file: путь к шаблону DOCX или готовый CompiledTemplate
+    :param target: путь к ZIP (пишется во временный файл и подменяется целиком)
+                   или открытый на запись бинарный поток (можно без seek, например stdout)
+    :param form_data: словарь с данными из формы
+    :param workers, progress, cancel_event: как у generate_lessons
+    :return: список BundleResult в порядке records
+
+    DOCX и так сжат, поэтому занятия кладутся в архив без повторного сжатия.
+    Повторяющиеся имена файлов – как в generate_lessons: в архив попадает
+    последнее занятие, для остальных возвращается ошибка.
+    """
+    if not isinstance(target, (str, os.PathLike)):
+        return _write_lessons_bundle(records, template_file, target, form_data,
+                                     workers, progress, cancel_event)
+
+    tmp_file = f"{os.fspath(target)}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_file, "wb") as f:
+            results = _write_lessons_bundle(records, template_file, f, form_data,
+                                            workers, progress, cancel_event)
+        os.replace(tmp_file, target)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    return results
+
+def _write_lessons_bundle(records, template_file, stream, form_data, workers,
+                          progress, cancel_event):
+    if isinstance(template_file, CompiledTemplate):
+        template = template_file
+    else:
+        template = load_compiled_template(template_file, template_fields(form_data))
+
+    last_index = {filename: i for i, (filename, _) in enumerate(records)}
+    tasks = [(filename, record) for i, (filename, record) in enumerate(records)
+             if last_index[filename] == i]
+    workers = _generation_workers(workers, len(tasks))
+
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    written = []
+    date_time = time.localtime()[:6]
+    with zipfile.ZipFile(stream, "w", zipfile.ZIP_STORED, allowZip64=True) as bundle:
+        rendered = _iter_rendered_lessons([record for _, record in tasks], template,
+                                          form_data, workers, cancelled)
+        for pos, ((filename, _), (data, error, seconds)) in enumerate(zip(tasks, rendered), 1):
+            if data is not None:
+                with stage("bundle.write"):
+                    bundle.writestr(zipfile.ZipInfo(filename, date_time), data)
+            written.append(BundleResult(filename, error is None, error, seconds,
+                                        len(data) if data is not None else 0))
+            if progress:
+                progress(pos, len(tasks))
+        written += [BundleResult(filename, False, CANCELLED_ERROR, 0.0, 0)
+                    for filename, _ in tasks[len(written):]]
+
+        rows = bundle_index_rows(tasks, written)
+        with stage("bundle.index"):
+            bundle.writestr(zipfile.ZipInfo(BUNDLE_INDEX_CSV, date_time),
+                            bundle_index_csv(rows), zipfile.ZIP_DEFLATED)
+            bundle.writestr(zipfile.ZipInfo(BUNDLE_INDEX_JSON, date_time),
+                            json.dumps(rows, ensure_ascii=False, indent=1).encode("utf-8"),
+                            zipfile.ZIP_DEFLATED)
+
+    by_name = {result.filename: result for result in written}
+    results = [by_name[filename] if last_index[filename] == i
+               else BundleResult(filename, False, DUPLICATE_FILENAME_ERROR, 0.0, 0)
+               for i, (filename, _) in enumerate(records)]
+    _report_lesson_results(results, workers)
+    return results
+
+def save_lessons_bundle(parsed_df, template_file, target, form_data, workers=None,
+                        progress=None, cancel_event=None):
+    """
+    Сохраняет все занятия из DataFrame одним ZIP-архивом (см. write_lessons_bundle).
+
+    :return: tuple(количество занятий в архиве, общее количество)
+    """
+    if parsed_df is None or parsed_df.empty:
+        return 0, 0
+
+    total = len(parsed_df)
+    results = write_lessons_bundle(lesson_records(parsed_df), template_file, target,
+                                   form_data, workers, progress, cancel_event)
+    for result in results:
+        if not result.ok:
+            log.error("Ошибка при создании документа %s: %s", result.filename, result.error)
+
+    return sum(1 for result in results if result.ok), total
+
+# =============================================================================
+# ОБЪЕДИНЕННЫЕ ДОКУМЕНТЫ (все занятия темы или семестра в одном DOCX)
+# =============================================================================
+
+# Группировка: ключ -> (столбец записи занятия или None – все занятия, начало имени файла)
+COMBINE_GROUPS = {
+    "topic":    ("Номер темы", "Тема"),
+    "semester": ("Семестр",    "Семестр"),
+    "all":      (None,         "Все_занятия"),
+}
+
+def combined_lesson_groups(records, group_by="topic"):
+    """
+    Группирует занятия для объединенных документов.
+
+    :param records: список (имя файла, запись занятия), см. lesson_records
+    :param group_by: ключ COMBINE_GROUPS
+    :return: список (имя файла документа, [записи занятий]) в порядке первого
+             появления группы; занятия внутри группы – в порядке таблицы
+    """
+    if group_by not in COMBINE_GROUPS:
+        raise ValueError(f"Неизвестная группировка: {group_by}")
+    column, prefix = COMBINE_GROUPS[group_by]
+    groups = {}
+    for _, record in records:
+        key = str(record.get(column, "")).strip() if column else ""
+        groups.setdefault(key, []).append(record)
+    return [(f"{prefix}_{key}.docx" if column else f"{prefix}.docx", group)
+            for key, group in groups.items()]
+
+# Подписи группировок в интерфейсе
+COMBINE_CHOICES = {"По темам": "topic", "По семестрам": "semester", "Все в один": "all"}
+
+def generate_combined_docx(template_path, output_path, lessons, form_data, break_type="page"):
+    """
+    Генерирует один DOCX со всеми занятиями lessons подряд (см. CompiledTemplate.render_combined).
+
+    :param template_path: путь к шаблону DOCX
+    :param output_path: путь для сохранения результата
+    :param lessons: записи занятий (LessonRecord, Series – всё, что поддерживает .get)
+    :param form_data: словарь с данными из формы
+    :param break_type: "page" – разрыв страницы между занятиями, "section" – разрыв раздела
+    :return: успешно ли создан документ
+    """
+    try:
+        template = load_compiled_template(template_path, template_fields(form_data))
+        data = template.render_combined(
+            [build_lesson_replacements(lesson, form_data) for lesson in lessons], break_type)
+        with stage("render.write"):
+            with open(output_path, "wb") as f:
+                f.write(data)
+        count("lessons_combined", len(lessons))
+        log.info("Документ сохранен: %s (занятий: %d)", output_path, len(lessons))
+        return True
+    except Exception as e:
+        log.error("Ошибка при создании документа %s: %s", output_path, e)
+        return False
+
+def save_combined_lessons(parsed_df, template_file, output_dir, form_data, group_by="topic",
+                          break_type="page", progress=None, cancel_event=None):
+    """
+    Сохраняет занятия из DataFrame объединенными документами: по одному DOCX
+    на тему ("topic"), семестр ("semester") или один на все занятия ("all").
+
+    :param progress: progress(готово, всего) после каждого документа
+    :param cancel_event: threading.Event; если установлен, следующие документы не создаются
+    :return: tuple(количество созданных документов, общее количество документов)
+    """
+    if parsed_df is None or parsed_df.empty:
+        return 0, 0
+
+    groups = combined_lesson_groups(lesson_records(parsed_df), group_by)
+    success = 0
+    for done, (filename, lessons) in enumerate(groups, start=1):
+        if cancel_event is not None and cancel_event.is_set():
+            break
+        success += generate_combined_docx(template_file, os.path.join(output_dir, filename),
+                                          lessons, form_data, break_type)
+        if progress:
+            progress(done, len(groups))
+    return success, len(groups)
+
+# =============================================================================
+# НАБЛЮДЕНИЕ ЗА ПАПКОЙ (новые и измененные программы обрабатываются сами)
+# =============================================================================
+
+WATCH_INTERVAL = 1.0      # период опроса папки, с
+WATCH_DEBOUNCE = 2.0      # файл обрабатывается, когда он столько секунд не менялся
+WATCH_WORKERS = None      # процессов обработки документов (None – по числу ядер)
+WATCH_STATE_FILE = ".watch_state.json"   # состояние в папке результатов
+
+def file_sha256(path):
+    """ sha256 содержимого файла (читается кусками). """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def is_curriculum_file(name):
+    """ DOCX, кроме временных файлов Word ("~$имя.docx"). """
+    return name.lower().endswith(".docx") and not name.startswith("~$")
+
+def process_curriculum(docx_path, output_dir, template_file=None, form_data=None,
+                       parse_options=None):
+    """
+    Полная обработка одной программы: разбор, XLSX <output_dir>/<имя>.xlsx и,
+    если задан шаблон, занятия в <output_dir>/<имя>/.
+    parse_options – именованные параметры parse_docx (backend, table_num, ...).
+    Возвращает сводку (словарь) для журнала.
+    """
+    start = time.perf_counter()
+    stem = os.path.splitext(os.path.basename(docx_path))[0]
+    df = parse_docx(docx_path, **(parse_options or {}))
+    os.makedirs(output_dir, exist_ok=True)
+    export_table(df, os.path.join(output_dir, f"{stem}.xlsx"))
+
+    summary = {"docx": docx_path, "lessons": len(df), "created": 0, "errors": 0}
+    if template_file:
+        lessons_dir = os.path.join(output_dir, stem)
+        os.makedirs(lessons_dir, exist_ok=True)
+        # Документы и так обрабатываются параллельно – занятия одного документа
+        # генерируются в его процессе, без вложенного пула
+        results = generate_lessons(lesson_records(df), template_file, lessons_dir,
+                                   form_data or {}, workers=1, incremental=True)
+        summary["created"] = sum(1 for r in results if r.ok and not r.skipped)
+        summary["errors"] = sum(1 for r in results
+                                if not r.ok and r.error != DUPLICATE_FILENAME_ERROR)
+    summary["seconds"] = time.perf_counter() - start
+    return summary
+
+def _watch_settings_digest(template_file, form_data, parse_options):
+    """
+    Хэш всего, от чего зависят результаты, кроме самих программ: при смене
+    шаблона, формы или параметров разбора все программы обрабатываются заново.
+    """
+    template_hash = file_sha256(template_file) if template_file else None
+    settings = json.dumps([template_hash, form_data or {}, parse_options or {}, PARSER_VERSION],
+                          ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(settings.encode("utf-8")).hexdigest()
+
+class FolderWatcher:
+    """
+    Следит за папкой с программами и обрабатывает новые и измененные DOCX
+    (process_curriculum) в пуле процессов.
+
+    Для каждого файла хранится (mtime_ns, размер, sha256). Проход по папке
+    для неизмененного файла – один stat. Файл с новыми mtime/размером ждет,
+    пока они не перестанут меняться WATCH_DEBOUNCE секунд (Word и копирование
+    по сети пишут файл в несколько приемов), затем сверяется хэш: если
+    содержимое то же (файл просто "тронули"), обновляется только stat.
+    Файл, обработка которого завершилась ошибкой, запоминается так же
+    (failed) и не обрабатывается снова, пока не изменится.
+    Состояние сохраняется в output_dir/WATCH_STATE_FILE, так что после
+    перезапуска обрабатываются только изменения.
+    """
+
+    def __init__(self, folder, output_dir, template_file=None, form_data=None,
+                 parse_options=None, workers=None, debounce=None):
+        self.folder = os.path.abspath(folder)
+        self.output_dir = output_dir
+        self.template_file = template_file
+        self.form_data = form_data or {}
+        self.parse_options = parse_options or {}
+        self.workers = workers or WATCH_WORKERS or os.cpu_count() or 1
+        self.debounce = WATCH_DEBOUNCE if debounce is None else debounce
+        self.state_path = os.path.join(output_dir, WATCH_STATE_FILE)
+        self.settings = _watch_settings_digest(template_file, self.form_data, self.parse_options)
+        self.files = {}      # путь -> {"mtime_ns", "size", "sha256"} обработанных версий
+        self.failed = {}     # то же для версий, обработка которых завершилась ошибкой
+        self.pending = {}    # путь -> ((mtime_ns, размер), время последнего изменения)
+        self.running = {}    # future -> (путь, запись состояния после успеха)
+        self.executor = None
+        self.load_state()
+
+    # --- состояние ---------------------------------------------------------
+
+    def load_state(self):
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get("settings") == self.settings:
+            self.files = state.get("files", {})
+            self.failed = state.get("failed", {})
+        else:
+            log.info("Шаблон, форма или параметры разбора изменились – все программы "
+                     "будут обработаны заново")
+
+    def save_state(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        tmp_file = f"{self.state_path}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"settings": self.settings, "files": self.files, "failed": self.failed}, f,
+                      ensure_ascii=False, indent=1)
+        os.replace(tmp_file, self.state_path)
+
+    # --- проход по папке ---------------------------------------------------
+
+    def scan(self, now=None, debounce=None):
+        """
+        Один проход по папке. Возвращает список файлов, готовых к обработке
+        (изменились и успокоились). debounce=0 – не ждать.
+        """
+        now = time.monotonic() if now is None else now
+        debounce = self.debounce if debounce is None else debounce
+        busy = {path for path, _ in self.running.values()}
+        seen = set()
+        ready = []
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if not is_curriculum_file(entry.name) or not entry.is_file():
+                    continue
+                path = entry.path
+                seen.add(path)
+                if path in busy:
+                    continue
+                st = entry.stat()
+                signature = (st.st_mtime_ns, st.st_size)
+                known = [self.files.get(path), self.failed.get(path)]
+                if any(k and (k["mtime_ns"], k["size"]) == signature for k in known):
+                    self.pending.pop(path, None)
+                    continue
+                waiting = self.pending.get(path)
+                if waiting is None or waiting[0] != signature:
+                    self.pending[path] = (signature, now)
+                    if debounce > 0:
+                        continue
+                elif now - waiting[1] < debounce:
+                    continue
+                ready.append((path, signature))
+
+        for path in [p for p in self.files if p not in seen]:
+            log.info("Программа удалена: %s", path)
+            del self.files[path]
+        for path in [p for p in self.failed if p not in seen]:
+            del self.failed[path]
+        for path in [p for p in self.pending if p not in seen]:
+            del self.pending[path]
+
+        changed = []
+        for path, (mtime_ns, size) in ready:
+            del self.pending[path]
+            try:
+                digest = file_sha256(path)
+            except OSError as e:
+                log.warning("Не удалось прочитать %s: %s", path, e)
+                continue
+            record = {"mtime_ns": mtime_ns, "size": size, "sha256": digest}
+            if path in self.failed and self.failed[path]["sha256"] == digest:
+                self.failed[path] = record  # та же ошибочная версия – ждем настоящего изменения
+                continue
+            known = self.files.get(path)
+            if known and known["sha256"] == digest:
+                self.files[path] = record   # содержимое то же – только новый stat
+                continue
+            changed.append((path, record))
+        count("watch_changed", len(changed))
+        return changed
+
+    # --- обработка ---------------------------------------------------------
+
+    def submit(self, changed):
+        if not changed:
+            return
+        if self.executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        for path, record in changed:
+            log.info("В очереди: %s", path)
+            future = self.executor.submit(process_curriculum, path, self.output_dir,
+                                          self.template_file, self.form_data,
+                                          self.parse_options)
+            self.running[future] = (path, record)
+
+    def collect(self, wait=False):
+        """ Забирает завершенные задачи (wait – дождаться всех). Возвращает их сводки. """
+        if not self.running:
+            return []
+        if wait:
+            from concurrent.futures import wait as wait_futures
+            wait_futures(list(self.running))
+        summaries = []
+        for future in [f for f in self.running if f.done()]:
+            path, record = self.running.pop(future)
+            try:
+                summary = future.result()
+            except Exception as e:
+                # Версия запоминается как ошибочная: снова – только при следующем изменении
+                log.error("Ошибка обработки %s: %s", path, e)
+                self.failed[path] = record
+                summaries.append({"docx": path, "error": str(e)})
+                continue
+            self.failed.pop(path, None)
+            self.files[path] = record
+            log.info("Обработано: %s – занятий %d, создано %d, ошибок %d (%.2f с)",
+                     path, summary["lessons"], summary["created"], summary["errors"],
+                     summary["seconds"])
+            summaries.append(summary)
+        if summaries:
+            self.save_state()
+        return summaries
+
+    def run_once(self):
+        """ Обработать все новые и измененные программы сейчас (без ожидания) и выйти. """
+        try:
+            self.submit(self.scan(debounce=0))
+            summaries = self.collect(wait=True)
+            self.save_state()
+            return summaries
+        finally:
+            self.close()
+
+    def run(self, interval=None, stop_event=None):
+        """ Цикл наблюдения до stop_event (или Ctrl+C). """
+        interval = WATCH_INTERVAL if interval is None else interval
+        log.info("Наблюдение за %s (результаты в %s)", self.folder, self.output_dir)
+        try:
+            while stop_event is None or not stop_event.is_set():
+                self.submit(self.scan())
+                self.collect()
+                if stop_event is not None:
+                    stop_event.wait(interval)
+                else:
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.collect(wait=True)
+            self.close()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+# =============================================================================
+# КОРПУС ПРОГРАММ (папка DOCX -> один набор занятий, пул процессов)
+# =============================================================================
+
+CORPUS_WORKERS = None             # процессов разбора (None – по числу ядер)
+CORPUS_PARALLEL_MIN_FILES = 4     # меньше файлов – разбираем в текущем процессе
+CORPUS_SOURCE_COLUMN = 'Файл'     # путь к программе относительно корня корпуса
+CORPUS_KEY_COLUMNS = ['Дисциплина', 'Семестр', 'Номер темы', 'Номер занятия']
+
+CORPUS_REPEATED_ERROR = "Занятий, уже найденных в других файлах"
+
+CorpusError = namedtuple("CorpusError", "path error")
+
+class CorpusResult(namedtuple("CorpusResult", "lessons errors files parsed seconds root")):
+    """
+    Итог разбора корпуса: lessons – общий DataFrame занятий (ключ –
+    CORPUS_KEY_COLUMNS, плюс столбец CORPUS_SOURCE_COLUMN), errors – список
+    CorpusError, files – сколько DOCX найдено, parsed – сколько из них
+    разобрано без ошибок чтения, seconds – время всего разбора,
+    root – папка, относительно которой записан CORPUS_SOURCE_COLUMN.
+    """
+
+    __slots__ = ()
+
+    @property
+    def files_per_second(self):
+        return self.files / self.seconds if self.seconds else 0.0
+
+def find_curricula(root):
+    """ Все программы (DOCX, см. is_curriculum_file) в дереве папок root, по порядку пути. """
+    paths = []
+    for folder, dirs, files in os.walk(root):
+        dirs.sort()
+        paths.extend(os.path.join(folder, name) for name in sorted(files)
+                     if is_curriculum_file(name))
+    return paths
+
+def _parse_corpus_file(path, parse_options):
+    """ Разбирает одну программу корпуса (в процессе пула); -> (таблица или None, ошибка, секунды). """
+    start = time.perf_counter()
+    try:
+        df = parse_docx(path, **parse_options)
+        if df.empty:
+            raise ValueError("В таблице нет занятий")
+        if not df['Дисциплина'].fillna("").astype(str).str.strip().any():
+            raise ValueError("Не найдено название дисциплины (строка 'изучения дисциплины «...»')")
+        return df, None, time.perf_counter() - start
+    except Exception as e:
+        return None, str(e) or type(e).__name__, time.perf_counter() - start
+
+def parse_corpus(root, workers=None, parse_options=None, progress=None, cancel_event=None,
+                 unique=True):
+    """
+    Разбирает все программы в дереве папок root и сводит их в один набор занятий.
+
+    :param root: папка корпуса (обходится рекурсивно) или список путей к DOCX
+    :param workers: число процессов (None – CORPUS_WORKERS или число ядер,
+                    для небольших корпусов – без пула; 1 – всегда без пула)
+    :param parse_options: именованные параметры parse_docx (backend, table_num, ...)
+    :param progress: необязательный вызов progress(готово, всего) после каждого файла
+    :param cancel_event: threading.Event; если установлен, еще не начатые файлы не разбираются
+    :param unique: убирать занятия, уже найденные в других файлах (False – оставить все)
+    :return: CorpusResult
+
+    Ошибка в одном файле (не та таблица, мало строк, нет дисциплины) не
+    прерывает разбор: файл попадает в errors, остальные – в набор. Занятие,
+    ключ которого уже встречался в другом файле, не дублируется – остается
+    первое, а для файла-повтора записывается ошибка. Повторы ключа внутри
+    одного файла сохраняются, как в parse_docx.
+    """
+    import pandas as pd
+
+    start = time.perf_counter()
+    if isinstance(root, (str, os.PathLike)):
+        base = os.fspath(root)
+        if not os.path.isdir(base):
+            raise FileNotFoundError(f"Папка не найдена: {base}")
+        paths = find_curricula(base)
+    else:
+        paths = list(root)
+        base = os.path.commonpath([os.path.dirname(p) for p in paths]) if paths else ""
+    parse_options = parse_options or {}
+
+    if workers is None:
+        workers = CORPUS_WORKERS or os.cpu_count() or 1
+        if len(paths) < CORPUS_PARALLEL_MIN_FILES:
+            workers = 1
+    workers = max(1, min(workers, len(paths) or 1))
+
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    parsed = [None] * len(paths)
+    with stage("corpus.parse", files=len(paths), workers=workers):
+        if workers == 1:
+            for pos, path in enumerate(paths):
+                if cancelled():
+                    break
+                parsed[pos] = _parse_corpus_file(path, parse_options)
+                if progress:
+                    progress(pos + 1, len(paths))
+        else:
+            from concurrent.futures import ProcessPoolExecutor, as_completed
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(_parse_corpus_file, path, parse_options): pos
+                           for pos, path in enumerate(paths)}
+                for done, future in enumerate(as_completed(futures), start=1):
+                    parsed[futures[future]] = future.result()
+                    if progress:
+                        progress(done, len(paths))
+                    if cancelled():
+                        for pending in futures:
+                            pending.cancel()
+                        break
+                for future, pos in futures.items():
+                    if parsed[pos] is None and not future.cancelled():
+                        parsed[pos] = future.result()
+
+    errors = []
+    frames = []
+    for path, result in zip(paths, parsed):
+        if result is None:
+            errors.append(CorpusError(path, CANCELLED_ERROR))
+            continue
+        df, error, seconds = result
+        if metrics_enabled():
+            emit_metric({"type": "stage", "name": "corpus.file", "seconds": seconds,
+                         "workers": workers})
+        if error is not None:
+            errors.append(CorpusError(path, error))
+            continue
+        df = df.copy()
+        df.insert(0, CORPUS_SOURCE_COLUMN, os.path.relpath(path, base) if base else path)
+        frames.append(df)
+
+    with stage("corpus.merge"):
+        if frames:
+            lessons = pd.concat(frames, ignore_index=True)
+        else:
+            lessons = pd.DataFrame(columns=[CORPUS_SOURCE_COLUMN] + DESIRED_ORDER)
+        for column in CORPUS_KEY_COLUMNS:
+            if column not in lessons.columns:
+                lessons[column] = ""
+        keyed = (lessons['Номер темы'].astype(str).str.strip() != "") & \
+                (lessons['Номер занятия'].astype(str).str.strip() != "")
+        # Повтором считается только занятие из другого файла: повторы внутри
+        # одного файла остаются, как и при разборе одной программы
+        first_source = lessons.groupby(CORPUS_KEY_COLUMNS, sort=False, dropna=False)[
+            CORPUS_SOURCE_COLUMN].transform("first")
+        repeated = keyed & (first_source != lessons[CORPUS_SOURCE_COLUMN])
+        if unique and repeated.any():
+            for source, rows in lessons[repeated].groupby(CORPUS_SOURCE_COLUMN, sort=False):
+                errors.append(CorpusError(os.path.join(base, source),
+                                          f"{CORPUS_REPEATED_ERROR}: {len(rows)}"))
+            lessons = lessons[~repeated]
+        # Ключ – первыми столбцами; одна дисциплина из нескольких файлов – подряд
+        columns = CORPUS_KEY_COLUMNS + [c for c in lessons.columns if c not in CORPUS_KEY_COLUMNS]
+        lessons = (lessons[columns].sort_values('Дисциплина', kind="stable")
+                   .reset_index(drop=True))
+
+    result = CorpusResult(lessons, errors, len(paths), len(frames),
+                          time.perf_counter() - start, base)
+    count("corpus_files", len(paths))
+    count("corpus_errors", len(errors))
+    count("lessons", len(lessons))
+    log.info("Корпус %s: файлов %d, ошибок %d, занятий %d, %.1f файл/с",
+             base, len(paths), len(errors), len(lessons), result.files_per_second)
+    return result
+
+# =============================================================================
+# ХРАНИЛИЩЕ ЗАНЯТИЙ (SQLite: запрос занятия или дисциплины без разбора DOCX)
+# =============================================================================
+
+LESSON_STORE_PATH = None    # база для GUI (None – разобранное не сохраняется)
+LESSON_STORE_VERSION = 1    # увеличить при изменении схемы (база пересоздается)
+
+# Тексты уровня документа: одинаковы для всех занятий программы, поэтому хранятся
+# один раз в таблице texts, а занятия ссылаются на них (столбец <поле>_id)
+LESSON_STORE_TEXT_FIELDS = ('know', 'skill', 'master', 'literature', 'material')
+LESSON_STORE_KEY = ('discipline', 'semester', 'topic_number', 'lesson_number')
+
+LESSON_STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id         INTEGER PRIMARY KEY,
+    path       TEXT NOT NULL UNIQUE,
+    digest     TEXT NOT NULL,
+    discipline TEXT,
+    lessons    INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS texts (
+    id     INTEGER PRIMARY KEY,
+    digest BLOB NOT NULL UNIQUE,
+    body   TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lessons (
+    id                INTEGER PRIMARY KEY,
+    document_id       INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    position          INTEGER NOT NULL,
+    discipline        TEXT NOT NULL,
+    semester          INTEGER,
+    topic_number      TEXT NOT NULL,
+    lesson_number     TEXT NOT NULL,
+    topic_title       TEXT,
+    lesson_type       TEXT,
+    lesson_title      TEXT,
+    questions         TEXT,
+    minutes,
+    lesson_material   TEXT,
+    lesson_literature TEXT,
+    know_id           INTEGER REFERENCES texts(id),
+    skill_id          INTEGER REFERENCES texts(id),
+    master_id         INTEGER REFERENCES texts(id),
+    literature_id     INTEGER REFERENCES texts(id),
+    material_id       INTEGER REFERENCES texts(id)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS lessons_document ON lessons (document_id, position);
+CREATE INDEX IF NOT EXISTS lessons_key
+    ON lessons (discipline, semester, topic_number, lesson_number);
+CREATE INDEX IF NOT EXISTS lessons_topic_lesson
+    ON lessons (discipline, topic_number, lesson_number, semester);
+"""
+
+def _store_semester(value):
+    """ Семестр для столбца INTEGER (числа сортируются как числа); пустой – NULL. """
+    value = "" if value is None else str(value).strip()
+    return int(value) if value.isdigit() else (value or None)
+
+def _store_select_sql():
+    """ SELECT записей занятий в порядке LESSON_RECORD_FIELDS (тексты – из texts). """
+    columns, joins = [], []
+    for name, _ in LESSON_RECORD_FIELDS:
+        if name in LESSON_STORE_TEXT_FIELDS:
+            columns.append(f"COALESCE({name}.body, '')")
+            joins.append(f"LEFT JOIN texts AS {name} ON {name}.id = l.{name}_id")
+        elif name == 'semester':
+            columns.append("COALESCE(CAST(l.semester AS TEXT), '')")
+        else:
+            columns.append(f"l.{name}")
+    return f"SELECT {', '.join(columns)} FROM lessons AS l {' '.join(joins)}"
+
+class LessonStore:
+    """
+    Занятия разобранных программ в SQLite.
+
+    documents – разобранные DOCX (путь, хэш содержимого и настроек разбора),
+    lessons – занятия документа по порядку (ключ – документ и позиция,
+    индекс по дисциплине, семестру, теме и занятию; семестр – число),
+    texts – тексты уровня документа (знать, уметь, владеть, литература,
+    мат. обеспечение) без повторов.
+
+    Повторное сохранение программы заменяет ее занятия (upsert по позиции,
+    лишние удаляются); занятия других документов не затрагиваются, даже
+    если ключ совпадает – get_lesson тогда возвращает занятие из первого
+    сохраненного документа. Соединение можно использовать из нескольких
+    потоков (запросы идут под блокировкой).
+    """
+
+    def __init__(self, path=":memory:"):
+        import sqlite3
+
+        self.path = path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        if path != ":memory:":
+            self.connection.execute("PRAGMA journal_mode = WAL")
+            self.connection.execute("PRAGMA synchronous = NORMAL")
+        self._create_schema()
+        self._select = _store_select_sql()
+
+        inline = [name for name, _ in LESSON_RECORD_FIELDS if name not in LESSON_STORE_TEXT_FIELDS]
+        self._inline_fields = inline
+        columns = ["document_id", "position"] + inline + [f"{n}_id" for n in LESSON_STORE_TEXT_FIELDS]
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns[2:])
+        self._insert = (f"INSERT INTO lessons ({', '.join(columns)}) "
+                        f"VALUES ({', '.join('?' * len(columns))}) "
+                        f"ON CONFLICT (document_id, position) DO UPDATE SET {updates}")
+
+    def _create_schema(self):
+        conn = self.connection
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        tables = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+        if tables and version != LESSON_STORE_VERSION:
+            # Данные выводятся из DOCX заново, поэтому старую схему просто пересоздаем
+            log.warning("Хранилище %s другой версии (%s) – пересоздается", self.path, version)
+            with conn:
+                conn.executescript("DROP TABLE IF EXISTS lessons; DROP TABLE IF EXISTS texts; "
+                                   "DROP TABLE IF EXISTS documents;")
+        with conn:
+            conn.executescript(LESSON_STORE_SCHEMA)
+            conn.execute(f"PRAGMA user_version = {LESSON_STORE_VERSION}")
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # --- запись ---
+
+    def _text_ids(self, texts):
+        """ {текст: id в texts} для набора текстов (новые добавляются). """
+        ids = {}
+        for body in texts:
+            digest = hashlib.sha256(body.encode("utf-8")).digest()
+            self.connection.execute("INSERT OR IGNORE INTO texts (digest, body) VALUES (?, ?)",
+                                    (digest, body))
+            ids[body] = self.connection.execute(
+                "SELECT id FROM texts WHERE digest = ?", (digest,)).fetchone()[0]
+        return ids
+
+    def upsert_curriculum(self, docx_path, df, digest=""):
+        """
+        Сохраняет занятия программы (таблицу parse_docx) вместо прежних занятий
+        того же документа. Строки без номера темы или занятия не сохраняются.
+
+        :param docx_path: путь к DOCX (ключ документа)
+        :param df: DataFrame занятий
+        :param digest: хэш исходных данных (см. curriculum_digest) для is_current
+        :return: сколько занятий сохранено
+        """
+        records = [r for r in LessonRecord.from_dataframe(df)
+                   if str(r.topic_number).strip() and str(r.lesson_number).strip()]
+        discipline = next((r.discipline for r in records if r.discipline), None)
+        path = os.path.abspath(docx_path)
+
+        with stage("store.upsert"), self._lock, self.connection as conn:
+            conn.execute(
+                "INSERT INTO documents (path, digest, discipline, lessons, updated_at) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (path) DO UPDATE SET "
+                "digest = excluded.digest, discipline = excluded.discipline, "
+                "lessons = excluded.lessons, updated_at = excluded.updated_at",
+                (path, digest, discipline, len(records), time.time()))
+            document_id = conn.execute("SELECT id FROM documents WHERE path = ?",
+                                       (path,)).fetchone()[0]
+            conn.execute("DELETE FROM lessons WHERE document_id = ? AND position >= ?",
+                         (document_id, len(records)))
+
+            text_ids = self._text_ids({getattr(r, name) or "" for r in records
+                                       for name in LESSON_STORE_TEXT_FIELDS})
+            rows = []
+            for position, record in enumerate(records):
+                row = [document_id, position]
+                for name in self._inline_fields:
+                    value = getattr(record, name)
+                    if name == 'semester':
+                        value = _store_semester(value)
+                    elif value is None and name in LESSON_STORE_KEY:
+                        value = ""
+                    row.append(value)
+                row.extend(text_ids[getattr(record, name) or ""] for name in LESSON_STORE_TEXT_FIELDS)
+                rows.append(row)
+            written = conn.executemany(self._insert, rows).rowcount if rows else 0
+        count("store_lessons", written)
+        return written
+
+    def remove_document(self, docx_path):
+        """ Удаляет документ и его занятия; возвращает, был ли документ в хранилище. """
+        with self._lock, self.connection as conn:
+            cursor = conn.execute("DELETE FROM documents WHERE path = ?",
+                                  (os.path.abspath(docx_path),))
+        return cursor.rowcount > 0
+
+    def prune_texts(self):
+        """ Удаляет тексты, на которые больше не ссылается ни одно занятие; возвращает их число. """
+        used = " UNION ".join(f"SELECT {n}_id FROM lessons" for n in LESSON_STORE_TEXT_FIELDS)
+        with self._lock, self.connection as conn:
+            cursor = conn.execute(f"DELETE FROM texts WHERE id NOT IN ({used})")
+        return cursor.rowcount
+
+    def is_current(self, docx_path, digest):
+        """ Сохранен ли документ с тем же хэшем исходных данных. """
+        with self._lock:
+            row = self.connection.execute("SELECT digest FROM documents WHERE path = ?",
+                                          (os.path.abspath(docx_path),)).fetchone()
+        return row is not None and row[0] == digest
+
+    def update(self, paths, workers=None, parse_options=None, force=False):
+        """
+        Разбирает (пулом процессов, см. parse_corpus) и сохраняет программы,
+        изменившиеся с прошлого сохранения.
+
+        :param paths: пути к DOCX и/или папкам (папки обходятся рекурсивно)
+        :param force: сохранить заново и неизмененные документы
+        :return: словарь {"files", "updated", "unchanged", "lessons", "errors": [CorpusError]}
+        """
+        parse_options = parse_options or {}
+        files = []
+        for path in paths:
+            files.extend(find_curricula(path) if os.path.isdir(path) else [path])
+        files = [os.path.abspath(path) for path in files]
+
+        digests = {path: curriculum_digest(path, parse_options) for path in files}
+        changed = [p for p in files if force or not self.is_current(p, digests[p])]
+        summary = {"files": len(files), "updated": 0, "unchanged": len(files) - len(changed),
+                   "lessons": 0, "errors": []}
+        if not changed:
+            return summary
+
+        # Каждый документ сохраняется целиком: занятия, совпавшие с другими
+        # файлами, не отбрасываются (иначе они потеряются при актуальном хэше)
+        result = parse_corpus(changed, workers, parse_options, unique=False)
+        failed = {error.path for error in result.errors}
+        summary["errors"] = result.errors
+        sources = {os.path.join(result.root, source): group
+                   for source, group in result.lessons.groupby(CORPUS_SOURCE_COLUMN, sort=False)}
+        for path in changed:
+            if path in failed:
+                continue
+            df = sources.get(path)
+            if df is None:
+                df = result.lessons.iloc[0:0]
+            summary["lessons"] += self.upsert_curriculum(path, df, digests[path])
+            summary["updated"] += 1
+        return summary
+
+    # --- запросы ---
+
+    def get_lesson(self, discipline, topic_number, lesson_number, semester=None):
+        """ LessonRecord занятия или None; без semester – из первого семестра, где оно есть. """
+        sql = f"{self._select} WHERE l.discipline = ? AND l.topic_number = ? AND l.lesson_number = ?"
+        params = [discipline, str(topic_number), str(lesson_number)]
+        if semester is not None:
+            sql += " AND l.semester IS ?"
+            params.append(_store_semester(semester))
+        with self._lock:
+            row = self.connection.execute(
+                sql + " ORDER BY l.semester IS NULL, l.semester, l.document_id LIMIT 1",
+                params).fetchone()
+        return LessonRecord._make(row) if row else None
+
+    def discipline_lessons(self, discipline, semester=None):
+        """ Записи занятий дисциплины (и семестра) в порядке программы. """
+        sql = f"{self._select} WHERE l.discipline = ?"
+        params = [discipline]
+        if semester is not None:
+            sql += " AND l.semester IS ?"
+            params.append(_store_semester(semester))
+        with self._lock:
+            rows = self.connection.execute(sql + " ORDER BY l.document_id, l.position",
+                                           params).fetchall()
+        return [LessonRecord._make(row) for row in rows]
+
+    def lesson_records(self, discipline, semester=None):
+        """ Список (имя файла, запись) для generate_lessons / write_lessons_bundle. """
+        return [(record.filename, record) for record in self.discipline_lessons(discipline, semester)]
+
+    def disciplines(self):
+        """ [(дисциплина, число занятий)] по алфавиту. """
+        with self._lock:
+            return self.connection.execute(
+                "SELECT discipline, COUNT(*) FROM lessons GROUP BY discipline "
+                "ORDER BY discipline").fetchall()
+
+    def documents(self):
+        """ Сохраненные документы: список словарей (path, digest, discipline, lessons, updated_at). """
+        with self._lock:
+            cursor = self.connection.execute(
+                "SELECT path, digest, discipline, lessons, updated_at FROM documents ORDER BY path")
+            names = [d[0] for d in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def to_dataframe(self, discipline=None, semester=None):
+        """ Занятия дисциплины (или всего хранилища) таблицей как у parse_docx. """
+        if discipline is not None:
+            return lessons_to_dataframe(self.discipline_lessons(discipline, semester))
+        with self._lock:
+            rows = self.connection.execute(
+                f"{self._select} ORDER BY l.document_id, l.position").fetchall()
+        return lessons_to_dataframe(LessonRecord._make(row) for row in rows)
+
+def curriculum_digest(docx_path, parse_options=None):
+    """ Хэш содержимого DOCX, настроек разбора и версии парсера (для LessonStore.is_current). """
+    return json_sha256({"file": file_sha256(docx_path), "options": parse_options or {},
+                        "parser": PARSER_VERSION})
+
+def store_parsed(docx_path, df, store_path=None):
+    """ Сохраняет разобранную программу в LESSON_STORE_PATH (или store_path), если база задана. """
+    store_path = store_path or LESSON_STORE_PATH
+    if not store_path:
+        return 0
+    with LessonStore(store_path) as store:
+        return store.upsert_curriculum(docx_path, df, curriculum_digest(docx_path))
+
+# =============================================================================
+# HTTP-СЕРВИС (разбор и генерация по запросам других программ)
+# =============================================================================
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+SERVICE_WORKERS = None              # процессов разбора/генерации (None – по числу ядер)
+SERVICE_MAX_INFLIGHT = None         # одновременных запросов (None – 4 на процесс), сверх – 503
+SERVICE_MAX_UPLOAD = 50 << 20       # предельный размер тела запроса, байт
+SERVICE_TIMEOUT = 300               # секунд на задачу в пуле, дольше – 504
+SERVICE_PARSED_CACHE_SIZE = 64      # разобранных программ в памяти
+
+# Параметры запроса, которые относятся к разбору, а не к полям формы
+SERVICE_OPTION_FIELDS = ("table_number", "start_row", "backend", "keep_numbering", "format")
+
+EXPORT_CONTENT_TYPES = {
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".csv":  "text/csv; charset=utf-8",
+    ".json": "application/json; charset=utf-8",
+}
+
+class ServiceError(Exception):
+    """ Ошибка запроса к сервису: HTTP-статус и текст для ответа. """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def parse_multipart(content_type, body):
+    """
+    Разбирает тело multipart/form-data.
+
+    :return: tuple({поле: текст}, {поле: байты файла})
+    """
+    from email import policy
+    from email.parser import BytesParser
+
+    message = BytesParser(policy=policy.HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body)
+    if not message.is_multipart():
+        raise ServiceError(400, "Ожидалось тело multipart/form-data")
+    fields, files = {}, {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if not name:
+            continue
+        payload = part.get_payload(decode=True) or b""
+        if part.get_filename() is not None:
+            files[name] = payload
+        else:
+            fields[name] = payload.decode(part.get_content_charset() or "utf-8")
+    return fields, files
+
+def _service_parse_task(docx_bytes, parse_options):
+    """ Разбор загруженной программы в процессе пула. """
+    return parse_docx(io.BytesIO(docx_bytes), use_cache=False, **parse_options)
+
+def _service_export_task(df, ext):
+    """ Таблица занятий -> байты файла формата ext (в процессе пула). """
+    import tempfile
+
+    with tempfile.TemporaryDirectory(prefix="prsr-bnch-") as tmp:
+        path = os.path.join(tmp, f"lessons{ext}")
+        export_table(df, path)
+        with open(path, "rb") as f:
+            return f.read()
+
+def _service_bundle_task(records, template_bytes, form_data):
+    """
+    ZIP занятий (write_lessons_bundle) в процессе пула. Шаблон компилируется
+    один раз на процесс: повторные запросы с тем же шаблоном берут его из кэша.
+    """
+    template = compile_template_bytes(template_bytes, template_fields(form_data))
+    out = io.BytesIO()
+    results = write_lessons_bundle(records, template, out, form_data, workers=1)
+    return out.getvalue(), sum(1 for r in results if r.ok)
+
+class LessonService:
+    """
+    Состояние HTTP-сервиса: пул процессов для разбора и генерации, кэш
+    разобранных программ в памяти (по хэшу DOCX и настроек разбора),
+    шаблон по умолчанию и ограничение одновременных запросов.
+
+    POST /parse    – DOCX (тело запроса или поле curriculum формы) -> XLSX/CSV/JSON
+                     (?format=xlsx|csv|json);
+    POST /lessons  – DOCX + поля формы (НАЧАЛЬНИК, ... или JSON в поле form),
+                     необязательный шаблон в поле template -> ZIP занятий с оглавлением;
+    GET  /health   – состояние и счетчики.
+    Параметры разбора – table_number, start_row, backend, keep_numbering
+    (в строке запроса или полях формы).
+    """
+
+    def __init__(self, template_file=None, workers=None, max_inflight=None):
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.workers = workers or SERVICE_WORKERS or os.cpu_count() or 1
+        self.max_inflight = max_inflight or SERVICE_MAX_INFLIGHT or self.workers * 4
+        self.template_bytes = None
+        if template_file:
+            with open(template_file, "rb") as f:
+                self.template_bytes = f.read()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.slots = threading.BoundedSemaphore(self.max_inflight)
+        self.parsed = {}          # ключ -> DataFrame, порядок – давность обращения
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "rejected": 0, "errors": 0, "inflight": 0,
+                      "parsed_hits": 0, "parsed_misses": 0}
+
+    def close(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+    def _count(self, name, delta=1):
+        with self.lock:
+            self.stats[name] += delta
+
+    def run(self, func, *args):
+        """ Выполняет func в пуле и ждет результат не дольше SERVICE_TIMEOUT. """
+        from concurrent.futures import TimeoutError as FutureTimeout
+
+        future = self.pool.submit(func, *args)
+        try:
+            return future.result(timeout=SERVICE_TIMEOUT)
+        except FutureTimeout:
+            future.cancel()
+            raise ServiceError(504, "Обработка не уложилась в отведенное время")
+
+    def parsed_lessons(self, docx_bytes, parse_options):
+        """ Таблица занятий загруженной программы: из памяти или разбором в пуле. """
+        key = hashlib.sha256(repr(sorted(parse_options.items())).encode("utf-8")
+                             + b"\0" + docx_bytes).hexdigest()
+        with self.lock:
+            df = self.parsed.pop(key, None)
+            if df is not None:
+                self.parsed[key] = df   # в конец – недавно использованные
+                self.stats["parsed_hits"] += 1
+                return df
+            self.stats["parsed_misses"] += 1
+        with stage("service.parse"):
+            df = self.run(_service_parse_task, docx_bytes, parse_options)
+        with self.lock:
+            self.parsed[key] = df
+            while len(self.parsed) > SERVICE_PARSED_CACHE_SIZE:
+                self.parsed.pop(next(iter(self.parsed)))
+        return df
+
+    def health(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["parsed_cached"] = len(self.parsed)
+        return {"status": "ok", "workers": self.workers, "max_inflight": self.max_inflight,
+                "template": self.template_bytes is not None, **stats}
+
+    @staticmethod
+    def request_options(fields):
+        """ Параметры parse_docx из полей запроса. """
+        options = {}
+        try:
+            if fields.get("table_number"):
+                options["table_num"] = int(fields["table_number"])
+            if fields.get("start_row"):
+                options["start_row"] = int(fields["start_row"])
+        except ValueError:
+            raise ServiceError(400, "table_number и start_row должны быть числами")
+        if fields.get("backend"):
+            if fields["backend"] not in ("python-docx", "stream"):
+                raise ServiceError(400, f"Неизвестный способ чтения DOCX: {fields['backend']}")
+            options["backend"] = fields["backend"]
+        if fields.get("keep_numbering"):
+            options["keep_numbering"] = fields["keep_numbering"].lower() in ("1", "true", "yes")
+        return options
+
+    def handle(self, method, path, fields, files, body):
+        """
+        Обрабатывает запрос; возвращает (статус, тип содержимого, байты, имя файла или None).
+        Ошибки запроса – ServiceError, ошибки разбора программы – ValueError.
+        """
+        if method == "GET" and path == "/health":
+            return 200, "application/json; charset=utf-8", json.dumps(
+                self.health(), ensure_ascii=False).encode("utf-8"), None
+        if path not in ("/parse", "/lessons"):
+            raise ServiceError(404, f"Нет такого адреса: {path}")
+        if method != "POST":
+            raise ServiceError(405, "Ожидался POST")
+
+        docx_bytes = files.get("curriculum", body if not files else None)
+        if not docx_bytes:
+            raise ServiceError(400, "Нет учебной программы (тело запроса или поле curriculum)")
+        df = self.parsed_lessons(docx_bytes, self.request_options(fields))
+
+        if path == "/parse":
+            ext = "." + (fields.get("format") or "xlsx").lower().lstrip(".")
+            if ext not in EXPORT_CONTENT_TYPES:
+                raise ServiceError(400, f"Неизвестный формат: {ext}")
+            with stage("service.export"):
+                data = self.run(_service_export_task, df, ext)
+            return 200, EXPORT_CONTENT_TYPES[ext], data, f"lessons{ext}"
+
+        template_bytes = files.get("template") or self.template_bytes
+        if not template_bytes:
+            raise ServiceError(400, "Нет шаблона: поле template или --template при запуске")
+        try:
+            form_data = json.loads(fields["form"]) if fields.get("form") else {}
+        except ValueError:
+            raise ServiceError(400, "Поле form должно быть JSON-объектом")
+        if not isinstance(form_data, dict):
+            raise ServiceError(400, "Поле form должно быть JSON-объектом")
+        for name, value in fields.items():
+            if name != "form" and name not in SERVICE_OPTION_FIELDS:
+                form_data[name] = value
+
+        with stage("service.render"):
+            data, created = self.run(_service_bundle_task, lesson_records(df),
+                                     template_bytes, form_data)
+        count("lessons_generated", created)
+        return 200, "application/zip", data, "lessons.zip"
+
+def _service_handler_class():
+    """ Класс обработчика HTTP (http.server импортируется только для сервиса). """
+    from http.server import BaseHTTPRequestHandler
+    from urllib.parse import parse_qsl, urlsplit
+
+    class ServiceHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # keep-alive: клиенты могут не переподключаться
+        server_version = "prsr-bnch"
+
+        def log_message(self, format, *args):
+            log.debug("%s %s", self.address_string(), format % args)
+
+        def do_GET(self):
+            self.dispatch()
+
+        def do_POST(self):
+            self.dispatch()
+
+        def send(self, status, content_type, data, filename=None, headers=()):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            if filename:
+                self.send_header("Content-Disposition", f'attachment; filename="{filename}"')
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def send_error_json(self, status, message, headers=()):
+            data = json.dumps({"error": message}, ensure_ascii=False).encode("utf-8")
+            self.send(status, "application/json; charset=utf-8", data, headers=headers)
+
+        def read_body(self):
+            length = self.headers.get("Content-Length")
+            if length is None:
+                if self.command == "POST":
+                    raise ServiceError(411, "Нужен заголовок Content-Length")
+                return b""
+            if not length.strip().isdigit():
+                # Границу тела не знаем – соединение дальше не годится
+                self.close_connection = True
+                raise ServiceError(400, f"Неверный Content-Length: {length!r}")
+            length = int(length)
+            if length > SERVICE_MAX_UPLOAD:
+                self.close_connection = True   # тело не читаем – соединение не переиспользовать
+                raise ServiceError(413, f"Тело запроса больше {SERVICE_MAX_UPLOAD} байт")
+            return self.rfile.read(length)
+
+        def dispatch(self):
+            service = self.server.service
+            url = urlsplit(self.path)
+            service._count("requests")
+            if not service.slots.acquire(blocking=False):
+                # Отказ – до чтения тела: занятый сервис не принимает загрузку
+                # (до SERVICE_MAX_UPLOAD), а непрочитанное тело не дает
+                # переиспользовать соединение – клиент переподключается
+                service._count("rejected")
+                self.send_error_json(503, "Сервис занят, повторите запрос позже",
+                                     headers=[("Retry-After", "1"), ("Connection", "close")])
+                return
+            service._count("inflight")
+            try:
+                with stage("service.request", path=url.path):
+                    body = self.read_body()
+                    fields, files = dict(parse_qsl(url.query)), {}
+                    content_type = self.headers.get("Content-Type", "")
+                    if content_type.startswith("multipart/form-data"):
+                        form_fields, files = parse_multipart(content_type, body)
+                        fields.update(form_fields)
+                        body = b""
+                    result = service.handle(self.command, url.path, fields, files, body)
+                self.send(*result)
+            except ServiceError as e:
+                service._count("errors")
+                self.send_error_json(e.status, str(e))
+            except (ValueError, zipfile.BadZipFile) as e:
+                # Программа не разобралась (не та таблица, мало строк, не DOCX)
+                service._count("errors")
+                self.send_error_json(422, str(e))
+            except Exception as e:
+                service._count("errors")
+                log.exception("Ошибка обработки %s", url.path)
+                self.send_error_json(500, f"{type(e).__name__}: {e}")
+            finally:
+                service._count("inflight", -1)
+                service.slots.release()
+
+    return ServiceHandler
+
+def make_service_server(host=SERVICE_HOST, port=SERVICE_PORT, template_file=None,
+                        workers=None, max_inflight=None):
+    """
+    HTTP-сервер (ThreadingHTTPServer) с LessonService в server.service.
+    port=0 – свободный порт (см. server.server_address). После работы –
+    server.server_close() и server.service.close().
+    """
+    from http.server import ThreadingHTTPServer
+
+    service = LessonService(template_file, workers, max_inflight)
+    server = ThreadingHTTPServer((host, port), _service_handler_class())
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+def serve(host=SERVICE_HOST, port=SERVICE_PORT, template_file=None, workers=None,
+          max_inflight=None):
+    """ Запускает сервис и обслуживает запросы до Ctrl+C. """
+    server = make_service_server(host, port, template_file, workers, max_inflight)
+    service = server.service
+    log.info("Сервис запущен: http://%s:%d (процессов %d, запросов одновременно %d)",
+             *server.server_address[:2], service.workers, service.max_inflight)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+# =============================================================================
+# GUI: CUSTOMTKINTER
+# =============================================================================
+
+def run_gui():
+    # GUI-библиотеки нужны только здесь: CLI работает без дисплея и без них
+    import customtkinter as ctk
+    import tkinter as tk
+    from tkinter import filedialog, messagebox
+
+    ctk.set_appearance_mode("System")
+    ctk.set_default_color_theme("blue")
+
+    app = ctk.CTk()
+    app.title("Парсер DOCX -> XLSX и генератор планов занятий")
+    app.geometry("1100x600")
+
+    # Переменные для хранения значений
+    selected_docx = tk.StringVar(value="Файл не выбран")
+    parsed_data = {"df": None, "lessons": None}  # DataFrame и индекс занятий (LessonIndex)
+    
+    # Переменные для полей формы
+    selected_lesson = tk.StringVar()
+    combine_mode = tk.StringVar(value="По темам")
+    day = tk.StringVar(value="04")
+    month = tk.StringVar(value="февраля")
+    year = tk.StringVar(value="2025")
+    chief = tk.StringVar(value="В. Пупкин")
+    group_number = tk.StringVar(value="ИКТВ-11")
+    lesson_date = tk.StringVar(value="16.05.2025")
+    classroom = tk.StringVar(value="324")
+    instructor = tk.StringVar(value="Д. Иванов")
+    
     # Создаем основной фрейм
     main_frame = ctk.CTkFrame(app)
     main_frame.pack(fill=tk.BOTH, expand=True)
@@ -651,6 +3692,72 @@ def run_gui():
     # Правый фрейм (форма для занятий) - изначально скрыт
     right_frame = ctk.CTkFrame(main_frame)
     
+    # Фоновые операции: парсинг и генерация идут в отдельном потоке, окно не
+    # блокируется; результат и диалоги – снова в потоке Tk (опрос через app.after)
+    from concurrent.futures import ThreadPoolExecutor
+    executor = ThreadPoolExecutor(max_workers=1)
+    progress_queue = queue.Queue()   # (готово, всего) из фонового потока
+    job = {"future": None, "cancel": None}
+    
+    def start_job(task, on_done, error_text, status_text):
+        """
+        Запускает task(progress, cancel_event) в фоне.
+        on_done(результат, отменено) и сообщение об ошибке вызываются в потоке Tk.
+        """
+        if job["future"] is not None and not job["future"].done():
+            messagebox.showwarning("Внимание", "Дождитесь завершения текущей операции или отмените её!")
+            return
+        
+        while not progress_queue.empty():
+            progress_queue.get_nowait()
+        job["cancel"] = threading.Event()
+        
+        progress_bar.set(0)
+        progress_label.configure(text=status_text)
+        cancel_btn.configure(state="normal")
+        
+        def progress(done, total):
+            progress_queue.put((done, total))
+        
+        job["future"] = executor.submit(task, progress, job["cancel"])
+        app.after(100, poll_job, on_done, error_text)
+    
+    def poll_job(on_done, error_text):
+        while not progress_queue.empty():
+            done, total = progress_queue.get_nowait()
+            progress_bar.set(done / total if total else 1)
+            progress_label.configure(text=f"Готово {done} из {total}")
+        
+        future = job["future"]
+        if not future.done():
+            app.after(100, poll_job, on_done, error_text)
+            return
+        
+        cancel_btn.configure(state="disabled")
+        cancelled = job["cancel"].is_set()
+        try:
+            result = future.result()
+        except Exception as e:
+            progress_label.configure(text="Ошибка")
+            messagebox.showerror("Ошибка", f"{error_text}:\n{str(e)}")
+            return
+        
+        progress_bar.set(1)
+        progress_label.configure(text="Отменено" if cancelled else "Готово")
+        on_done(result, cancelled)
+    
+    def cancel_job():
+        if job["cancel"] is not None:
+            job["cancel"].set()
+            progress_label.configure(text="Отмена...")
+    
+    def on_close():
+        cancel_job()
+        executor.shutdown(wait=False, cancel_futures=True)
+        app.destroy()
+    
+    app.protocol("WM_DELETE_WINDOW", on_close)
+    
     # Функция выбора DOCX файла
     def choose_docx_file():
         file_path = filedialog.askopenfilename(
@@ -661,41 +3768,32 @@ def run_gui():
             selected_docx.set(file_path)
             label_docx.configure(text=os.path.basename(file_path))
             
-            # Парсим файл
-            try:
-                # Создаем временный XLSX файл
-                temp_dir = os.path.dirname(file_path)
-                temp_xlsx = os.path.join(temp_dir, f"temp_{os.path.basename(file_path)}.xlsx")
-                
-                # Парсим DOCX в XLSX
-                parsed_data["df"] = parse_docx_to_xlsx(file_path, temp_xlsx)
+            # Парсим файл в фоне
+            def task(progress, cancel_event):
+                # Только разбор: для списка занятий файлы не нужны
+                df = parse_docx(file_path)
+                store_parsed(file_path, df)
+                return df
+            
+            def done(df, cancelled):
+                if cancelled:
+                    return
+                parsed_data["df"] = df
+                parsed_data["lessons"] = LessonIndex.from_dataframe(df)
                 
                 # Наполняем выпадающий список занятий
-                populate_lesson_dropdown(parsed_data["df"])
+                populate_lesson_dropdown(parsed_data["lessons"])
                 
                 # Показываем правый фрейм
                 right_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=10, pady=10)
-                
-                # Удаляем временный файл
-                if os.path.exists(temp_xlsx):
-                    os.remove(temp_xlsx)
-                    
-            except Exception as e:
-                messagebox.showerror("Ошибка", f"Ошибка при парсинге файла:\n{str(e)}")
+            
+            start_job(task, done, "Ошибка при парсинге файла", "Парсинг файла...")
     
     # Функция наполнения выпадающего списка занятий
-    def populate_lesson_dropdown(df):
-        if df is not None and not df.empty:
-            # Формируем список занятий в формате "№ topic_num/lesson_num lesson_title"
-            lessons = []
-            for idx, row in df.iterrows():
-                topic_num = row.get('Номер темы', '')
-                lesson_num = row.get('Номер занятия', '')
-                lesson_title = row.get('Название занятия', '')
-                
-                if topic_num and lesson_num:
-                    formatted = f"№ {topic_num}/{lesson_num} {lesson_title}"
-                    lessons.append(formatted)
+    def populate_lesson_dropdown(index):
+        if index is not None and len(index):
+            # Список занятий в формате "№ topic_num/lesson_num lesson_title"
+            lessons = index.labels()
             
             # Обновляем список в выпадающем меню
             lesson_menu.configure(values=lessons)
@@ -712,26 +3810,46 @@ def run_gui():
         xlsx_file = filedialog.asksaveasfilename(
             title="Сохранить XLSX как",
             defaultextension=".xlsx",
-            filetypes=[("Excel файлы", "*.xlsx"), ("Все файлы", "*.*")]
+            filetypes=[("Excel файлы", "*.xlsx"), ("CSV", "*.csv"), ("JSON", "*.json"),
+                       ("Все файлы", "*.*")]
         )
         if not xlsx_file:
             return
 
-        try:
-            parsed_data["df"] = parse_docx_to_xlsx(docx_file, xlsx_file)
+        def task(progress, cancel_event):
+            df = parse_docx(docx_file)
+            store_parsed(docx_file, df)
+            export_table(df, xlsx_file)
+            return df
+        
+        def done(df, cancelled):
+            parsed_data["df"] = df
+            parsed_data["lessons"] = LessonIndex.from_dataframe(df)
             messagebox.showinfo("Готово", f"Результат сохранён:\n{xlsx_file}")
             
             # Наполняем выпадающий список занятий
-            populate_lesson_dropdown(parsed_data["df"])
+            populate_lesson_dropdown(parsed_data["lessons"])
             
             # Показываем правый фрейм
             right_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=10, pady=10)
-            
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Ошибка при парсинге:\n{str(e)}")
+        
+        start_job(task, done, "Ошибка при парсинге", "Парсинг и сохранение XLSX...")
+    
+    # Данные формы для шаблона
+    def form_values():
+        return {
+            "НАЧАЛЬНИК": chief.get(),
+            "ЧИСЛА": day.get(),
+            "МЕСЯЦА": month.get(),
+            "ГОДА": year.get(),
+            "ГРУППАНОМЕР": group_number.get(),
+            "ДАТАПРОВЕДЕНИЯ": lesson_date.get(),
+            "АУДИТОРИЯ": classroom.get(),
+            "РУКОВОДИТЕЛЬ": instructor.get()
+        }
     
     # Функция сохранения всех занятий как DOCX
-    def save_all_lessons():
+    def save_all_lessons_gui():
         if parsed_data["df"] is None or parsed_data["df"].empty:
             messagebox.showwarning("Внимание", "Сначала загрузите и обработайте DOCX файл!")
             return
@@ -752,40 +3870,100 @@ def run_gui():
                 return
         
         # Форма данных для шаблона
-        form_data = {
-            "НАЧАЛЬНИК": chief.get(),
-            "ЧИСЛА": day.get(),
-            "МЕСЯЦА": month.get(),
-            "ГОДА": year.get(),
-            "ГРУППАНОМЕР": group_number.get(),
-            "ДАТАПРОВЕДЕНИЯ": lesson_date.get(),
-            "АУДИТОРИЯ": classroom.get(),
-            "РУКОВОДИТЕЛЬ": instructor.get()
-        }
+        form_data = form_values()
         
-        # Счетчики
-        total = len(parsed_data["df"])
-        success = 0
+        # Генерируем все занятия в фоне (параллельно, см. generate_lessons)
+        df = parsed_data["df"]
         
-        # Для каждой строки DataFrame создаем файл
-        for idx, row in parsed_data["df"].iterrows():
-            topic_num = row.get('Номер темы', '')
-            lesson_num = row.get('Номер занятия', '')
-            
-            if not topic_num or not lesson_num:
-                continue
-                
-            # Формируем имя файла
-            filename = f"Тема_{topic_num}_Занятие_{lesson_num}.docx"
-            output_path = os.path.join(output_dir, filename)
-            
-            # Генерируем документ
-            if generate_lesson_docx(template_file, output_path, row, form_data):
-                success += 1
+        def task(progress, cancel_event):
+            return save_all_lessons(df, template_file, output_dir, form_data,
+                                    progress=progress, cancel_event=cancel_event,
+                                    incremental=True)
+        
+        def done(result, cancelled):
+            success, total = result
+            title = "Операция отменена" if cancelled else "Операция завершена"
+            messagebox.showinfo(title, 
+                              f"Успешно создано {success} из {total} документов\n"
+                              f"Результаты сохранены в:\n{output_dir}")
+        
+        start_job(task, done, "Ошибка при создании документов", "Генерация занятий...")
+    
+    # Функция сохранения всех занятий одним ZIP-архивом
+    def save_bundle_gui():
+        if parsed_data["df"] is None or parsed_data["df"].empty:
+            messagebox.showwarning("Внимание", "Сначала загрузите и обработайте DOCX файл!")
+            return
+        
+        bundle_file = filedialog.asksaveasfilename(
+            title="Сохранить архив занятий",
+            defaultextension=".zip",
+            filetypes=[("ZIP архив", "*.zip"), ("Все файлы", "*.*")],
+            initialfile="Занятия.zip"
+        )
+        if not bundle_file:
+            return
+        
+        template_file = "Template.docx"
+        if not os.path.exists(template_file):
+            template_file = filedialog.askopenfilename(
+                title="Выберите файл шаблона",
+                filetypes=[("Word Documents", "*.docx")]
+            )
+            if not template_file:
+                return
+        
+        form_data = form_values()
+        df = parsed_data["df"]
+        
+        def task(progress, cancel_event):
+            return save_lessons_bundle(df, template_file, bundle_file, form_data,
+                                       progress=progress, cancel_event=cancel_event)
+        
+        def done(result, cancelled):
+            success, total = result
+            title = "Операция отменена" if cancelled else "Операция завершена"
+            messagebox.showinfo(title,
+                              f"В архив записано {success} из {total} документов\n"
+                              f"Архив:\n{bundle_file}")
+        
+        start_job(task, done, "Ошибка при создании архива", "Генерация архива занятий...")
+    
+    # Функция сохранения объединенных документов (по темам, семестрам или всех занятий)
+    def save_combined_gui():
+        if parsed_data["df"] is None or parsed_data["df"].empty:
+            messagebox.showwarning("Внимание", "Сначала загрузите и обработайте DOCX файл!")
+            return
+        
+        output_dir = filedialog.askdirectory(title="Выберите папку для сохранения")
+        if not output_dir:
+            return
+        
+        template_file = "Template.docx"
+        if not os.path.exists(template_file):
+            template_file = filedialog.askopenfilename(
+                title="Выберите файл шаблона",
+                filetypes=[("Word Documents", "*.docx")]
+            )
+            if not template_file:
+                return
+        
+        form_data = form_values()
+        group_by = COMBINE_CHOICES[combine_mode.get()]
+        df = parsed_data["df"]
         
-        messagebox.showinfo("Операция завершена", 
-                          f"Успешно создано {success} из {total} документов\n"
-                          f"Результаты сохранены в:\n{output_dir}")
+        def task(progress, cancel_event):
+            return save_combined_lessons(df, template_file, output_dir, form_data, group_by,
+                                         progress=progress, cancel_event=cancel_event)
+        
+        def done(result, cancelled):
+            success, total = result
+            title = "Операция отменена" if cancelled else "Операция завершена"
+            messagebox.showinfo(title,
+                              f"Создано {success} из {total} объединенных документов\n"
+                              f"Результаты сохранены в:\n{output_dir}")
+        
+        start_job(task, done, "Ошибка при создании документов", "Объединение занятий...")
     
     # Функция сохранения одного выбранного занятия
     def save_single_lesson():
@@ -798,17 +3976,8 @@ def run_gui():
             messagebox.showwarning("Внимание", "Выберите занятие из списка!")
             return
             
-        # Ищем выбранное занятие в DataFrame
-        selected_row = None
-        for idx, row in parsed_data["df"].iterrows():
-            topic_num = row.get('Номер темы', '')
-            lesson_num = row.get('Номер занятия', '')
-            lesson_title = row.get('Название занятия', '')
-            
-            formatted = f"№ {topic_num}/{lesson_num} {lesson_title}"
-            if formatted == lesson_text:
-                selected_row = row
-                break
+        # Ищем выбранное занятие по подписи в индексе (без перебора строк DataFrame)
+        selected_row = parsed_data["lessons"].find(lesson_text)
                 
         if selected_row is None:
             messagebox.showerror("Ошибка", "Выбранное занятие не найдено в данных!")
@@ -819,7 +3988,7 @@ def run_gui():
             title="Сохранить как",
             defaultextension=".docx",
             filetypes=[("Word Documents", "*.docx"), ("Все файлы", "*.*")],
-            initialfile=f"Тема_{selected_row.get('Номер темы', '')}_Занятие_{selected_row.get('Номер занятия', '')}.docx"
+            initialfile=selected_row.filename or "Занятие.docx"
         )
         if not output_file:
             return
@@ -836,22 +4005,19 @@ def run_gui():
                 return
                 
         # Форма данных для шаблона
-        form_data = {
-            "НАЧАЛЬНИК": chief.get(),
-            "ЧИСЛА": day.get(),
-            "МЕСЯЦА": month.get(),
-            "ГОДА": year.get(),
-            "ГРУППАНОМЕР": group_number.get(),
-            "ДАТАПРОВЕДЕНИЯ": lesson_date.get(),
-            "АУДИТОРИЯ": classroom.get(),
-            "РУКОВОДИТЕЛЬ": instructor.get()
-        }
+        form_data = form_values()
         
-        # Генерируем документ
-        if generate_lesson_docx(template_file, output_file, selected_row, form_data):
-            messagebox.showinfo("Готово", f"Файл успешно создан:\n{output_file}")
-        else:
-            messagebox.showerror("Ошибка", "Не удалось создать файл!")
+        # Генерируем документ в фоне
+        def task(progress, cancel_event):
+            return generate_lesson_docx(template_file, output_file, selected_row, form_data)
+        
+        def done(ok, cancelled):
+            if ok:
+                messagebox.showinfo("Готово", f"Файл успешно создан:\n{output_file}")
+            else:
+                messagebox.showerror("Ошибка", "Не удалось создать файл!")
+        
+        start_job(task, done, "Ошибка при создании документа", "Генерация занятия...")
             
     # Настройка левого фрейма
     left_title = ctk.CTkLabel(left_frame, text="Выберите DOCX файл:", font=("Arial", 14, "bold"))
@@ -866,6 +4032,17 @@ def run_gui():
     btn_process = ctk.CTkButton(left_frame, text="Сохранить результат (XLSX)", command=process_file)
     btn_process.pack(pady=(15, 20))
     
+    # Ход фоновой операции
+    progress_bar = ctk.CTkProgressBar(left_frame, width=250)
+    progress_bar.set(0)
+    progress_bar.pack(pady=(10, 5))
+    
+    progress_label = ctk.CTkLabel(left_frame, text="", wraplength=250)
+    progress_label.pack(pady=5)
+    
+    cancel_btn = ctk.CTkButton(left_frame, text="Отмена", command=cancel_job, state="disabled")
+    cancel_btn.pack(pady=5)
+    
     # Настройка правого фрейма
     # Заголовок
     right_title = ctk.CTkLabel(right_frame, text="Генерация плана занятия", font=("Arial", 16, "bold"))
@@ -943,14 +4120,359 @@ def run_gui():
     buttons_frame = ctk.CTkFrame(right_frame)
     buttons_frame.pack(fill=tk.X, padx=10, pady=(20, 5))
     
-    save_all_btn = ctk.CTkButton(buttons_frame, text="Сохранить все занятия в DOCX", command=save_all_lessons)
+    save_all_btn = ctk.CTkButton(buttons_frame, text="Сохранить все занятия в DOCX", command=save_all_lessons_gui)
     save_all_btn.pack(side=tk.LEFT, padx=5, expand=True, fill=tk.X)
     
+    save_bundle_btn = ctk.CTkButton(buttons_frame, text="Сохранить все занятия в ZIP", command=save_bundle_gui)
+    save_bundle_btn.pack(side=tk.LEFT, padx=5, expand=True, fill=tk.X)
+    
     save_one_btn = ctk.CTkButton(buttons_frame, text="Сохранить одно занятие в DOCX", command=save_single_lesson)
     save_one_btn.pack(side=tk.LEFT, padx=5, expand=True, fill=tk.X)
     
+    # Объединенные документы
+    combine_frame = ctk.CTkFrame(right_frame)
+    combine_frame.pack(fill=tk.X, padx=10, pady=5)
+    
+    combine_menu = ctk.CTkOptionMenu(combine_frame, variable=combine_mode,
+                                     values=list(COMBINE_CHOICES), width=150)
+    combine_menu.pack(side=tk.LEFT, padx=5)
+    
+    save_combined_btn = ctk.CTkButton(combine_frame, text="Сохранить занятия одним DOCX", command=save_combined_gui)
+    save_combined_btn.pack(side=tk.LEFT, padx=5, expand=True, fill=tk.X)
+    
     app.mainloop()
 
 
+# =============================================================================
+# КОМАНДНАЯ СТРОКА
+# =============================================================================
+
+def load_form_data(form_path):
+    """ Данные формы из JSON-файла {"НАЧАЛЬНИК": "...", ...}; без файла – пустой словарь. """
+    if not form_path:
+        return {}
+    with open(form_path, encoding="utf-8") as f:
+        form_data = json.load(f)
+    if not isinstance(form_data, dict):
+        raise ValueError(f"В {form_path} ожидается JSON-объект с полями формы")
+    return {str(k): "" if v is None else str(v) for k, v in form_data.items()}
+
+def _cli_generate(df, args):
+    """ Генерация DOCX по всем занятиям df; возвращает код выхода. """
+    if args.bundle:
+        return _cli_bundle(df, args)
+    if args.combine:
+        return _cli_combine(df, args)
+    os.makedirs(args.output_dir, exist_ok=True)
+    results = generate_lessons(lesson_records(df), args.template, args.output_dir,
+                               load_form_data(args.form), args.workers,
+                               incremental=True, rebuild=args.full)
+    created = sum(1 for r in results if r.ok and not r.skipped)
+    unchanged = sum(1 for r in results if r.skipped)
+    failed = 0
+    for result in results:
+        if result.ok:
+            continue
+        if result.error == DUPLICATE_FILENAME_ERROR:
+            print(f"Пропущено: {result.filename}: {result.error}", file=sys.stderr)
+        else:
+            print(f"Ошибка: {result.filename}: {result.error}", file=sys.stderr)
+            failed += 1
+    print(f"Создано {created} из {len(results)} документов в {args.output_dir}"
+          + (f" (без изменений: {unchanged})" if unchanged else ""))
+    return 1 if failed else 0
+
+def _cli_combine(df, args):
+    """ generate --combine: объединенные документы в --output-dir; возвращает код выхода. """
+    os.makedirs(args.output_dir, exist_ok=True)
+    success, total = save_combined_lessons(df, args.template, args.output_dir,
+                                           load_form_data(args.form), args.combine,
+                                           args.break_type)
+    print(f"Создано {success} из {total} объединенных документов в {args.output_dir}")
+    return 0 if success == total else 1
+
+def _cli_bundle(df, args):
+    """ generate --bundle: все занятия одним ZIP (в файл или stdout); возвращает код выхода. """
+    to_stdout = args.bundle == "-"
+    target = sys.stdout.buffer if to_stdout else args.bundle
+    results = write_lessons_bundle(lesson_records(df), args.template, target,
+                                   load_form_data(args.form), args.workers)
+    failed = 0
+    for result in results:
+        if result.ok:
+            continue
+        if result.error == DUPLICATE_FILENAME_ERROR:
+            print(f"Пропущено: {result.filename}: {result.error}", file=sys.stderr)
+        else:
+            print(f"Ошибка: {result.filename}: {result.error}", file=sys.stderr)
+            failed += 1
+    created = sum(1 for r in results if r.ok)
+    print(f"В архив записано {created} из {len(results)} документов"
+          + ("" if to_stdout else f": {args.bundle}"),
+          file=sys.stderr if to_stdout else sys.stdout)
+    return 1 if failed else 0
+
+def build_cli_parser():
+    parser = argparse.ArgumentParser(
+        description="Парсер DOCX -> XLSX и генератор планов занятий. "
+                    "Без команды запускается графический интерфейс.")
+    sub = parser.add_subparsers(dest="command")
+
+    # Общие для команд параметры вывода
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("-v", "--verbose", action="count", default=0,
+                        help="ход работы в stderr; -vv – подробно, с временем этапов")
+    common.add_argument("--log-json", action="store_true",
+                        help="журнал в stderr строками JSON")
+    common.add_argument("--metrics", action="store_true",
+                        help="в конце вывести в stderr JSON с временем этапов и счетчиками")
+
+    def add_parse_options(p):
+        p.add_argument("docx", help="учебная программа (DOCX)")
+        add_parse_flags(p)
+
+    def add_parse_flags(p):
+        p.add_argument("--table-number", type=int, default=TABLE_NUMBER,
+                       help=f"номер таблицы с расписанием (по умолчанию {TABLE_NUMBER})")
+        p.add_argument("--start-row", type=int, default=START_ROW,
+                       help=f"первая строка таблицы (по умолчанию {START_ROW})")
+        p.add_argument("--backend", choices=["python-docx", "stream"], default=DOCX_BACKEND,
+                       help="способ чтения DOCX")
+        p.add_argument("--keep-numbering", action="store_true", default=KEEP_SOURCE_NUMBERING,
+                       help="литература и мат. обеспечение на занятие с номерами строк раздела")
+        p.add_argument("--no-cache", action="store_true",
+                       help="не использовать кэш разбора (всегда читать DOCX заново)")
+
+    def add_generate_options(p):
+        p.add_argument("--template", default="Template.docx", help="шаблон плана занятия")
+        p.add_argument("--form", help="JSON с данными формы (НАЧАЛЬНИК, ЧИСЛА, ...)")
+        target = p.add_mutually_exclusive_group(required=True)
+        target.add_argument("--output-dir", help="папка для DOCX занятий")
+        target.add_argument("--bundle", metavar="ZIP",
+                            help="все занятия одним ZIP-архивом с оглавлением; '-' – в stdout")
+        p.add_argument("--workers", type=int, default=None,
+                       help="число процессов генерации (по умолчанию – по числу ядер)")
+        p.add_argument("--full", action="store_true",
+                       help="перегенерировать все занятия, а не только измененные")
+        p.add_argument("--combine", choices=sorted(COMBINE_GROUPS),
+                       help="объединить занятия в один DOCX на тему, семестр или все сразу "
+                            "(в --output-dir)")
+        p.add_argument("--break", dest="break_type", choices=["page", "section"], default="page",
+                       help="разрыв между занятиями в объединенном документе")
+
+    p = sub.add_parser("parse", help="DOCX -> XLSX", parents=[common])
+    add_parse_options(p)
+    p.add_argument("-o", "--output",
+                   help="путь к XLSX, .csv или .json (по умолчанию XLSX рядом с DOCX)")
+
+    p = sub.add_parser("generate", help="DOCX + шаблон + данные формы -> DOCX занятий", parents=[common])
+    add_parse_options(p)
+    add_generate_options(p)
+
+    p = sub.add_parser("run-all", help="parse и generate за один запуск", parents=[common])
+    add_parse_options(p)
+    add_generate_options(p)
+    p.add_argument("-o", "--output",
+                   help="путь к XLSX, .csv или .json (по умолчанию XLSX рядом с DOCX)")
+
+    p = sub.add_parser("watch", help="следить за папкой и обрабатывать новые/измененные DOCX",
+                       parents=[common])
+    p.add_argument("folder", help="папка с учебными программами")
+    p.add_argument("--output-dir", required=True,
+                   help="папка результатов: <имя>.xlsx и <имя>/ с занятиями")
+    p.add_argument("--template", help="шаблон плана занятия (без него – только XLSX)")
+    p.add_argument("--form", help="JSON с данными формы (НАЧАЛЬНИК, ЧИСЛА, ...)")
+    p.add_argument("--table-number", type=int, default=TABLE_NUMBER)
+    p.add_argument("--start-row", type=int, default=START_ROW)
+    p.add_argument("--backend", choices=["python-docx", "stream"], default=DOCX_BACKEND)
+    p.add_argument("--keep-numbering", action="store_true", default=KEEP_SOURCE_NUMBERING)
+    p.add_argument("--workers", type=int, default=None,
+                   help="процессов обработки (по умолчанию – по числу ядер)")
+    p.add_argument("--interval", type=float, default=WATCH_INTERVAL, help="период опроса, с")
+    p.add_argument("--debounce", type=float, default=WATCH_DEBOUNCE,
+                   help="сколько секунд файл должен не меняться перед обработкой")
+    p.add_argument("--once", action="store_true",
+                   help="обработать изменения один раз и выйти (для планировщика)")
+
+    p = sub.add_parser("corpus", help="папка программ -> один набор занятий (пул процессов)",
+                       parents=[common])
+    p.add_argument("folder", help="папка с учебными программами (обходится рекурсивно)")
+    add_parse_flags(p)
+    p.add_argument("-o", "--output", required=True, help="общий набор занятий: .xlsx, .csv или .json")
+    p.add_argument("--errors", help="список файлов с ошибками: .xlsx, .csv или .json")
+    p.add_argument("--workers", type=int, default=None,
+                   help="процессов разбора (по умолчанию – по числу ядер)")
+
+    p = sub.add_parser("store", help="сохранить разобранные программы в базу SQLite",
+                       parents=[common])
+    p.add_argument("database", help="файл базы SQLite (создается при первом запуске)")
+    p.add_argument("paths", nargs="+", help="DOCX и/или папки с программами")
+    add_parse_flags(p)
+    p.add_argument("--workers", type=int, default=None,
+                   help="процессов разбора (по умолчанию – по числу ядер)")
+    p.add_argument("--force", action="store_true", help="разобрать заново и неизмененные программы")
+
+    p = sub.add_parser("query", help="занятия из базы SQLite без разбора DOCX", parents=[common])
+    p.add_argument("database", help="файл базы SQLite (см. store)")
+    p.add_argument("--discipline", help="дисциплина (без нее – список дисциплин)")
+    p.add_argument("--semester", help="семестр")
+    p.add_argument("--topic", help="номер темы (без --lesson – все занятия темы)")
+    p.add_argument("--lesson", help="номер занятия (только вместе с --topic)")
+    p.add_argument("-o", "--output", help="сохранить занятия в .xlsx, .csv или .json")
+
+    p = sub.add_parser("serve", help="локальный HTTP-сервис разбора и генерации", parents=[common])
+    p.add_argument("--host", default=SERVICE_HOST, help=f"адрес (по умолчанию {SERVICE_HOST})")
+    p.add_argument("--port", type=int, default=SERVICE_PORT,
+                   help=f"порт (по умолчанию {SERVICE_PORT})")
+    p.add_argument("--template", help="шаблон плана занятия по умолчанию для /lessons")
+    p.add_argument("--workers", type=int, default=None,
+                   help="процессов разбора и генерации (по умолчанию – по числу ядер)")
+    p.add_argument("--max-inflight", type=int, default=None,
+                   help="одновременных запросов, сверх – ответ 503 (по умолчанию 4 на процесс)")
+
+    sub.add_parser("gui", help="графический интерфейс")
+    return parser
+
+def cli(argv=None):
+    """ Точка входа командной строки; возвращает код выхода. """
+    parser = build_cli_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "combine", None) and args.bundle:
+        parser.error("--combine сохраняет документы в --output-dir и несовместим с --bundle")
+    if args.command == "query":
+        if args.lesson is not None and args.topic is None:
+            parser.error("--lesson задается вместе с --topic")
+        if args.topic is not None and not args.discipline:
+            parser.error("--topic задается вместе с --discipline")
+
+    if args.command in (None, "gui"):
+        run_gui()
+        return 0
+
+    if args.verbose or args.log_json:
+        configure_logging(args.verbose, args.log_json)
+
+    with collect_metrics() if args.metrics else contextlib.nullcontext() as metrics:
+        code = _cli_run(args)
+    if metrics is not None:
+        print(json.dumps(metrics.summary(), ensure_ascii=False), file=sys.stderr)
+    return code
+
+def _cli_watch(args):
+    """ Команда watch; возвращает код выхода. """
+    if not args.verbose and not args.log_json:
+        configure_logging(1)   # для наблюдения ход работы и есть результат
+    watcher = FolderWatcher(
+        args.folder, args.output_dir, args.template, load_form_data(args.form),
+        parse_options={"backend": args.backend, "table_num": args.table_number,
+                       "start_row": args.start_row, "keep_numbering": args.keep_numbering},
+        workers=args.workers, debounce=args.debounce)
+    if args.once:
+        summaries = watcher.run_once()
+        return 1 if any("error" in s or s.get("errors") for s in summaries) else 0
+    watcher.run(args.interval)
+    return 0
+
+def _cli_corpus(args):
+    """ Команда corpus; возвращает код выхода. """
+    import pandas as pd
+
+    result = parse_corpus(
+        args.folder, args.workers,
+        parse_options={"backend": args.backend, "table_num": args.table_number,
+                       "start_row": args.start_row, "use_cache": not args.no_cache,
+                       "keep_numbering": args.keep_numbering})
+    export_table(result.lessons, args.output)
+    for error in result.errors:
+        print(f"Ошибка: {error.path}: {error.error}", file=sys.stderr)
+    if args.errors:
+        export_table(pd.DataFrame(result.errors, columns=["Файл", "Ошибка"]), args.errors)
+    print(f"Разобрано {result.parsed} из {result.files} файлов, "
+          f"занятий: {len(result.lessons)}, {result.seconds:.2f} с "
+          f"({result.files_per_second:.1f} файл/с). Результат: {args.output}")
+    return 1 if result.errors else 0
+
+def _cli_store(args):
+    """ Команда store; возвращает код выхода. """
+    with LessonStore(args.database) as store:
+        summary = store.update(
+            args.paths, args.workers,
+            parse_options={"backend": args.backend, "table_num": args.table_number,
+                           "start_row": args.start_row, "use_cache": not args.no_cache,
+                           "keep_numbering": args.keep_numbering},
+            force=args.force)
+        store.prune_texts()
+    for error in summary["errors"]:
+        print(f"Ошибка: {error.path}: {error.error}", file=sys.stderr)
+    print(f"Сохранено программ: {summary['updated']}, без изменений: {summary['unchanged']}, "
+          f"занятий: {summary['lessons']}. База: {args.database}")
+    return 1 if summary["errors"] else 0
+
+def _cli_query(args):
+    """ Команда query; возвращает код выхода. """
+    if not os.path.exists(args.database):
+        raise FileNotFoundError(f"База не найдена: {args.database}")
+    with LessonStore(args.database) as store:
+        if not args.discipline:
+            for discipline, lessons in store.disciplines():
+                print(f"{discipline}\t{lessons}")
+            return 0
+        if args.lesson is not None:
+            record = store.get_lesson(args.discipline, args.topic, args.lesson, args.semester)
+            if record is None:
+                print("Занятие не найдено", file=sys.stderr)
+                return 1
+            records = [record]
+        else:
+            records = store.discipline_lessons(args.discipline, args.semester)
+            if args.topic is not None:
+                records = [r for r in records if r.topic_number == args.topic.strip()]
+    if args.output:
+        export_table(lessons_to_dataframe(records), args.output)
+        print(f"Занятий: {len(records)}. Результат сохранен в: {args.output}")
+    elif len(records) == 1:
+        print(json.dumps(dict(zip(LESSON_RECORD_COLUMNS, records[0])), ensure_ascii=False,
+                         indent=1, default=str))
+    else:
+        for record in records:
+            print(record.label)
+    return 0 if records else 1
+
+def _cli_run(args):
+    """ parse / generate / run-all / watch / corpus / store / query / serve; возвращает код выхода. """
+    try:
+        if args.command == "watch":
+            return _cli_watch(args)
+        if args.command == "corpus":
+            return _cli_corpus(args)
+        if args.command == "store":
+            return _cli_store(args)
+        if args.command == "query":
+            return _cli_query(args)
+        if args.command == "serve":
+            if not args.verbose and not args.log_json:
+                configure_logging(1)   # адрес сервиса и ошибки запросов
+            serve(args.host, args.port, args.template, args.workers, args.max_inflight)
+            return 0
+        df = parse_docx(args.docx, args.backend, args.table_number, args.start_row,
+                        not args.no_cache, args.keep_numbering)
+        if args.command == "generate":
+            return _cli_generate(df, args)
+
+        output_path = args.output or os.path.splitext(args.docx)[0] + ".xlsx"
+        export_table(df, output_path)
+        # При архиве в stdout служебный вывод идет в stderr
+        print("Парсинг завершен. Результат сохранен в:", output_path,
+              file=sys.stderr if getattr(args, "bundle", None) == "-" else sys.stdout)
+        if log.isEnabledFor(logging.INFO):
+            log.info("%s", df.head(15).to_string(index=False))
+        if args.command == "run-all":
+            return _cli_generate(df, args)
+        return 0
+    except Exception as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+
+
 if __name__ == "__main__":
-    run_gui()
\ No newline at end of file
+    sys.exit(cli())
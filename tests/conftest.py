@@ -0,0 +1,53 @@
+import os
+import sys
+
+import pytest
+
+# main.py и bench.py лежат в корне репозитория, пакета нет
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+
+def add_hyperlink(paragraph, text):
+    """ w:hyperlink с одним прогоном в конце параграфа. """
+    from docx.oxml import parse_xml
+
+    paragraph._p.append(parse_xml(
+        f'<w:hyperlink {W} w:anchor="link"><w:r><w:t>{text}</w:t></w:r></w:hyperlink>'))
+
+
+@pytest.fixture
+def merged_docx(tmp_path):
+    """
+    DOCX с двумя таблицами: во второй (TABLE_NUMBER) – вертикальное,
+    горизонтальное и блочное объединение ячеек, строка с w:gridBefore и
+    гиперссылки в тексте и в ячейках.
+    """
+    import docx
+    from docx.oxml import parse_xml
+
+    document = docx.Document()
+    add_hyperlink(document.add_paragraph("Программа дисциплины "), "«Синтетика»")
+    document.add_table(rows=1, cols=2).cell(0, 0).text = "первая таблица"
+
+    table = document.add_table(rows=7, cols=5)
+    for r, row in enumerate(table.rows):
+        for c, cell in enumerate(row.cells):
+            cell.text = f"{r}.{c}"
+    table.cell(2, 0).merge(table.cell(4, 0))                  # вертикальное
+    table.cell(2, 1).merge(table.cell(2, 3))                  # горизонтальное
+    table.cell(4, 2).merge(table.cell(5, 4))                  # блочное
+    add_hyperlink(table.cell(3, 1).paragraphs[0], " ссылка")
+    table.cell(6, 1).add_paragraph("вторая строка ячейки")
+
+    tr = table.rows[6]._tr
+    tr.insert(0, parse_xml(f'<w:trPr {W}><w:gridBefore w:val="1"/></w:trPr>'))
+    tr.remove(tr.findall(parse_xml(f'<w:tc {W}/>').tag)[0])
+
+    add_hyperlink(document.add_paragraph("Литература: "), "учебник")
+    path = tmp_path / "merged.docx"
+    document.save(path)
+    return str(path)
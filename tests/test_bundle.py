@@ -0,0 +1,113 @@
+import csv
+import io
+import json
+import sys
+import zipfile
+
+import pandas as pd
+import pytest
+
+import bench
+import main
+
+FORM = {"НАЧАЛЬНИК": "В. Пупкин", "ГОДА": "2025"}
+
+
+class UnseekableStream(io.RawIOBase):
+    """ Поток только на запись, как stdout в конвейере. """
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.data += b
+        return len(b)
+
+
+@pytest.fixture
+def template(tmp_path):
+    path = tmp_path / "template.docx"
+    bench.make_template_docx(str(path))
+    return str(path)
+
+
+def lessons(count):
+    return pd.DataFrame([{
+        'Дисциплина': "Синтетика", 'Семестр': "1", 'Название темы': f"Тема {i % 2 + 1}",
+        'Номер темы': str(i % 2 + 1), 'Тип занятия': "Лекция",
+        'Название занятия': f"Занятие {i}", 'Номер занятия': str(i // 2 + 1),
+        'Учебные вопросы': f"Вопрос {i}", 'Время в минутах': 90,
+    } for i in range(count)])
+
+
+def check_bundle(data, records, results):
+    filenames = [filename for filename, _ in records]
+    with zipfile.ZipFile(io.BytesIO(data)) as bundle:
+        assert bundle.namelist() == filenames + [main.BUNDLE_INDEX_CSV, main.BUNDLE_INDEX_JSON]
+        sizes = {info.filename: info.file_size for info in bundle.infolist()}
+        index = json.loads(bundle.read(main.BUNDLE_INDEX_JSON))
+        rows = list(csv.reader(io.StringIO(bundle.read(main.BUNDLE_INDEX_CSV).decode("utf-8-sig"))))
+
+    assert [result.filename for result in results] == filenames
+    assert all(result.ok and result.size == sizes[result.filename] for result in results)
+    assert [row["file"] for row in index] == filenames
+    assert [row["size"] for row in index] == [sizes[f] for f in filenames]
+    assert [row["lesson_title"] for row in index] == [r.get('Название занятия') for _, r in records]
+    assert all(row["error"] is None and row["semester"] == "1" for row in index)
+
+    assert rows[0] == [title for _, title, _ in main.BUNDLE_INDEX_COLUMNS]
+    assert [row[0] for row in rows[1:]] == filenames
+    assert [row[6] for row in rows[1:]] == [r["lesson_title"] for r in index]
+    assert [int(row[7]) for row in rows[1:]] == [r["size"] for r in index]
+
+
+def test_bundle_file_lists_lessons_and_index(template, tmp_path):
+    records = main.lesson_records(lessons(5))
+    path = tmp_path / "lessons.zip"
+    results = main.write_lessons_bundle(records, template, str(path), FORM, workers=1)
+
+    check_bundle(path.read_bytes(), records, results)
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_bundle_to_unseekable_stream(template):
+    records = main.lesson_records(lessons(5))
+    stream = UnseekableStream()
+    results = main.write_lessons_bundle(records, template, stream, FORM, workers=1)
+
+    check_bundle(bytes(stream.data), records, results)
+
+
+def test_bundle_index_reports_duplicate_lessons(template):
+    df = lessons(3)
+    df.loc[2, ['Номер темы', 'Номер занятия']] = df.loc[0, ['Номер темы', 'Номер занятия']]
+    records = main.lesson_records(df)
+    stream = io.BytesIO()
+    results = main.write_lessons_bundle(records, template, stream, FORM, workers=1)
+
+    assert [r.ok for r in results] == [False, True, True]
+    assert results[0].error == main.DUPLICATE_FILENAME_ERROR
+    with zipfile.ZipFile(stream) as bundle:
+        assert bundle.namelist().count(records[0][0]) == 1
+
+
+def test_cli_bundle_to_stdout(template, tmp_path, monkeypatch, capsys):
+    docx_path = tmp_path / "curriculum.docx"
+    bench.make_curriculum_docx(str(docx_path), semesters=1, topics=2, lessons=2)
+    form_path = tmp_path / "form.json"
+    form_path.write_text(json.dumps(FORM, ensure_ascii=False), encoding="utf-8")
+    stdout = UnseekableStream()
+    monkeypatch.setattr(sys, "stdout", io.TextIOWrapper(stdout, encoding="utf-8"))
+
+    code = main.cli(["generate", str(docx_path), "--template", template, "--form", str(form_path),
+                     "--bundle", "-", "--workers", "1", "--no-cache"])
+    sys.stdout.flush()
+
+    assert code == 0
+    with zipfile.ZipFile(io.BytesIO(bytes(stdout.data))) as bundle:
+        names = bundle.namelist()
+    assert len(names) == 2 * 2 + 2 and names[-2:] == [main.BUNDLE_INDEX_CSV, main.BUNDLE_INDEX_JSON]
+    assert "В архив записано 4 из 4" in capsys.readouterr().err
@@ -0,0 +1,32 @@
+import pandas as pd
+import pytest
+
+import main
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / "lessons.sqlite")
+    df = pd.DataFrame([{'Дисциплина': "Д", 'Семестр': "1", 'Номер темы': topic,
+                        'Номер занятия': lesson, 'Название занятия': f"{topic}/{lesson}"}
+                       for topic in ("1", "2") for lesson in ("1", "2")])
+    with main.LessonStore(path) as store:
+        store.upsert_curriculum("a.docx", df)
+    return path
+
+
+@pytest.mark.parametrize("argv", [["--discipline", "Д", "--lesson", "1"], ["--topic", "1"]])
+def test_query_rejects_incomplete_lesson_key(database, argv):
+    with pytest.raises(SystemExit) as exc:
+        main.cli(["query", database, *argv])
+    assert exc.value.code == 2
+
+
+def test_query_by_topic_lists_its_lessons(database, capsys):
+    assert main.cli(["query", database, "--discipline", "Д", "--topic", "2"]) == 0
+    assert len(capsys.readouterr().out.splitlines()) == 2
+
+
+def test_query_one_lesson(database, capsys):
+    assert main.cli(["query", database, "--discipline", "Д", "--topic", "2", "--lesson", "1"]) == 0
+    assert '"2/1"' in capsys.readouterr().out
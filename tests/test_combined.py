@@ -0,0 +1,62 @@
+import io
+import re
+import struct
+import zipfile
+import zlib
+
+import docx
+from docx.oxml import parse_xml
+
+import main
+
+
+def png_1x1():
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 0, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(b"\x00\x00")) + chunk(b"IEND", b""))
+
+
+def make_template():
+    document = docx.Document()
+    document.sections[0].header.paragraphs[0].add_run().add_picture(io.BytesIO(png_1x1()))
+    paragraph = document.add_paragraph("Тема: $ТЕМАЗАНЯТИЯ")
+    paragraph.insert_paragraph_before().add_run().add_picture(io.BytesIO(png_1x1()))
+    w = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+    paragraph._p.insert(0, parse_xml(f'<w:bookmarkStart {w} w:id="0" w:name="тема"/>'))
+    paragraph._p.append(parse_xml(f'<w:bookmarkEnd {w} w:id="0"/>'))
+    document.add_comment(paragraph.runs, text="проверить", author="автор")
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+def ids(xml, pattern):
+    return [int(m.group(2)) for m in pattern.finditer(xml)]
+
+
+def test_combined_ids_are_unique_across_the_package():
+    template = main.CompiledTemplate(make_template(), ["ТЕМАЗАНЯТИЯ"])
+    data = template.render_combined([{"ТЕМАЗАНЯТИЯ": f"тема {i}"} for i in range(3)])
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        parts = {name: archive.read(name).decode("utf-8") for name in archive.namelist()
+                 if name.endswith(".xml")}
+    body, comments = parts["word/document.xml"], parts["word/comments.xml"]
+    headers = [xml for name, xml in parts.items() if name.startswith("word/header")]
+
+    doc_pr = ids(body, main.DOC_PR_ID_PATTERN) + [i for xml in headers
+                                                 for i in ids(xml, main.DOC_PR_ID_PATTERN)]
+    assert len(doc_pr) == 4 and len(set(doc_pr)) == 4
+
+    starts = re.findall(r'<w:bookmarkStart\b[^>]*?\bw:id="(\d+)"', body)
+    assert len(starts) == 3 and len(set(starts)) == 3
+
+    references = re.findall(r'<w:commentReference\b[^>]*?\bw:id="(\d+)"', body)
+    entries = re.findall(r'<w:comment\b[^>]*?\bw:id="(\d+)"', comments)
+    assert len(references) == 3 and len(set(references)) == 3
+    assert sorted(entries) == sorted(references)
+
+    document = docx.Document(io.BytesIO(data))
+    assert [p.text for p in document.paragraphs if p.text.startswith("Тема")] == \
+        ["Тема: тема 0", "Тема: тема 1", "Тема: тема 2"]
@@ -0,0 +1,25 @@
+import pandas as pd
+
+import main
+
+
+def lessons(*keys):
+    return pd.DataFrame([{'Дисциплина': "Д", 'Семестр': "1", 'Номер темы': topic,
+                          'Номер занятия': lesson, 'Название занятия': name}
+                         for topic, lesson, name in keys])
+
+
+def test_repeats_are_dropped_only_across_files(monkeypatch, tmp_path):
+    frames = {
+        "a.docx": lessons(("1", "1", "a1"), ("1", "1", "a1 еще раз"), ("1", "2", "a2")),
+        "b.docx": lessons(("1", "1", "b1"), ("1", "3", "b3"), ("1", "3", "b3 еще раз")),
+    }
+    monkeypatch.setattr(main, "_parse_corpus_file",
+                        lambda path, options: (frames[path.split("/")[-1]], None, 0.0))
+    paths = [str(tmp_path / name) for name in frames]
+
+    result = main.parse_corpus(paths, workers=1)
+
+    assert list(result.lessons['Название занятия']) == ["a1", "a1 еще раз", "a2",
+                                                        "b3", "b3 еще раз"]
+    assert result.errors == [main.CorpusError(paths[1], "Занятий, уже найденных в других файлах: 1")]
@@ -0,0 +1,56 @@
+import math
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+import bench
+import main
+
+
+def test_streaming_xlsx_reads_back_like_to_excel(tmp_path):
+    flat, sections = bench.make_flat_rows(300)
+    df = main.build_lesson_table(flat, sections)
+    streamed, legacy = tmp_path / "streamed.xlsx", tmp_path / "legacy.xlsx"
+    main.export_xlsx(df, str(streamed), streaming=True)
+    main.export_xlsx(df, str(legacy), streaming=False)
+
+    pd.testing.assert_frame_equal(pd.read_excel(streamed), pd.read_excel(legacy))
+
+
+def test_write_xlsx_rows_cell_types(tmp_path):
+    path = tmp_path / "rows.xlsx"
+    rows = iter([
+        ["текст", 3, 1.5, True, None],
+        {"Текст": "a & <b>\x01", "Число": 7, "Дробь": math.nan, "Флаг": False},
+    ])
+    assert main.write_xlsx_rows(str(path), ["Текст", "Число", "Дробь", "Флаг", "Пусто"],
+                                rows) == 2
+
+    sheet = openpyxl.load_workbook(path).active
+    assert [[cell.value for cell in row] for row in sheet.iter_rows()] == [
+        ["Текст", "Число", "Дробь", "Флаг", "Пусто"],
+        ["текст", 3, 1.5, True, None],
+        ["a & <b>", 7, None, False, None],
+    ]
+    assert sheet["A1"].font.bold
+
+
+def test_write_xlsx_rows_numpy_scalars(tmp_path):
+    path = tmp_path / "numpy.xlsx"
+    row = [np.bool_(True), np.bool_(False), np.int64(5), np.float64(2.5), np.float64("nan")]
+    main.write_xlsx_rows(str(path), list("ABCDE"), [row])
+
+    values = [cell.value for cell in next(openpyxl.load_workbook(path).active.iter_rows(min_row=2))]
+    assert values == [True, False, 5, 2.5, None]
+    assert [type(value) for value in values[:3]] == [bool, bool, int]
+
+
+def test_streaming_xlsx_bool_column_reads_back_like_to_excel(tmp_path):
+    df = pd.DataFrame({"Занятие": ["a", "b", "c"], "Проведено": [True, False, True],
+                       "Часы": [2, 4, 90]})
+    streamed, legacy = tmp_path / "streamed.xlsx", tmp_path / "legacy.xlsx"
+    main.export_xlsx(df, str(streamed), streaming=True)
+    main.export_xlsx(df, str(legacy), streaming=False)
+
+    pd.testing.assert_frame_equal(pd.read_excel(streamed), pd.read_excel(legacy))
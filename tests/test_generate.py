@@ -0,0 +1,109 @@
+import os
+
+import docx
+import pandas as pd
+import pytest
+
+import main
+
+FORM = {"НАЧАЛЬНИК": "В. Пупкин", "ГОДА": "2025"}
+
+
+@pytest.fixture
+def template(tmp_path):
+    document = docx.Document()
+    document.add_paragraph("УТВЕРЖДАЮ $НАЧАЛЬНИК, $ГОДА г.")
+    document.add_paragraph("$ДИСЦИПЛИНА: $ТЕМАЗАНЯТИЯ")
+    document.add_paragraph("$УЧЕБНЫЕВОПРОСЫ")
+    path = tmp_path / "template.docx"
+    document.save(path)
+    return str(path)
+
+
+def lessons(count, topics=3):
+    return pd.DataFrame([{
+        'Дисциплина': "Синтетика", 'Название темы': f"Тема {i % topics + 1}",
+        'Номер темы': str(i % topics + 1), 'Тип занятия': "Лекция",
+        'Название занятия': f"Занятие {i}", 'Номер занятия': str(i // topics + 1),
+        'Учебные вопросы': f"Вопрос {i}", 'Время в минутах': 90,
+    } for i in range(count)])
+
+
+def test_results_keep_input_order_with_workers(template, tmp_path):
+    records = main.lesson_records(lessons(12))
+    results = {}
+    for workers in (1, 3):
+        output_dir = tmp_path / f"out_{workers}"
+        output_dir.mkdir()
+        results[workers] = main.generate_lessons(records, template, str(output_dir), FORM,
+                                                 workers=workers)
+
+    expected = [filename for filename, _ in records]
+    for workers, result in results.items():
+        assert [r.filename for r in result] == expected
+        assert all(r.ok and r.error is None for r in result)
+        assert all(isinstance(r.seconds, float) and r.seconds >= 0 for r in result)
+        document = docx.Document(str(tmp_path / f"out_{workers}" / expected[4]))
+        text = [p.text for p in document.paragraphs]
+        assert "Вопрос 4" in text[2]
+
+
+def test_duplicate_filenames_keep_the_last_row(template, tmp_path):
+    df = lessons(4)
+    df.loc[3, ['Номер темы', 'Номер занятия']] = df.loc[0, ['Номер темы', 'Номер занятия']]
+    results = main.generate_lessons(main.lesson_records(df), template, str(tmp_path), FORM,
+                                    workers=1)
+
+    assert [r.ok for r in results] == [False, True, True, True]
+    assert results[0].filename == results[3].filename
+    text = [p.text for p in docx.Document(str(tmp_path / results[3].filename)).paragraphs]
+    assert "Вопрос 3" in text[2]
+    # прежде файл перезаписывался и обе строки считались созданными
+    assert main.save_all_lessons(df, template, str(tmp_path), FORM, workers=1) == (3, 4)
+
+
+def generate_incremental(records, template, output_dir):
+    return main.generate_lessons(records, template, str(output_dir), FORM, workers=1,
+                                 incremental=True)
+
+
+def test_incremental_run_skips_unchanged_lessons(template, tmp_path):
+    records = main.lesson_records(lessons(6))
+    first = generate_incremental(records, template, tmp_path)
+    assert all(r.ok and not r.skipped for r in first)
+
+    second = generate_incremental(records, template, tmp_path)
+    assert all(r.ok and r.skipped for r in second)
+
+
+def test_incremental_run_regenerates_only_the_changed_row(template, tmp_path):
+    df = lessons(6)
+    generate_incremental(main.lesson_records(df), template, tmp_path)
+    mtimes = {name: os.path.getmtime(tmp_path / name) for name in os.listdir(tmp_path)}
+
+    df.loc[2, 'Учебные вопросы'] = "Новый вопрос"
+    records = main.lesson_records(df)
+    results = generate_incremental(records, template, tmp_path)
+
+    changed = records[2][0]
+    assert [r.filename for r in results if not r.skipped] == [changed]
+    text = [p.text for p in docx.Document(str(tmp_path / changed)).paragraphs]
+    assert "Новый вопрос" in text[2]
+    for filename, _ in records:
+        if filename != changed:
+            assert os.path.getmtime(tmp_path / filename) == mtimes[filename]
+
+
+def test_incremental_run_removes_orphaned_lessons(template, tmp_path):
+    records = main.lesson_records(lessons(6))
+    generate_incremental(records, template, tmp_path)
+    (tmp_path / "чужой.docx").write_bytes(b"")
+
+    results = generate_incremental(records[:4], template, tmp_path)
+
+    assert all(r.skipped for r in results)
+    for filename, _ in records[4:]:
+        assert not (tmp_path / filename).exists()
+    for filename, _ in records[:4]:
+        assert (tmp_path / filename).exists()
+    assert (tmp_path / "чужой.docx").exists()
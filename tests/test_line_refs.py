@@ -0,0 +1,47 @@
+import re
+
+import pytest
+
+import bench
+import main
+
+SECTION = "Учебник А\nУчебник Б\n  Учебник В  \nУчебник Г"
+REFS = ["1-3", "4, 2", "3-1", "9", "", "см. выше"]
+
+
+def test_line_refs_match_legacy_helpers():
+    expected = [main.pick_lines_from_text(SECTION, main.expand_number_ranges(refs))
+                for refs in REFS]
+    assert main.resolve_line_refs(REFS, SECTION) == expected
+    assert expected[:2] == ["Учебник А\nУчебник Б\nУчебник В", "Учебник Г\nУчебник Б"]
+
+
+def test_keep_numbering_prefixes_section_line_numbers():
+    assert main.resolve_line_refs(REFS[:4], SECTION, keep_numbering=True) == [
+        "1. Учебник А\n2. Учебник Б\n3. Учебник В",
+        "4. Учебник Г\n2. Учебник Б",
+        "1. Учебник А\n2. Учебник Б\n3. Учебник В",
+        "",
+    ]
+
+
+@pytest.mark.parametrize("column", ['Материальное обеспечение на занятие',
+                                    'Литература на занятие'])
+def test_keep_numbering_only_adds_prefixes(column):
+    flat, sections = bench.make_flat_rows(200)
+    plain = main.build_lesson_table(flat, sections, keep_numbering=False)[column]
+    numbered = main.build_lesson_table(flat, sections, keep_numbering=True)[column]
+    assert numbered.str.contains(r"^\d+\. ", regex=True).any()
+    stripped = [re.sub(r"^\d+\. ", "", value, flags=re.M) for value in numbered]
+    assert stripped == plain.tolist()
+
+
+@pytest.mark.parametrize("keep_numbering, expected", [
+    (False, "2. Стенд Б\n1. Стенд А\n2. Стенд Б"),
+    (True, "3. 2. Стенд Б\n1. 1. Стенд А\n3. 2. Стенд Б"),
+])
+def test_pick_lines_on_numbered_section(keep_numbering, expected):
+    # Строки раздела уже пронумерованы автором, и номера не совпадают с позицией
+    lines = main.section_lines("1. Стенд А\n\n2. Стенд Б")
+    refs = main.parse_line_refs("3, 1, 0, 4, 3")
+    assert main.pick_lines(lines, refs, keep_numbering) == expected
@@ -0,0 +1,27 @@
+import os
+
+import pandas as pd
+
+import main
+
+
+def test_failed_utime_keeps_the_entry(monkeypatch, tmp_path):
+    cache = main.ParseCache(str(tmp_path))
+    df = pd.DataFrame({'Дисциплина': ["Д"]})
+    cache.put("key", df)
+
+    def read_only(*args, **kwargs):
+        raise PermissionError("read-only")
+    monkeypatch.setattr(main.os, "utime", read_only)
+
+    pd.testing.assert_frame_equal(cache.get("key"), df)
+    assert os.path.exists(cache.path("key"))
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_corrupt_entry_is_removed(tmp_path):
+    cache = main.ParseCache(str(tmp_path))
+    with open(cache.path("key"), "wb") as f:
+        f.write(b"not a pickle")
+    assert cache.get("key") is None
+    assert not os.path.exists(cache.path("key"))
@@ -0,0 +1,23 @@
+import docx
+
+import main
+
+
+def test_values_are_xml_escaped():
+    content, counts = main.substitute_placeholders(
+        "<w:t>$ДИСЦИПЛИНА</w:t>", {"$ДИСЦИПЛИНА": 'A & B <c> "d"'})
+    assert content == "<w:t>A &amp; B &lt;c&gt; &quot;d&quot;</w:t>"
+    assert counts == {"$ДИСЦИПЛИНА": 1}
+
+
+def test_inserted_value_is_not_matched_again():
+    content, _ = main.substitute_placeholders(
+        "<w:t>$ТЕМАЗАНЯТИЯ, ГОДА</w:t>", {"$ТЕМАЗАНЯТИЯ": "Итоги ГОДА", "$ГОДА": "2025"})
+    assert content == "<w:t>Итоги ГОДА, 2025</w:t>"
+
+
+def test_replace_placeholders_keeps_document_valid():
+    document = docx.Document()
+    document.add_paragraph("Дисциплина: $ДИСЦИПЛИНА, ГОДА г.")
+    result = main.replace_placeholders(document, {"$ДИСЦИПЛИНА": "A & B <c>", "$ГОДА": "2025"})
+    assert [p.text for p in result.paragraphs] == ["Дисциплина: A & B <c>, 2025 г."]
@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+import pytest
+
+import main
+
+PARAGRAPHS = [
+    "РАБОЧАЯ ПРОГРАММА",
+    "Целью изучения дисциплины «Информатика» является ...",
+    "",
+    "знать: основы",          # маркеры без учета регистра
+    "Первое знание",
+    "   ",
+    "Уметь: решать",          # конец «Знать» и начало «Уметь» в одном параграфе
+    "Первое умение",
+    "Владеть: навыками",
+    "Основными видами занятий по дисциплине являются ...",
+    "III. ЛИТЕРАТУРА",
+    "  Учебник А  ",
+    "Учебник Б",
+    "Материальное обеспечение занятия",   # конец литературы и начало мат. обеспечения
+    "Стенд 1",
+    "IV. ОРГАНИЗАЦИОННО-МЕТОДИЧЕСКИЕ УКАЗАНИЯ",
+    "Изучения дисциплины «Другая» – повторное упоминание",
+]
+
+
+def legacy_sections(texts, markers):
+    doc = SimpleNamespace(paragraphs=[SimpleNamespace(text=t) for t in texts])
+    return main.get_discipline_name(doc), {
+        key: main.parse_text_between(doc, start, end) for key, (start, end) in markers.items()}
+
+
+@pytest.mark.parametrize("texts", [
+    PARAGRAPHS,
+    PARAGRAPHS[:12],          # без конечных маркеров – до конца документа
+    PARAGRAPHS[2:],           # без названия дисциплины
+    [],
+])
+def test_extract_sections_matches_marker_search(texts):
+    assert main.extract_sections(texts) == legacy_sections(texts, main.SECTION_MARKERS)
+
+
+def test_extract_sections_values():
+    name, sections = main.extract_sections(PARAGRAPHS)
+
+    assert name == "Информатика"
+    assert sections['know'] == "Первое знание"
+    assert sections['skill'] == "Первое умение"
+    assert sections['literature'] == "Учебник А\nУчебник Б"
+    assert sections['material'] == "Стенд 1"
@@ -0,0 +1,57 @@
+import socket
+import threading
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def server():
+    server = main.make_service_server(port=0, workers=1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    server.service.close()
+
+
+def status(server, headers):
+    with socket.create_connection(server.server_address[:2], timeout=10) as sock:
+        sock.sendall(f"POST /parse HTTP/1.1\r\nHost: test\r\n{headers}\r\n".encode("ascii"))
+        return int(sock.makefile("rb").readline().split()[1])
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ("", 411),
+    ("Content-Length: abc\r\n", 400),
+    ("Content-Length: -1\r\n", 400),
+    ("Content-Length: 1e3\r\n", 400),
+    (f"Content-Length: {main.SERVICE_MAX_UPLOAD + 1}\r\n", 413),
+])
+def test_content_length_is_validated(server, headers, expected):
+    assert status(server, headers) == expected
+
+
+def test_busy_service_rejects_before_reading_the_upload(server):
+    server.service.slots = threading.BoundedSemaphore(1)
+    server.service.slots.acquire()   # все слоты заняты
+    try:
+        with socket.create_connection(server.server_address[:2], timeout=10) as sock:
+            # Тело не отправляется: если сервис начнет его читать, ответа не будет
+            sock.sendall(b"POST /parse HTTP/1.1\r\nHost: test\r\n"
+                         b"Content-Length: 1000000\r\n\r\n")
+            response = sock.makefile("rb")
+            assert int(response.readline().split()[1]) == 503
+            headers = {}
+            for line in iter(response.readline, b"\r\n"):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.lower()] = value.strip()
+            assert headers["connection"] == "close"
+            assert headers["retry-after"] == "1"
+            response.read(int(headers["content-length"]))
+            assert response.read() == b""   # сервер закрыл соединение
+    finally:
+        server.service.slots.release()
+    assert server.service.stats["rejected"] == 1
@@ -0,0 +1,18 @@
+import compileall
+import json
+
+import bench
+import main
+
+
+def test_import_main_within_budget():
+    compileall.compile_file(main.__file__, quiet=1)   # меряем запуск с готовым .pyc
+    best = min(bench.import_time_ms("main") for _ in range(5))
+    assert best <= bench.STARTUP_BUDGET_MS
+
+
+def test_import_main_loads_no_heavy_modules():
+    loaded = json.loads(bench._run_python(
+        "import json, sys, main; "
+        f"print(json.dumps([m for m in {bench.HEAVY_MODULES!r} if m in sys.modules]))").stdout)
+    assert loaded == []
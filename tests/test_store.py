@@ -0,0 +1,42 @@
+import pandas as pd
+
+import main
+
+
+def lessons(*rows):
+    return pd.DataFrame([{'Дисциплина': "Д", 'Семестр': semester, 'Номер темы': topic,
+                          'Номер занятия': lesson, 'Название занятия': name}
+                         for semester, topic, lesson, name in rows])
+
+
+def test_duplicates_within_document_are_all_stored():
+    df = lessons(("1", "1", "1", "первое"), ("1", "1", "1", "повтор"), ("1", "1", "2", "второе"))
+    with main.LessonStore() as store:
+        assert store.upsert_curriculum("a.docx", df) == 3
+        assert store.documents()[0]["lessons"] == 3
+        assert [r.lesson_title for r in store.discipline_lessons("Д")] == ["первое", "повтор",
+                                                                           "второе"]
+        # повторное сохранение заменяет, а не добавляет
+        assert store.upsert_curriculum("a.docx", df.iloc[:2]) == 2
+        assert len(store.discipline_lessons("Д")) == 2
+
+
+def test_same_key_in_another_document_does_not_steal_rows():
+    with main.LessonStore() as store:
+        store.upsert_curriculum("a.docx", lessons(("1", "1", "1", "из a")))
+        store.upsert_curriculum("b.docx", lessons(("1", "1", "1", "из b"), ("1", "1", "2", "b2")))
+        assert {d["path"].rsplit("/", 1)[-1]: d["lessons"] for d in store.documents()} == \
+            {"a.docx": 1, "b.docx": 2}
+        assert store.get_lesson("Д", 1, 1).lesson_title == "из a"
+        store.remove_document("a.docx")
+        assert store.get_lesson("Д", 1, 1).lesson_title == "из b"
+
+
+def test_semesters_sort_as_numbers_and_round_trip():
+    df = lessons(("10", "1", "1", "десятый"), ("2", "1", "1", "второй"), ("", "1", "2", "без"))
+    with main.LessonStore() as store:
+        store.upsert_curriculum("a.docx", df)
+        assert store.get_lesson("Д", 1, 1).lesson_title == "второй"
+        assert store.get_lesson("Д", 1, 1, semester="10").lesson_title == "десятый"
+        assert [r.semester for r in store.discipline_lessons("Д")] == ["10", "2", ""]
+        assert [r.lesson_title for r in store.discipline_lessons("Д", semester=2)] == ["второй"]
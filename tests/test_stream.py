@@ -0,0 +1,17 @@
+import pandas as pd
+
+import bench
+import main
+
+
+def test_stream_backend_reads_the_same_content(merged_docx):
+    assert main.load_docx_content(merged_docx, "stream") == \
+        main.load_docx_content(merged_docx, "python-docx")
+
+
+def test_parse_docx_backends_match(tmp_path):
+    path = bench.make_curriculum_docx(str(tmp_path / "curriculum.docx"), semesters=2,
+                                      topics=3, lessons=4)
+    pd.testing.assert_frame_equal(
+        main.parse_docx(path, backend="python-docx", use_cache=False),
+        main.parse_docx(path, backend="stream", use_cache=False))
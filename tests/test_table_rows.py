@@ -0,0 +1,17 @@
+import docx
+import pytest
+
+import main
+
+
+def test_table_rows_text_matches_python_docx_cells(merged_docx):
+    table = docx.Document(merged_docx).tables[1]
+    expected = [[cell.text.strip() for cell in row.cells] for row in table.rows]
+    assert any(len(set(row)) < len(row) for row in expected)   # объединения есть
+    for start_row in range(1, len(expected) + 1):
+        assert main.table_rows_text(table._tbl, start_row) == expected[start_row - 1:]
+
+
+def test_read_table_checks_row_count(merged_docx):
+    with pytest.raises(ValueError, match="всего 7 строк"):
+        main.read_table_from_docx(docx.Document(merged_docx), 2, 8)
@@ -0,0 +1,56 @@
+import io
+import zipfile
+from collections import OrderedDict
+
+import docx
+
+import main
+
+
+def make_template(path):
+    document = docx.Document()
+    paragraph = document.add_paragraph("Дисциплина: ")
+    paragraph.add_run("$ДИС")
+    paragraph.add_run("ЦИП").bold = True
+    paragraph.add_run("ЛИНА и ещё")
+    document.add_paragraph("Тема: $ТЕМАЗАНЯТИЯ")
+    document.sections[0].header.paragraphs[0].text = "Группа $ГРУППАНОМЕР"
+    document.save(path)
+    return str(path)
+
+
+def test_placeholder_split_across_runs_is_replaced(tmp_path):
+    template = main.load_compiled_template(make_template(tmp_path / "template.docx"))
+    data = template.render({"$ДИСЦИПЛИНА": "Информатика", "$ТЕМАЗАНЯТИЯ": "Сети",
+                            "$ГРУППАНОМЕР": "ИКТВ-11"})
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        document_xml = archive.read("word/document.xml").decode("utf-8")
+    assert "Информатика" in document_xml
+    assert "ДИС" not in document_xml and "ЦИП" not in document_xml
+
+    document = docx.Document(io.BytesIO(data))
+    assert [p.text for p in document.paragraphs] == ["Дисциплина: Информатика и ещё",
+                                                     "Тема: Сети"]
+    assert document.sections[0].header.paragraphs[0].text == "Группа ИКТВ-11"
+
+
+def test_same_template_content_is_compiled_once(tmp_path):
+    first = main.load_compiled_template(make_template(tmp_path / "a.docx"))
+    copy = tmp_path / "b.docx"
+    copy.write_bytes((tmp_path / "a.docx").read_bytes())
+    assert main.load_compiled_template(str(copy)) is first
+
+
+def test_memory_cache_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(main, "TEMPLATE_MEMORY_CACHE_SIZE", 2)
+    monkeypatch.setattr(main, "_compiled_templates", OrderedDict())
+    monkeypatch.setattr(main, "CompiledTemplate", lambda template_bytes, fields: object())
+
+    a = main.compile_template_bytes(b"a")
+    b = main.compile_template_bytes(b"b")
+    assert main.compile_template_bytes(b"a") is a   # a – снова последний использованный
+    main.compile_template_bytes(b"c")
+
+    assert main.compile_template_bytes(b"a") is a
+    assert main.compile_template_bytes(b"b") is not b
@@ -0,0 +1,12 @@
+import pandas as pd
+import pytest
+
+import bench
+import main
+
+
+@pytest.mark.parametrize("rows", [1, 37, 2000])
+def test_build_lesson_table_matches_legacy(rows):
+    flat, sections = bench.make_flat_rows(rows)
+    pd.testing.assert_frame_equal(main.build_lesson_table(flat, sections),
+                                  bench.legacy_build_lesson_table(flat, sections))
@@ -0,0 +1,26 @@
+import main
+
+
+def test_broken_docx_is_not_retried_until_changed(tmp_path):
+    folder = tmp_path / "in"
+    folder.mkdir()
+    broken = folder / "broken.docx"
+    broken.write_bytes(b"not a docx")
+
+    watcher = main.FolderWatcher(str(folder), str(tmp_path / "out"), workers=1, debounce=0)
+    summaries = watcher.run_once()
+    assert [s["docx"] for s in summaries if "error" in s] == [str(broken)]
+    assert str(broken) in watcher.failed
+
+    # та же версия: ни stat, ни хэш не изменились – в очередь не попадает
+    assert watcher.scan(debounce=0) == []
+    broken.touch()
+    assert watcher.scan(debounce=0) == []
+
+    # ошибка переживает перезапуск
+    restarted = main.FolderWatcher(str(folder), str(tmp_path / "out"), workers=1, debounce=0)
+    assert restarted.scan(debounce=0) == []
+
+    # новое содержимое – снова в работу
+    broken.write_bytes(b"still not a docx")
+    assert [path for path, _ in restarted.scan(debounce=0)] == [str(broken)]